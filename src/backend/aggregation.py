@@ -0,0 +1,213 @@
+"""
+聚合统计模块
+按时间和地域维度汇总情感分析结果
+"""
+import pandas as pd
+import metrics
+
+SENTIMENTS = ('positive', 'neutral', 'negative')
+
+# 时间统计支持的粒度
+TIME_GRANULARITIES = ('day', 'week', 'month')
+
+
+def _partial_sums(keys, results: pd.DataFrame) -> pd.DataFrame:
+    """
+    对一块结果按键做一次groupby: 各情感条数、总条数和各类概率之和
+    
+    计数和概率之和都可以逐块累加,因此同一聚合可用于流式读取的结果块
+    """
+    sentiment = results['sentiment'].to_numpy()
+    frame = pd.DataFrame({
+        'key': keys,
+        'total': 1,
+        'positive_count': sentiment == 'positive',
+        'neutral_count': sentiment == 'neutral',
+        'negative_count': sentiment == 'negative',
+        'positive_sum': results['positive'].to_numpy(dtype=float),
+        'neutral_sum': results['neutral'].to_numpy(dtype=float),
+        'negative_sum': results['negative'].to_numpy(dtype=float)
+    })
+    return frame.groupby('key', sort=False).sum()
+
+
+class GroupedSums:
+    """按键累加的情感计数和概率之和"""
+    
+    def __init__(self):
+        self.totals = None
+    
+    def add(self, keys, results: pd.DataFrame) -> None:
+        """累加一块结果"""
+        if len(results) == 0:
+            return
+        part = _partial_sums(keys, results)
+        if self.totals is None:
+            self.totals = part
+        else:
+            self.totals = pd.concat([self.totals, part]).groupby(level=0, sort=False).sum()
+
+
+def _sentiment_counts(row, with_total=False) -> dict:
+    """从聚合行中取各情感条数"""
+    counts = {name: int(row[f'{name}_count']) for name in SENTIMENTS}
+    if with_total:
+        counts['total'] = int(row['total'])
+    return counts
+
+
+def _average_probabilities(row) -> dict:
+    """从聚合行中计算平均概率"""
+    return {name: float(row[f'{name}_sum'] / row['total']) for name in SENTIMENTS}
+
+
+class TimeAggregator:
+    """
+    时间维度的情感统计
+    
+    逐块累加每日计数和概率之和,输出时再按粒度(日/周/月)汇总
+    """
+    
+    def __init__(self, granularity: str = 'day'):
+        """
+        Args:
+            granularity: 统计粒度 ('day'、'week' 或 'month')
+        """
+        if granularity not in TIME_GRANULARITIES:
+            raise ValueError(f'不支持的时间粒度: {granularity}')
+        self.granularity = granularity
+        self._daily = GroupedSums()
+    
+    def update(self, results: pd.DataFrame) -> None:
+        """累加一块结果(需包含 date 列)"""
+        # 解析日期并移除无效日期
+        dates = pd.to_datetime(results['date'], errors='coerce')
+        valid = dates.notna().to_numpy()
+        if not valid.any():
+            return
+        days = dates[valid].dt.normalize().to_numpy()
+        self._daily.add(days, results[valid])
+    
+    @staticmethod
+    def _labels(days: pd.DatetimeIndex, granularity: str) -> pd.Index:
+        """日期对应的分组标签"""
+        if granularity == 'day':
+            return days.strftime('%Y-%m-%d')
+        if granularity == 'week':
+            # 以周一作为一周的标签
+            return (days - pd.to_timedelta(days.dayofweek, unit='D')).strftime('%Y-%m-%d')
+        return days.strftime('%Y-%m')
+    
+    def _rollup(self, granularity: str) -> pd.DataFrame:
+        """按粒度汇总每日统计"""
+        daily = self._daily.totals
+        labels = self._labels(pd.DatetimeIndex(daily.index), granularity)
+        return daily.groupby(labels).sum().sort_index()
+    
+    def result(self):
+        """返回时间统计,没有有效日期时返回None"""
+        try:
+            if self._daily.totals is None:
+                return None
+            
+            grouped = self._rollup(self.granularity)
+            monthly = grouped if self.granularity == 'month' else self._rollup('month')
+            days = pd.DatetimeIndex(self._daily.totals.index)
+            
+            return {
+                'granularity': self.granularity,
+                'dates': grouped.index.tolist(),
+                'sentiment_by_date': {
+                    label: _sentiment_counts(row) for label, row in grouped.iterrows()
+                },
+                'avg_prob_by_date': {
+                    label: _average_probabilities(row) for label, row in grouped.iterrows()
+                },
+                'months': monthly.index.tolist(),
+                'sentiment_by_month': {
+                    label: _sentiment_counts(row, with_total=True) for label, row in monthly.iterrows()
+                },
+                'avg_prob_by_month': {
+                    label: _average_probabilities(row) for label, row in monthly.iterrows()
+                },
+                'date_range': {
+                    'start': days.min().strftime('%Y-%m-%d'),
+                    'end': days.max().strftime('%Y-%m-%d')
+                }
+            }
+        except Exception as e:
+            print(f"时间统计错误: {e}")
+            metrics.count_error('aggregation.time')
+            return None
+
+
+def calculate_time_statistics(results, granularity='day'):
+    """
+    计算时间维度的情感统计
+    
+    Args:
+        results: 列式分析结果(包含 date/sentiment/positive/neutral/negative 列的DataFrame)
+        granularity: 统计粒度 ('day'、'week' 或 'month')
+    """
+    aggregator = TimeAggregator(granularity)
+    aggregator.update(results)
+    return aggregator.result()
+
+class LocationAggregator:
+    """
+    地域维度的情感统计
+    
+    逐块累加各地域的计数和概率之和,输出时取评论数最多的前N个地域
+    """
+    
+    def __init__(self, top_n: int = 20):
+        """
+        Args:
+            top_n: 返回的地域数量
+        """
+        self.top_n = top_n
+        self._sums = GroupedSums()
+    
+    def update(self, results: pd.DataFrame) -> None:
+        """累加一块结果(需包含 location 列)"""
+        locations = results['location'].fillna('未知').to_numpy()
+        self._sums.add(locations, results)
+    
+    def result(self):
+        """返回地域统计"""
+        try:
+            totals = self._sums.totals
+            if totals is None:
+                totals = _partial_sums([], pd.DataFrame(columns=['sentiment', *SENTIMENTS]))
+            
+            # 排除未知地域,按评论数取前N个(并列时按地域名排序)
+            known = totals[(totals.index != '未知') & (totals.index != '')].sort_index()
+            top = known.nlargest(self.top_n, 'total', keep='first')
+            
+            return {
+                'locations': top.index.tolist(),
+                'sentiment_by_location': {
+                    location: _sentiment_counts(row) for location, row in top.iterrows()
+                },
+                'avg_prob_by_location': {
+                    location: _average_probabilities(row) for location, row in top.iterrows()
+                },
+                'total_locations': len(known)
+            }
+        except Exception as e:
+            print(f"地域统计错误: {e}")
+            metrics.count_error('aggregation.location')
+            return None
+
+
+def calculate_location_statistics(results, top_n=20):
+    """
+    计算地域维度的情感统计
+    
+    Args:
+        results: 列式分析结果(包含 location/sentiment/positive/neutral/negative 列的DataFrame)
+        top_n: 返回的地域数量
+    """
+    aggregator = LocationAggregator(top_n)
+    aggregator.update(results)
+    return aggregator.result()
@@ -0,0 +1,59 @@
+"""
+分析上下文模块
+单条评论的分词、字符n-gram等中间结果只计算一次,供所有特征提取器和模型共享
+"""
+import jieba
+from typing import List
+
+
+def tokenize(text: str, language: str = 'zh') -> List[str]:
+    """分词"""
+    if language == 'zh':
+        return jieba.lcut(text)
+    else:
+        return text.lower().split()
+
+
+class AnalysisContext:
+    """单条评论的分析上下文(各项结果在首次访问时计算并缓存)"""
+
+    def __init__(self, text: str, language: str = 'zh'):
+        """
+        初始化分析上下文
+
+        Args:
+            text: 预处理后的评论文本
+            language: 语言类型
+        """
+        self.text = text
+        self.language = language
+        self._tokens = None
+        self._char_ngrams = {}
+        self._snownlp_words = None
+
+    @property
+    def tokens(self) -> List[str]:
+        """分词结果"""
+        if self._tokens is None:
+            self._tokens = tokenize(self.text, self.language)
+        return self._tokens
+
+    def char_ngrams(self, n: int) -> List[str]:
+        """字符n-gram列表"""
+        if n not in self._char_ngrams:
+            text = self.text
+            self._char_ngrams[n] = [text[i:i+n] for i in range(len(text)-n+1)]
+        return self._char_ngrams[n]
+
+    @property
+    def snownlp_words(self) -> List[str]:
+        """
+        SnowNLP情感模型所需的分词结果
+
+        SnowNLP的贝叶斯模型基于其自带分词器训练,为保持得分一致,
+        这里沿用其分词和停用词过滤,但每条评论只计算一次。
+        """
+        if self._snownlp_words is None:
+            from snownlp import sentiment
+            self._snownlp_words = sentiment.classifier.handle(self.text)
+        return self._snownlp_words
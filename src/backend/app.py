@@ -2,13 +2,32 @@
 购物平台评论情感分析系统 - Flask API服务
 支持中英文情感分析、多种特征工程方法和模型集成
 """
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g, send_file
 from flask_cors import CORS
-import pandas as pd
+from contextlib import nullcontext
+import io
 import os
-from werkzeug.utils import secure_filename
-from sentiment_analyzer import SentimentAnalyzer
+import uuid
+import json
+import time
+import itertools
 from config import config
+from registry import AnalyzerRegistry
+from result_cache import ResultCache
+from result_store import ResultStore, ResultFilters
+from pipeline import analyze_csv_serialized, iter_csv_analysis, serialize_results, CSVFormatError
+from jobs import JobManager, JobQueueFull
+from profiling import ProfileStore, PROFILE_FORMATS
+from response_formats import MIMETYPES, negotiate_format, stream_body, gzip_chunks
+from aggregation import TIME_GRANULARITIES
+from lexicon import get_store
+from vectorizer import TfidfVectorizer
+from sentiment_analyzer import MODEL_TYPES, LANGUAGES
+from feature_engineering import FEATURE_FAMILIES
+from linear_model import model_path, stacking_path, StackingMetaLearner
+from models import ENSEMBLE_MEMBERS, ENSEMBLE_METHODS
+import parallel
+import metrics
 
 # 创建Flask应用
 app = Flask(__name__)
@@ -24,7 +43,7 @@ CORS(app, resources={
         "methods": ["GET", "POST", "OPTIONS"],
         "allow_headers": ["Content-Type", "Authorization"],
         "supports_credentials": True,
-        "expose_headers": ["Content-Type", "X-Requested-With"]
+        "expose_headers": ["Content-Type", "X-Requested-With", "X-Analysis-Id", "X-Profile-Id"]
     }
 })
 
@@ -40,159 +59,318 @@ if app.config['DEBUG']:
             response.headers.add('Access-Control-Allow-Credentials', 'true')
         return response
 
+@app.before_request
+def start_request_metrics():
+    """记录请求开始时间,带调试请求头时开启逐阶段耗时明细"""
+    g.request_start = time.perf_counter()
+    if request.headers.get(app.config['METRICS_DEBUG_HEADER'], '').lower() in ('1', 'true'):
+        g.timing_token = metrics.start_request_timing()
+
+@app.after_request
+def record_request_metrics(response):
+    """记录请求耗时;开启耗时明细时附加到响应中"""
+    elapsed = time.perf_counter() - g.pop('request_start', time.perf_counter())
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.request_seconds.observe(elapsed, endpoint, request.method, str(response.status_code))
+    
+    token = g.pop('timing_token', None)
+    if token is not None:
+        stages = metrics.finish_request_timing(token)
+        response.headers['Server-Timing'] = ', '.join(
+            [f'total;dur={elapsed * 1000:.3f}'] +
+            [f'{stage.replace(".", "_")};dur={entry["ms"]}' for stage, entry in stages.items()]
+        )
+        # 流式响应的响应体尚未生成,只附加Server-Timing(覆盖到第一块结果为止)
+        body = response.get_json(silent=True) if response.is_json and not response.is_streamed else None
+        if isinstance(body, dict):
+            body['timing'] = {'total_ms': round(elapsed * 1000, 3), 'stages': stages}
+            response.set_data(json.dumps(body, ensure_ascii=False))
+    return response
+
 # 确保上传文件夹存在
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# 跨请求共享的分析结果缓存
+result_cache = ResultCache(
+    max_size=app.config['RESULT_CACHE_SIZE'],
+    db_path=app.config['RESULT_CACHE_PATH'],
+    max_disk_rows=app.config['RESULT_CACHE_DISK_MAX_ROWS']
+)
+
+metrics.register_collector('sentiment_result_cache', '结果缓存统计', result_cache.get_stats)
+
+# 热加载的情感词典
+lexicon_store = get_store(app.config['LEXICON_DIR'])
+
+# 预先拟合的TF-IDF向量化器(只读,可在请求之间共享)
+persisted_vectorizer = (
+    TfidfVectorizer.load(app.config['TFIDF_VECTORIZER_PATH'])
+    if app.config['TFIDF_VECTORIZER_PATH'] else None
+)
+
+# 进程内复用的分析器,启动时在后台预热模型
+analyzer_registry = AnalyzerRegistry(
+    max_analyzers=app.config['ANALYZER_REGISTRY_SIZE'],
+    workers=app.config['ANALYSIS_WORKERS'],
+    parallel_min_batch=app.config['PARALLEL_MIN_BATCH'],
+    cache=result_cache,
+    lexicon_dir=app.config['LEXICON_DIR'],
+    model_dir=app.config['LINEAR_MODEL_DIR'],
+    near_duplicate_min_length=app.config['NEAR_DUPLICATE_MIN_LENGTH']
+)
+# 启用多进程分析时提前创建并预热进程池;必须在启动后台预热线程之前fork工作进程,
+# 否则子进程可能继承预热线程持有的jieba或导入锁,在初始化时死锁
+if app.config['ANALYSIS_WORKERS'] > 1:
+    parallel.get_pool(app.config['ANALYSIS_WORKERS'])
+if app.config['WARM_UP_ON_START']:
+    analyzer_registry.start_warm_up([
+        {'language': language, 'features': app.config['DEFAULT_FEATURES']}
+        for language in ('zh', 'en')
+    ])
+
+# 单次分析的剖析结果,未启用剖析时为None
+profile_store = ProfileStore(
+    app.config['PROFILE_FOLDER'],
+    max_profiles=app.config['PROFILE_MAX_COUNT'],
+    max_bytes=app.config['PROFILE_MAX_BYTES'],
+    sample_interval=app.config['PROFILE_SAMPLE_INTERVAL']
+) if app.config['PROFILING_ENABLED'] else None
+
+# 分析结果存储,未配置路径时为None
+result_store = ResultStore(
+    app.config['RESULT_STORE_PATH'],
+    max_analyses=app.config['RESULT_STORE_MAX_ANALYSES'],
+    max_row_results=app.config['RESULT_STORE_MAX_ROW_RESULTS'],
+    max_bytes=app.config['RESULT_STORE_MAX_BYTES']
+) if app.config['RESULT_STORE_PATH'] else None
+
+# 异步分析任务管理器
+job_manager = JobManager(
+    upload_folder=app.config['UPLOAD_FOLDER'],
+    max_workers=app.config['JOB_WORKERS'],
+    max_queue=app.config['JOB_QUEUE_SIZE'],
+    ttl=app.config['JOB_TTL'],
+    chunksize=app.config['CSV_CHUNK_SIZE'],
+    profile_store=profile_store,
+    result_store=result_store
+)
+
 def allowed_file(filename):
     """检查文件扩展名是否允许"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
-def _calculate_time_statistics(results, df, date_col):
-    """计算时间维度的情感统计"""
-    try:
-        # 解析日期
-        dates = pd.to_datetime(df[date_col], errors='coerce')
-        
-        # 创建包含日期和情感的DataFrame
-        time_df = pd.DataFrame({
-            'date': dates,
-            'sentiment': [r['sentiment'] for r in results],
-            'positive_prob': [r['probabilities']['positive'] for r in results],
-            'neutral_prob': [r['probabilities']['neutral'] for r in results],
-            'negative_prob': [r['probabilities']['negative'] for r in results]
-        })
-        
-        # 移除无效日期
-        time_df = time_df.dropna(subset=['date'])
-        
-        if len(time_df) == 0:
-            return None
-        
-        # 按日期分组统计
-        time_df['date_str'] = time_df['date'].dt.strftime('%Y-%m-%d')
-        daily_stats = time_df.groupby('date_str').agg({
-            'sentiment': lambda x: {
-                'positive': (x == 'positive').sum(),
-                'neutral': (x == 'neutral').sum(),
-                'negative': (x == 'negative').sum()
-            },
-            'positive_prob': 'mean',
-            'neutral_prob': 'mean',
-            'negative_prob': 'mean'
-        }).to_dict()
-        
-        # 按月份统计
-        time_df['month'] = time_df['date'].dt.strftime('%Y-%m')
-        monthly_stats = time_df.groupby('month').agg({
-            'sentiment': lambda x: {
-                'positive': (x == 'positive').sum(),
-                'neutral': (x == 'neutral').sum(),
-                'negative': (x == 'negative').sum(),
-                'total': len(x)
-            }
-        }).to_dict()
-        
-        # 构建返回数据
-        dates_list = sorted(time_df['date_str'].unique())
-        sentiment_by_date = {}
-        avg_prob_by_date = {}
-        
-        for date in dates_list:
-            date_data = time_df[time_df['date_str'] == date]
-            sentiment_by_date[date] = {
-                'positive': int((date_data['sentiment'] == 'positive').sum()),
-                'neutral': int((date_data['sentiment'] == 'neutral').sum()),
-                'negative': int((date_data['sentiment'] == 'negative').sum())
-            }
-            avg_prob_by_date[date] = {
-                'positive': float(date_data['positive_prob'].mean()),
-                'neutral': float(date_data['neutral_prob'].mean()),
-                'negative': float(date_data['negative_prob'].mean())
-            }
-        
-        return {
-            'dates': dates_list,
-            'sentiment_by_date': sentiment_by_date,
-            'avg_prob_by_date': avg_prob_by_date,
-            'date_range': {
-                'start': time_df['date'].min().strftime('%Y-%m-%d'),
-                'end': time_df['date'].max().strftime('%Y-%m-%d')
-            }
-        }
-    except Exception as e:
-        print(f"时间统计错误: {e}")
+def _get_uploaded_file():
+    """
+    校验上传的CSV文件
+    
+    Returns:
+        (file, error_response) 校验失败时file为None
+    """
+    # 检查文件是否上传
+    if 'file' not in request.files:
+        return None, (jsonify({'error': '未上传文件'}), 400)
+    
+    file = request.files['file']
+    if file.filename == '':
+        return None, (jsonify({'error': '文件名为空'}), 400)
+    
+    if not allowed_file(file.filename):
+        return None, (jsonify({'error': '只支持CSV文件'}), 400)
+    
+    return file, None
+
+def _get_pipeline_options():
+    """
+    解析流水线参数
+    
+    Returns:
+        (options, error_response) 校验失败时options为None
+    """
+    time_granularity = request.form.get('time_granularity', app.config['TIME_GRANULARITY'])
+    if time_granularity not in TIME_GRANULARITIES:
+        return None, (jsonify({'error': f'time_granularity 必须是 {", ".join(TIME_GRANULARITIES)} 之一'}), 400)
+    
+    location_top_n = request.form.get('location_top_n', app.config['LOCATION_TOP_N'], type=int)
+    if location_top_n is None or location_top_n < 1:
+        return None, (jsonify({'error': 'location_top_n 必须是正整数'}), 400)
+    
+    top_terms_n = request.form.get('top_terms_n', app.config['TOP_TERMS_N'], type=int)
+    if top_terms_n is None or top_terms_n < 0:
+        return None, (jsonify({'error': 'top_terms_n 必须是非负整数'}), 400)
+    
+    # 增量分析: 按行指纹复用结果存储中已保存的逐行结果,只分析新增或变化的行
+    default_incremental = 'true' if app.config['INCREMENTAL_ANALYSIS'] else 'false'
+    incremental = request.form.get('incremental', default_incremental) == 'true' and result_store is not None
+    
+    return {
+        'time_granularity': time_granularity,
+        'location_top_n': location_top_n,
+        'top_terms_n': top_terms_n,
+        'return_features': request.form.get('return_features', 'false') == 'true',
+        'vectorizer': _create_vectorizer(),
+        'row_store': result_store if incremental else None
+    }, None
+
+def _create_vectorizer():
+    """语料级TF-IDF向量化器: 优先使用预先拟合的向量化器,否则每次上传新建"""
+    language = request.form.get('language', 'zh')
+    if persisted_vectorizer is not None and persisted_vectorizer.language == language:
+        return persisted_vectorizer
+    return TfidfVectorizer(language=language, n_features=app.config['TFIDF_HASH_FEATURES'])
+
+def _profile_requested():
+    """
+    请求是否开启剖析(profile=true 参数或 X-Profile: 1 请求头)
+    
+    Returns:
+        (profile, error_response) 未启用剖析功能时请求剖析返回400
+    """
+    profile = (request.form.get('profile', 'false') == 'true'
+               or request.headers.get('X-Profile', '').lower() in ('1', 'true'))
+    if profile and profile_store is None:
+        return False, (jsonify({'error': '剖析功能未启用(PROFILING_ENABLED)'}), 400)
+    return profile, None
+
+def _create_analyzer():
+    """
+    根据请求参数获取情感分析器(同一配置的分析器在请求之间复用)
+    
+    Returns:
+        (analyzer, error_response) 校验失败时analyzer为None
+    """
+    # 获取分析参数
+    language = request.form.get('language', 'zh')  # zh或en
+    features = request.form.getlist('features[]')  # 特征工程方法列表
+    use_ensemble = request.form.get('use_ensemble', 'false') == 'true'
+    model = request.form.get('model', 'rule')  # rule或linear
+    ensemble_method = request.form.get('ensemble_method', app.config['ENSEMBLE_METHOD'])  # voting或stacking
+    ensemble_members = request.form.getlist('ensemble_members[]') or app.config['ENSEMBLE_MEMBERS']
+    near_duplicates = request.form.get('near_duplicates', 'false') == 'true'  # 近重复评论只分析代表
+    
+    if language not in LANGUAGES:
+        return None, (jsonify({'error': f'language 必须是 {", ".join(LANGUAGES)} 之一'}), 400)
+    unknown = [name for name in features if name not in FEATURE_FAMILIES]
+    if unknown:
+        return None, (jsonify({'error': f'features[] 只能包含 {", ".join(FEATURE_FAMILIES)}'}), 400)
+    if model not in MODEL_TYPES:
+        return None, (jsonify({'error': f'model 必须是 {", ".join(MODEL_TYPES)} 之一'}), 400)
+    linear_trained = os.path.exists(model_path(language, app.config['LINEAR_MODEL_DIR']))
+    if model == 'linear' and not linear_trained:
+        return None, (jsonify({'error': f'{language} 线性模型尚未训练,请先运行 train_model.py'}), 400)
+    
+    if use_ensemble and model == 'rule':
+        if ensemble_method not in ENSEMBLE_METHODS:
+            return None, (jsonify({'error': f'ensemble_method 必须是 {", ".join(ENSEMBLE_METHODS)} 之一'}), 400)
+        unknown = [name for name in ensemble_members if name not in ENSEMBLE_MEMBERS]
+        if unknown:
+            return None, (jsonify({'error': f'ensemble_members 只能包含 {", ".join(ENSEMBLE_MEMBERS)}'}), 400)
+        if 'linear' in ensemble_members and not linear_trained:
+            return None, (jsonify({'error': f'{language} 线性模型尚未训练,不能作为集成成员'}), 400)
+    else:
+        # 不使用集成时这两个参数不影响结果,统一取默认值以复用同一个分析器
+        ensemble_method = app.config['ENSEMBLE_METHOD']
+        ensemble_members = app.config['ENSEMBLE_MEMBERS']
+    
+    return analyzer_registry.get(
+        language=language,
+        features=features if features else ['basic'],
+        use_ensemble=use_ensemble,
+        model=model,
+        ensemble_method=ensemble_method,
+        ensemble_members=ensemble_members,
+        near_duplicate_threshold=app.config['NEAR_DUPLICATE_THRESHOLD'] if near_duplicates else None
+    ), None
+
+def _stacking_status(language):
+    """某一语言已训练的堆叠元模型(成员及版本),未训练时返回None"""
+    path = stacking_path(language, app.config['LINEAR_MODEL_DIR'])
+    if not os.path.exists(path):
         return None
+    meta_learner = StackingMetaLearner.load(path)
+    return {'members': meta_learner.members, 'version': meta_learner.version}
 
-def _calculate_location_statistics(results, df, location_col):
-    """计算地域维度的情感统计"""
-    try:
-        # 创建包含地域和情感的DataFrame
-        location_df = pd.DataFrame({
-            'location': df[location_col].fillna('未知'),
-            'sentiment': [r['sentiment'] for r in results],
-            'positive_prob': [r['probabilities']['positive'] for r in results],
-            'neutral_prob': [r['probabilities']['neutral'] for r in results],
-            'negative_prob': [r['probabilities']['negative'] for r in results]
-        })
-        
-        # 按地域分组统计
-        location_stats = location_df.groupby('location').agg({
-            'sentiment': lambda x: {
-                'positive': int((x == 'positive').sum()),
-                'neutral': int((x == 'neutral').sum()),
-                'negative': int((x == 'negative').sum()),
-                'total': int(len(x))
-            },
-            'positive_prob': 'mean',
-            'neutral_prob': 'mean',
-            'negative_prob': 'mean'
+def _get_response_format():
+    """
+    响应格式: format 参数(json/ndjson/columnar),未提供时按Accept请求头协商
+    
+    Returns:
+        (response_format, error_response) 参数无效时返回400
+    """
+    response_format = negotiate_format(request.form.get('format'), request.accept_mimetypes)
+    if response_format is None:
+        return None, (jsonify({'error': f'format 必须是 {", ".join(MIMETYPES)} 之一'}), 400)
+    return response_format, None
+
+def _check_json_upload_size(file):
+    """
+    整体JSON响应在编码前保留全部逐条结果,内存随文件大小增长,上传大小单独限制
+    (流式格式和异步任务只受 MAX_CONTENT_LENGTH 限制)
+    
+    Returns:
+        超出 JSON_MAX_CONTENT_LENGTH 时返回413响应,否则为None
+    """
+    stream = file.stream
+    position = stream.tell()
+    size = stream.seek(0, os.SEEK_END)
+    stream.seek(position)
+    limit = app.config['JSON_MAX_CONTENT_LENGTH']
+    if size > limit:
+        return jsonify({
+            'error': f'format=json 时上传文件不能超过 {limit // (1024 * 1024)}MB,'
+                     f'更大的文件请使用 format=ndjson 或 columnar,或提交到 /api/jobs'
+        }), 413
+    return None
+
+def _profiled_events(events, profile_id, meta):
+    """在剖析中逐个产出分析事件(剖析覆盖整个流式响应)"""
+    with profile_store.record(profile_id, meta) as profile_meta:
+        for kind, value in events:
+            if kind == 'summary':
+                profile_meta['rows'] = value['total']
+            yield kind, value
+
+def _stream_analysis(file, analyzer, options, response_format, profile_id=None, analysis_id=None):
+    """
+    以NDJSON或列式JSON流式返回分析结果: 每分析完一块即发送该块,不保留全部结果
+    
+    先分析第一块再开始响应,CSV格式错误仍以400返回;
+    客户端接受gzip时逐块压缩
+    """
+    # 请求结束时werkzeug会关闭上传文件,而响应体在请求结束后才生成,
+    # 因此把上传流转交给响应,在响应结束时关闭
+    stream = file.stream
+    file.stream = io.BytesIO()
+    events = iter_csv_analysis(
+        stream,
+        file.filename,
+        analyzer,
+        chunksize=app.config['CSV_CHUNK_SIZE'],
+        keep_results=False,
+        **options
+    )
+    if analysis_id is not None:
+        events = result_store.record(analysis_id, file.filename, events)
+    if profile_id is not None:
+        events = _profiled_events(events, profile_id, {
+            'source': 'analyze', 'filename': file.filename, 'format': response_format
         })
-        
-        # 构建返回数据
-        locations = []
-        sentiment_counts = []
-        avg_probs = []
-        
-        for location in location_stats.index:
-            if location and location != '未知':
-                sentiment_data = location_stats.loc[location, 'sentiment']
-                locations.append(location)
-                sentiment_counts.append({
-                    'location': location,
-                    'positive': sentiment_data['positive'],
-                    'neutral': sentiment_data['neutral'],
-                    'negative': sentiment_data['negative'],
-                    'total': sentiment_data['total']
-                })
-                avg_probs.append({
-                    'location': location,
-                    'positive': float(location_stats.loc[location, 'positive_prob']),
-                    'neutral': float(location_stats.loc[location, 'neutral_prob']),
-                    'negative': float(location_stats.loc[location, 'negative_prob'])
-                })
-        
-        # 按总数排序，取前20个地区
-        sentiment_counts.sort(key=lambda x: x['total'], reverse=True)
-        top_locations = sentiment_counts[:20]
-        
-        return {
-            'locations': [item['location'] for item in top_locations],
-            'sentiment_by_location': {item['location']: {
-                'positive': item['positive'],
-                'neutral': item['neutral'],
-                'negative': item['negative']
-            } for item in top_locations},
-            'avg_prob_by_location': {item['location']: {
-                'positive': next((p['positive'] for p in avg_probs if p['location'] == item['location']), 0),
-                'neutral': next((p['neutral'] for p in avg_probs if p['location'] == item['location']), 0),
-                'negative': next((p['negative'] for p in avg_probs if p['location'] == item['location']), 0)
-            } for item in top_locations},
-            'total_locations': len(locations)
-        }
-    except Exception as e:
-        print(f"地域统计错误: {e}")
-        return None
+    try:
+        first = next(events)
+    except Exception:
+        stream.close()
+        raise
+    
+    include_text = request.form.get('include_text', 'false') == 'true'
+    chunks = stream_body(itertools.chain([first], events), response_format, include_text)
+    headers = {'Vary': 'Accept-Encoding', 'X-Accel-Buffering': 'no'}
+    if app.config['RESPONSE_GZIP_LEVEL'] and 'gzip' in request.accept_encodings:
+        chunks = gzip_chunks(chunks, app.config['RESPONSE_GZIP_LEVEL'])
+        headers['Content-Encoding'] = 'gzip'
+    
+    response = Response(chunks, mimetype=MIMETYPES[response_format], headers=headers)
+    response.call_on_close(stream.close)
+    return response
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze_sentiment():
@@ -201,128 +379,299 @@ def analyze_sentiment():
     接收CSV文件和分析参数,返回情感分析结果
     """
     try:
-        # 检查文件是否上传
-        if 'file' not in request.files:
-            return jsonify({'error': '未上传文件'}), 400
-        
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'error': '文件名为空'}), 400
-        
-        if not allowed_file(file.filename):
-            return jsonify({'error': '只支持CSV文件'}), 400
-        
-        # 获取分析参数
-        language = request.form.get('language', 'zh')  # zh或en
-        features = request.form.getlist('features[]')  # 特征工程方法列表
-        use_ensemble = request.form.get('use_ensemble', 'false') == 'true'
-        
-        # 保存上传的文件
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        # 读取CSV文件
-        df = pd.read_csv(filepath, encoding='utf-8')
-        
-        # 检查CSV格式 - 支持多种列名
-        possible_comment_cols = ['评论内容', 'comment', 'text', 'review', '评论']
-        comment_col = None
-        for col in possible_comment_cols:
-            if col in df.columns:
-                comment_col = col
-                break
-        
-        if comment_col is None:
-            return jsonify({'error': 'CSV文件必须包含评论内容、comment、text或review列'}), 400
+        file, error = _get_uploaded_file()
+        if error:
+            return error
         
-        # 提取评论和元数据
-        comments = df[comment_col].fillna('').astype(str).tolist()
-        
-        # 提取日期和地域信息（如果存在）
-        date_col = None
-        location_col = None
-        
-        for col in ['评论日期', 'date', '日期']:
-            if col in df.columns:
-                date_col = col
-                break
-        
-        for col in ['购买地', 'location', '地域', '地区']:
-            if col in df.columns:
-                location_col = col
-                break
-        
-        # 收集CSV文件统计信息
-        file_stats = {
-            'filename': file.filename,
-            'total_rows': len(df),
-            'columns': df.columns.tolist(),
-            'has_date': date_col is not None,
-            'has_location': location_col is not None,
-        }
-        
-        # 添加其他可用列的统计
-        if '产品类别' in df.columns:
-            file_stats['product_categories'] = df['产品类别'].value_counts().head(10).to_dict()
-        if '店铺' in df.columns:
-            file_stats['top_shops'] = df['店铺'].value_counts().head(5).to_dict()
-        if '价格' in df.columns:
-            prices = pd.to_numeric(df['价格'], errors='coerce')
-            file_stats['price_stats'] = {
-                'min': float(prices.min()) if not prices.isna().all() else 0,
-                'max': float(prices.max()) if not prices.isna().all() else 0,
-                'avg': float(prices.mean()) if not prices.isna().all() else 0
-            }
+        options, error = _get_pipeline_options()
+        if error:
+            return error
         
         # 创建情感分析器
-        analyzer = SentimentAnalyzer(
-            language=language,
-            features=features if features else ['basic'],
-            use_ensemble=use_ensemble
-        )
-        
-        # 执行情感分析
-        results = analyzer.analyze_batch(comments)
-        
-        # 为每个结果添加日期和地域信息
-        for i, result in enumerate(results):
-            if date_col and i < len(df):
-                result['date'] = str(df.iloc[i][date_col]) if pd.notna(df.iloc[i][date_col]) else None
-            if location_col and i < len(df):
-                result['location'] = str(df.iloc[i][location_col]) if pd.notna(df.iloc[i][location_col]) else None
-        
-        # 计算时间和地域统计
-        time_stats = None
-        location_stats = None
+        analyzer, error = _create_analyzer()
+        if error:
+            return error
+        
+        profile, error = _profile_requested()
+        if error:
+            return error
+        response_format, error = _get_response_format()
+        if error:
+            return error
+        if response_format == 'json':
+            error = _check_json_upload_size(file)
+            if error:
+                return error
+        profile_id = uuid.uuid4().hex if profile else None
+        analysis_id = uuid.uuid4().hex if result_store is not None else None
+        # 结果已写入结果存储时,前端可只取统计信息,再通过 /api/analyses/<id>/results 分页获取结果
+        return_results = request.form.get('return_results', 'true') == 'true'
+        
+        if response_format != 'json':
+            response = _stream_analysis(file, analyzer, options, response_format, profile_id, analysis_id)
+        else:
+            recording = nullcontext({})
+            if profile:
+                recording = profile_store.record(profile_id, {'source': 'analyze', 'filename': file.filename})
+            
+            with recording as profile_meta:
+                # 直接从上传流分块读取并分析,不再落盘后整体读入
+                # 逐块序列化结果,不保留全部数据块
+                body = analyze_csv_serialized(
+                    file.stream,
+                    file.filename,
+                    analyzer,
+                    return_results=return_results,
+                    result_store=result_store,
+                    analysis_id=analysis_id,
+                    chunksize=app.config['CSV_CHUNK_SIZE'],
+                    **options
+                )
+                profile_meta['rows'] = body['total']
+            
+            # 返回分析结果
+            if profile_id is not None:
+                body['profile_id'] = profile_id
+            if analysis_id is not None:
+                body['analysis_id'] = analysis_id
+            with metrics.timed('jsonify', body['total']):
+                response = jsonify(body)
+        
+        if profile_id is not None:
+            response.headers['X-Profile-Id'] = profile_id
+        if analysis_id is not None:
+            response.headers['X-Analysis-Id'] = analysis_id
+        return response
+    
+    except CSVFormatError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """
+    提交异步分析任务
+    接收与 /api/analyze 相同的参数,立即返回任务ID
+    """
+    try:
+        file, error = _get_uploaded_file()
+        if error:
+            return error
         
-        if date_col:
-            time_stats = _calculate_time_statistics(results, df, date_col)
+        options, error = _get_pipeline_options()
+        if error:
+            return error
         
-        if location_col:
-            location_stats = _calculate_location_statistics(results, df, location_col)
+        analyzer, error = _create_analyzer()
+        if error:
+            return error
         
-        # 清理上传的文件
-        os.remove(filepath)
+        profile, error = _profile_requested()
+        if error:
+            return error
         
-        # 返回分析结果
-        return jsonify({
-            'success': True,
-            'total': len(results),
-            'results': results,
-            'statistics': analyzer.get_statistics(results),
-            'file_stats': file_stats,
-            'time_stats': time_stats,
-            'location_stats': location_stats
-        })
+        job = job_manager.submit(file, analyzer, profile=profile, **options)
+        return jsonify({'success': True, 'job': job.to_dict()}), 202
     
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 429
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询任务状态和进度"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在或已过期'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """
+    获取任务结果
+    统计信息随每页返回,评论结果按 page/per_page 分页
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在或已过期'}), 404
+    if job.status == 'failed':
+        return jsonify({'error': job.error, 'job': job.to_dict()}), 500
+    if job.status != 'completed':
+        return jsonify({'error': '任务尚未完成', 'job': job.to_dict()}), 409
+    
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 100, type=int), 1), 1000)
+    
+    total = job.result['total']
+    start = (page - 1) * per_page
+    
+    with metrics.timed('serialize'):
+        body = serialize_results(job.result, start, start + per_page)
+    with metrics.timed('jsonify'):
+        return jsonify({
+            **body,
+            'page': page,
+            'per_page': per_page,
+            'pages': (total + per_page - 1) // per_page
+        })
+
+def _get_result_filters():
+    """
+    解析结果查询的筛选参数
+    
+    Returns:
+        (filters, error_response) 校验失败时filters为None
+    """
+    scores = {}
+    for name in ('min_score', 'max_score'):
+        if request.args.get(name):
+            scores[name] = request.args.get(name, type=float)
+            if scores[name] is None:
+                return None, (jsonify({'error': f'{name} 必须是数字'}), 400)
+    try:
+        filters = ResultFilters(
+            sentiment=request.args.get('sentiment') or None,
+            start_date=request.args.get('start_date'),
+            end_date=request.args.get('end_date'),
+            location=request.args.get('location') or None,
+            keyword=request.args.get('keyword') or None,
+            **scores
+        )
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+    return filters, None
+
+def _get_stored_analysis(analysis_id):
+    """
+    查询结果存储中的分析
+    
+    Returns:
+        (analysis, error_response) 未启用结果存储或分析不存在时返回404
+    """
+    if result_store is None:
+        return None, (jsonify({'error': '结果存储未启用(RESULT_STORE_PATH)'}), 404)
+    analysis = result_store.get(analysis_id)
+    if analysis is None:
+        return None, (jsonify({'error': '分析不存在或已被清理'}), 404)
+    return analysis, None
+
+@app.route('/api/analyses/<analysis_id>', methods=['GET'])
+def get_analysis(analysis_id):
+    """已保存分析的状态和统计信息(不含逐条结果)"""
+    analysis, error = _get_stored_analysis(analysis_id)
+    if error:
+        return error
+    return jsonify(analysis)
+
+@app.route('/api/analyses/<analysis_id>/results', methods=['GET'])
+def query_analysis_results(analysis_id):
+    """
+    分页查询已保存的结果
+    支持 sentiment、min_score/max_score、start_date/end_date、location、keyword 筛选,
+    按 sort(row/score/positive/neutral/negative/date/location)和 order(asc/desc)排序
+    """
+    _, error = _get_stored_analysis(analysis_id)
+    if error:
+        return error
+    filters, error = _get_result_filters()
+    if error:
+        return error
+    
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 100, type=int), 1), 1000)
+    try:
+        with metrics.timed('result_store.query'):
+            results, total = result_store.query(
+                analysis_id, filters,
+                sort=request.args.get('sort', 'row'),
+                order=request.args.get('order', 'asc'),
+                page=page,
+                per_page=per_page
+            )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'analysis_id': analysis_id,
+        'results': results,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'pages': (total + per_page - 1) // per_page
+    })
+
+@app.route('/api/analyses/<analysis_id>/top', methods=['GET'])
+def top_analysis_results(analysis_id):
+    """
+    最积极(direction=positive)或最消极(direction=negative)的前k条评论
+    支持与结果查询相同的筛选参数
+    """
+    _, error = _get_stored_analysis(analysis_id)
+    if error:
+        return error
+    filters, error = _get_result_filters()
+    if error:
+        return error
+    
+    # 与分页的 per_page 一样限制在 1 到 1000 之间
+    k = min(max(request.args.get('k', 10, type=int), 1), 1000)
+    try:
+        with metrics.timed('result_store.top_k'):
+            results = result_store.top_k(analysis_id, k, request.args.get('direction', 'positive'), filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'success': True, 'analysis_id': analysis_id, 'results': results})
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """健康检查端点"""
-    return jsonify({'status': 'healthy', 'message': '情感分析服务运行正常'})
+    """健康检查端点,模型预热完成前或预热失败时返回503"""
+    warm_up = analyzer_registry.get_status()
+    if warm_up['error']:
+        return jsonify({'status': 'unhealthy', 'message': '模型预热失败', 'warm_up': warm_up}), 503
+    if not warm_up['ready']:
+        return jsonify({'status': 'starting', 'message': '模型预热中', 'warm_up': warm_up}), 503
+    return jsonify({'status': 'healthy', 'message': '情感分析服务运行正常', 'warm_up': warm_up})
+
+@app.route('/api/cache', methods=['GET'])
+def cache_stats():
+    """结果缓存统计"""
+    return jsonify(result_cache.get_stats())
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus文本格式的运行指标"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/profiles', methods=['GET'])
+def list_profiles():
+    """已保存的剖析(从新到旧)"""
+    if profile_store is None:
+        return jsonify({'error': '剖析功能未启用(PROFILING_ENABLED)'}), 404
+    return jsonify({'profiles': profile_store.list()})
+
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    """
+    下载剖析结果
+    format=pstats(默认,cProfile数据)、collapsed(折叠栈,用于火焰图)或 text(按累计耗时排序的摘要)
+    """
+    if profile_store is None:
+        return jsonify({'error': '剖析功能未启用(PROFILING_ENABLED)'}), 404
+    output_format = request.args.get('format', 'pstats')
+    if output_format not in PROFILE_FORMATS:
+        return jsonify({'error': f'format 必须是 {", ".join(PROFILE_FORMATS)} 之一'}), 400
+    if profile_store.get(profile_id) is None:
+        return jsonify({'error': '剖析不存在或已被清理'}), 404
+    
+    if output_format == 'text':
+        return Response(profile_store.summary(profile_id), content_type='text/plain; charset=utf-8')
+    path = os.path.abspath(profile_store.path(profile_id, output_format))
+    return send_file(path, as_attachment=True, download_name=os.path.basename(path),
+                     mimetype='application/octet-stream' if output_format == 'pstats' else 'text/plain')
 
 @app.route('/api/config', methods=['GET'])
 def get_config():
@@ -339,10 +688,35 @@ def get_config():
             {'value': 'sentiment_dict', 'label': '情感词典特征'},
             {'value': 'tfidf', 'label': 'TF-IDF特征'}
         ],
+        'time_granularities': [
+            {'value': 'day', 'label': '按日'},
+            {'value': 'week', 'label': '按周'},
+            {'value': 'month', 'label': '按月'}
+        ],
+        'models': [
+            {'value': 'rule', 'label': '规则+SnowNLP/TextBlob', 'languages': ['zh', 'en']},
+            {
+                'value': 'linear',
+                'label': '线性分类器(需训练)',
+                'languages': [
+                    language for language in ('zh', 'en')
+                    if os.path.exists(model_path(language, app.config['LINEAR_MODEL_DIR']))
+                ]
+            }
+        ],
         'ensemble_methods': [
             {'value': 'voting', 'label': '投票集成'},
             {'value': 'stacking', 'label': '堆叠集成'}
-        ]
+        ],
+        'ensemble_members': [
+            {'value': 'rule', 'label': '规则模型'},
+            {'value': 'rule_strict', 'label': '规则模型(严格阈值)'},
+            {'value': 'rule_loose', 'label': '规则模型(宽松阈值)'},
+            {'value': 'linear', 'label': '线性分类器(需训练)'}
+        ],
+        # 已训练的堆叠元模型只对训练时的成员组合生效,其他组合使用固定权重
+        'stacking': {language: _stacking_status(language) for language in ('zh', 'en')},
+        'lexicon': lexicon_store.get_status()
     })
 
 if __name__ == '__main__':
@@ -0,0 +1,231 @@
+"""
+性能基准脚本
+
+用法:
+    python benchmark.py                      # 逐特征族分词 vs 共享分析上下文的耗时,使用合成的10万条中文评论
+    python benchmark.py data.csv             # 使用指定CSV文件(需包含评论内容/comment/text/review列)
+    python benchmark.py --rows 20000         # 指定合成评论条数
+    python benchmark.py --stage time         # 时间统计: 逐日期过滤 vs 单次groupby(一年、100万条)
+    python benchmark.py --stage calibration  # 概率映射: 逐条计算 vs 批量向量化(100万条)
+    python benchmark.py --stage snownlp      # SnowNLP得分: SnowNLP(text).sentiments vs 稀疏矩阵批量打分,并校验误差
+"""
+import sys
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from snownlp import SnowNLP
+from sentiment_analyzer import SentimentAnalyzer
+from aggregation import calculate_time_statistics
+from models import MultiClassSentiment, lexicon_counts
+from snownlp_scorer import get_scorer
+from pipeline import COMMENT_COLUMNS, find_column
+from benchmark_suite import generate_corpus, COLUMNS
+
+ALL_FEATURES = ['basic', 'ngram', 'sentiment_dict', 'tfidf']
+
+
+def generate_zh_comments(rows: int, seed: int = 42) -> list:
+    """生成合成中文评论(与 benchmark_suite 使用同一个语料生成器,不含重复评论)"""
+    corpus = generate_corpus('zh', rows, duplicate_ratio=0.0, seed=seed)
+    return corpus[COLUMNS['zh'][0]].tolist()
+
+
+def load_comments(path: str) -> list:
+    """从CSV文件读取评论"""
+    df = pd.read_csv(path, encoding='utf-8')
+    comment_col = find_column(df.columns, COMMENT_COLUMNS)
+    if comment_col is None:
+        raise ValueError('CSV文件必须包含评论内容、comment、text或review列')
+    return df[comment_col].fillna('').astype(str).tolist()
+
+
+def run_per_family(analyzer: SentimentAnalyzer, texts: list) -> None:
+    """
+    逐特征族分词: 每个特征族各自构建分析上下文(各自分词),模型再构建SnowNLP对象重新分词
+
+    只去掉了分析上下文的共享,词典匹配(自动机)、特征实现和概率映射均为当前代码,
+    因此与共享上下文的差值只反映重复分词的开销,不是与最初实现的对比
+    """
+    extractor = analyzer.feature_extractor
+    for text in texts:
+        clean_text = analyzer.preprocess_text(text)
+        if not clean_text:
+            continue
+        features = {
+            'basic': extractor.extract_basic_features(clean_text),
+            'ngram': extractor.extract_ngram_features(clean_text),
+            'sentiment_dict': extractor.extract_sentiment_dict_features(clean_text),
+            'tfidf': extractor.extract_tfidf_features(clean_text),
+        }
+        score = SnowNLP(clean_text).sentiments
+        analyzer.model._calculate_probabilities(score, features)
+
+
+def run_shared(analyzer: SentimentAnalyzer, texts: list) -> None:
+    """新流程: 每条评论构建一次分析上下文"""
+    for text in texts:
+        analyzer.analyze_single(text)
+
+
+def timeit(func, *args) -> float:
+    """返回函数执行耗时(秒)"""
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def generate_result_frame(rows: int, seed: int = 42) -> pd.DataFrame:
+    """生成覆盖一年日期的合成分析结果"""
+    rng = np.random.default_rng(seed)
+    positive = rng.random(rows)
+    negative = (1 - positive) * rng.random(rows)
+    neutral = 1 - positive - negative
+    probs = np.column_stack([positive, neutral, negative])
+    dates = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 366, rows), unit='D')
+    return pd.DataFrame({
+        'date': dates.strftime('%Y-%m-%d'),
+        'sentiment': np.array(['positive', 'neutral', 'negative'])[probs.argmax(axis=1)],
+        'positive': positive,
+        'neutral': neutral,
+        'negative': negative
+    })
+
+
+def legacy_time_statistics(results: pd.DataFrame) -> dict:
+    """旧实现: 对每个日期重新过滤整张表"""
+    time_df = results.assign(date=pd.to_datetime(results['date'], errors='coerce')).dropna(subset=['date'])
+    time_df['date_str'] = time_df['date'].dt.strftime('%Y-%m-%d')
+    sentiment_by_date = {}
+    avg_prob_by_date = {}
+    for date in sorted(time_df['date_str'].unique()):
+        date_data = time_df[time_df['date_str'] == date]
+        sentiment_by_date[date] = {
+            name: int((date_data['sentiment'] == name).sum())
+            for name in ('positive', 'neutral', 'negative')
+        }
+        avg_prob_by_date[date] = {
+            name: float(date_data[name].mean())
+            for name in ('positive', 'neutral', 'negative')
+        }
+    return {'sentiment_by_date': sentiment_by_date, 'avg_prob_by_date': avg_prob_by_date}
+
+
+def bench_time(rows: int) -> None:
+    """时间统计基准"""
+    results = generate_result_frame(rows)
+
+    print("=" * 50)
+    print(f"时间统计  结果条数: {rows}  日期数: {results['date'].nunique()}")
+    print("=" * 50)
+
+    legacy = timeit(legacy_time_statistics, results)
+    grouped = timeit(calculate_time_statistics, results)
+
+    print(f"旧实现(逐日期过滤): {legacy:.2f}s")
+    print(f"新实现(单次groupby): {grouped:.2f}s")
+    if grouped > 0:
+        print(f"加速比: {legacy / grouped:.2f}x")
+
+
+def bench_calibration(rows: int) -> None:
+    """概率映射基准"""
+    rng = np.random.default_rng(42)
+    scores = rng.random(rows).tolist()
+    features_list = [
+        {'sentiment_dict': {'positive_words': int(p), 'negative_words': int(n)}}
+        for p, n in rng.integers(0, 3, (rows, 2))
+    ]
+    model = MultiClassSentiment()
+
+    print("=" * 50)
+    print(f"概率映射  条数: {rows}")
+    print("=" * 50)
+
+    def scalar():
+        return [model.predict_from_score(score, features) for score, features in zip(scores, features_list)]
+
+    word_counts = lexicon_counts(features_list)
+    legacy = timeit(scalar)
+    vectorized = timeit(model.predict_arrays, scores, word_counts)
+    # 与 MultiClassSentiment.predict_batch 计算得分后的路径相同
+    batched = timeit(model.predict_scores, scores, features_list)
+
+    print(f"逐条计算:               {legacy:.2f}s")
+    print(f"向量化计算(数组):       {vectorized:.2f}s")
+    print(f"批量计算(含特征和结果): {batched:.2f}s")
+    if vectorized > 0:
+        print(f"概率映射加速比: {legacy / vectorized:.2f}x")
+
+
+def bench_snownlp(texts: list) -> None:
+    """SnowNLP得分基准,同时以 SnowNLP(text).sentiments 为参照校验批量打分器"""
+    from snownlp import sentiment
+
+    texts = [text for text in texts if text]
+    scorer = get_scorer()
+
+    print("=" * 50)
+    print(f"SnowNLP得分  评论条数: {len(texts)}  词表大小: {len(scorer.vocabulary)}")
+    print("=" * 50)
+
+    reference = []
+    legacy = timeit(lambda: reference.extend(SnowNLP(text).sentiments for text in texts))
+
+    docs = []
+    segment = timeit(lambda: docs.extend(sentiment.classifier.handle(text) for text in texts))
+    scores = []
+    batched = timeit(lambda: scores.extend(scorer.score_batch(docs)))
+
+    deviation = np.abs(np.array(reference) - np.array(scores))
+    print(f"SnowNLP(text).sentiments: {legacy:.2f}s")
+    print(f"分词+停用词过滤:          {segment:.2f}s")
+    print(f"稀疏矩阵批量打分:         {batched:.4f}s")
+    print(f"最大绝对误差: {deviation.max():.3e}  平均绝对误差: {deviation.mean():.3e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='情感分析流水线性能基准')
+    parser.add_argument('csv', nargs='?', help='评论CSV文件路径')
+    parser.add_argument('--rows', type=int, default=None, help='合成评论条数')
+    parser.add_argument('--stage', choices=['context', 'time', 'calibration', 'snownlp'], default='context', help='基准项目')
+    args = parser.parse_args()
+
+    if args.stage == 'time':
+        bench_time(args.rows or 1000000)
+        return
+    if args.stage == 'calibration':
+        bench_calibration(args.rows or 1000000)
+        return
+
+    texts = load_comments(args.csv) if args.csv else generate_zh_comments(args.rows or 100000)
+    if args.stage == 'snownlp':
+        bench_snownlp(texts)
+        return
+
+    analyzer = SentimentAnalyzer(language='zh', features=ALL_FEATURES)
+
+    # 预热jieba词典和SnowNLP模型,避免计入首次加载时间
+    run_shared(analyzer, texts[:10])
+
+    print("=" * 50)
+    print(f"评论条数: {len(texts)}  特征: {', '.join(ALL_FEATURES)}")
+    print("=" * 50)
+
+    per_family = timeit(run_per_family, analyzer, texts)
+    shared = timeit(run_shared, analyzer, texts)
+
+    n = max(len(texts), 1)
+    print(f"逐特征族分词:       {per_family:.2f}s  {per_family / n * 1e6:.1f} µs/条")
+    print(f"共享分析上下文:     {shared:.2f}s  {shared / n * 1e6:.1f} µs/条")
+    if shared > 0:
+        print(f"加速比: {per_family / shared:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
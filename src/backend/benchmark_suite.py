@@ -0,0 +1,428 @@
+"""
+分析流水线基准套件
+
+在合成的中英文评论语料上分阶段测量吞吐量(条/秒)和峰值内存(RSS),
+结果保存为JSON,可与之前的运行结果对比并标记性能回退
+
+用法:
+    python benchmark_suite.py                                   # 中英文各1000条,结果写入 benchmark_results/
+    python benchmark_suite.py --sizes 1000 100000 1000000       # 多个语料规模
+    python benchmark_suite.py --language zh --duplicate-ratio 0.3 --mean-fragments 5
+    python benchmark_suite.py --stages preprocess model e2e     # 只运行部分阶段
+    python benchmark_suite.py --compare benchmark_results/base.json --tolerance 0.15
+    python benchmark_suite.py --write-csv corpora/              # 同时保存生成的语料CSV
+
+分词、特征、模型等逐条分析的阶段最多使用 --max-analysis-rows 条评论(默认10万),
+预处理、统计、聚合和序列化阶段使用完整语料
+"""
+import sys
+import os
+import io
+import gc
+import json
+import time
+import platform
+import argparse
+import resource
+import threading
+import subprocess
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sentiment_analyzer import SentimentAnalyzer
+from models import MultiClassSentiment, EnsembleModel
+from aggregation import calculate_time_statistics, calculate_location_statistics
+from pipeline import serialize_results
+from feature_engineering import FEATURE_FAMILIES
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_results')
+
+# 全部阶段(features.* 每个特征族一项)
+STAGES = (
+    ['preprocess', 'context']
+    + [f'features.{family}' for family in FEATURE_FAMILIES]
+    + ['model', 'ensemble', 'analyze', 'statistics', 'aggregation.time',
+       'aggregation.location', 'serialization', 'e2e']
+)
+
+# 逐条分析、耗时与评论数成正比且较大的阶段
+ANALYSIS_STAGES = {'context', 'model', 'ensemble', 'analyze', 'e2e'} | {
+    f'features.{family}' for family in FEATURE_FAMILIES
+}
+
+FRAGMENTS = {
+    'zh': [
+        '质量很好', '非常满意', '物流太慢了', '包装也不好', '还可以', '价格合适',
+        '超级棒的购物体验', '下次还会再来', '太差了', '完全不值这个价格', '默认好评',
+        '做工精致', '客服态度不错', '有点失望', '颜色和图片不一样', '性价比很高',
+        '用了几天就坏了', '发货很快', '尺码偏小', '推荐购买', '不是很喜欢', '味道一般',
+        '电池很耐用', '屏幕有划痕', '穿着很舒服', '和描述的一样', '退货很麻烦', '非常好吃'
+    ],
+    'en': [
+        'great quality', 'very satisfied', 'shipping was too slow', 'the packaging was bad',
+        'it is okay', 'fair price', 'amazing shopping experience', 'will buy again',
+        'terrible', 'not worth the money', 'well made', 'customer service was helpful',
+        'a bit disappointed', 'color differs from the picture', 'great value',
+        'broke after a few days', 'fast delivery', 'runs small', 'highly recommend',
+        'not really my style', 'tastes average', 'battery lasts long', 'screen has scratches',
+        'very comfortable', 'exactly as described', 'returns are a hassle', 'delicious'
+    ]
+}
+
+LOCATIONS = {
+    'zh': ['北京', '上海', '广东', '浙江', '江苏', '四川', '湖北', '山东', '福建', '河南',
+           '湖南', '陕西', '重庆', '天津', '辽宁', '安徽', '江西', '云南', '广西', '黑龙江'],
+    'en': ['California', 'Texas', 'New York', 'Florida', 'Illinois', 'Washington', 'Ohio',
+           'Georgia', 'Michigan', 'Arizona', 'Oregon', 'Colorado', 'Virginia', 'Nevada']
+}
+
+COLUMNS = {
+    'zh': ('评论内容', '评论日期', '购买地'),
+    'en': ('comment', 'date', 'location')
+}
+
+
+def generate_corpus(language: str, rows: int, duplicate_ratio: float = 0.1,
+                    mean_fragments: float = 3.0, missing_ratio: float = 0.05,
+                    seed: int = 42) -> pd.DataFrame:
+    """
+    生成合成评论语料
+
+    Args:
+        language: 语言类型
+        rows: 评论条数
+        duplicate_ratio: 与之前某条评论完全相同的比例(模拟"默认好评"等重复评论)
+        mean_fragments: 每条评论的平均短语数,实际短语数服从 1 + 泊松分布,长度呈右偏分布
+        missing_ratio: 日期和地域缺失的比例
+        seed: 随机种子
+
+    Returns:
+        包含评论、日期(一年内)和地域(按Zipf分布)三列的DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    fragments = np.array(FRAGMENTS[language], dtype=object)
+    separator = ',' if language == 'zh' else ', '
+    endings = ['', '!', '。'] if language == 'zh' else ['', '!', '.']
+
+    lengths = 1 + rng.poisson(max(mean_fragments - 1, 0), rows)
+    comments = np.empty(rows, dtype=object)
+    for i, length in enumerate(lengths):
+        parts = fragments[rng.choice(len(fragments), min(length, len(fragments)), replace=False)]
+        comments[i] = separator.join(parts) + endings[rng.integers(len(endings))]
+
+    # 重复评论复制自前面的任意一条
+    if rows > 1 and duplicate_ratio > 0:
+        duplicates = np.flatnonzero(rng.random(rows) < duplicate_ratio)
+        duplicates = duplicates[duplicates > 0]
+        comments[duplicates] = comments[(rng.random(len(duplicates)) * duplicates).astype(int)]
+
+    dates = (pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 366, rows), unit='D')).strftime('%Y-%m-%d')
+    dates = np.where(rng.random(rows) < missing_ratio, None, np.asarray(dates, dtype=object))
+
+    locations = np.array(LOCATIONS[language], dtype=object)
+    weights = 1 / np.arange(1, len(locations) + 1)
+    location_values = locations[rng.choice(len(locations), rows, p=weights / weights.sum())]
+    location_values = np.where(rng.random(rows) < missing_ratio, None, location_values)
+
+    comment_col, date_col, location_col = COLUMNS[language]
+    return pd.DataFrame({comment_col: comments, date_col: dates, location_col: location_values})
+
+
+def _current_rss() -> int:
+    """当前常驻内存(字节),不支持 /proc 的平台返回进程峰值"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 以字节计,Linux 以KB计
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class RSSSampler:
+    """在后台线程中定期采样RSS,记录阶段内的峰值"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.start_rss = 0
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self) -> 'RSSSampler':
+        self.start_rss = self.peak_rss = _current_rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, _current_rss())
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, _current_rss())
+
+
+def measure(func: Callable[[], Any], rows: int) -> Tuple[Dict[str, Any], Any]:
+    """
+    运行一个阶段并记录耗时、吞吐量和内存
+
+    Returns:
+        (阶段指标, 函数返回值)
+    """
+    gc.collect()
+    with RSSSampler() as sampler:
+        start = time.perf_counter()
+        value = func()
+        seconds = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'seconds': round(seconds, 6),
+        'comments_per_sec': round(rows / seconds, 2) if seconds > 0 else None,
+        'peak_rss_mb': round(sampler.peak_rss / 2 ** 20, 2),
+        'rss_growth_mb': round((sampler.peak_rss - sampler.start_rss) / 2 ** 20, 2)
+    }, value
+
+
+def _post_csv(client, csv_bytes: bytes, language: str) -> None:
+    """通过Flask测试客户端上传CSV并完成整个请求(先清空服务的结果缓存)"""
+    import app as app_module
+    app_module.result_cache.clear()
+    response = client.post('/api/analyze', data={
+        'file': (io.BytesIO(csv_bytes), 'benchmark.csv'),
+        'language': language,
+        'features[]': ['basic', 'sentiment_dict']
+    }, content_type='multipart/form-data')
+    if response.status_code != 200:
+        raise RuntimeError(f'/api/analyze 返回 {response.status_code}: {response.get_data(as_text=True)[:200]}')
+
+
+def run_benchmark(corpus: pd.DataFrame, language: str, stages: List[str],
+                  max_analysis_rows: int, client=None) -> Dict[str, Dict[str, Any]]:
+    """
+    在一份语料上依次运行各阶段
+
+    Args:
+        corpus: generate_corpus 生成的语料
+        language: 语言类型
+        stages: 要运行的阶段
+        max_analysis_rows: 逐条分析阶段使用的最大评论数
+        client: Flask测试客户端,e2e 阶段使用
+
+    Returns:
+        {阶段名: 指标}
+    """
+    comment_col, date_col, location_col = COLUMNS[language]
+    texts = corpus[comment_col].tolist()
+    sample = texts[:max_analysis_rows]
+    # 缓存会让重复运行直接命中,基准中不使用
+    analyzer = SentimentAnalyzer(language=language, features=list(FEATURE_FAMILIES))
+    extractor = analyzer.feature_extractor
+    lexicon = extractor.lexicon
+    results = {}
+
+    # 预热jieba词典、SnowNLP和TextBlob,避免计入首次加载时间
+    analyzer.analyze_batch(sample[:10])
+
+    def run(name, func, rows):
+        if name in stages:
+            results[name], value = measure(func, rows)
+            print(f"  {name:<24} {rows:>9} 条  {results[name]['seconds']:>9.3f}s  "
+                  f"{results[name]['comments_per_sec'] or 0:>12.1f} 条/秒  峰值 {results[name]['peak_rss_mb']:.1f} MB")
+            return value
+        return func()
+
+    # 后续阶段依赖前面阶段的输出,未选中的阶段同样执行但不计时
+    clean_all = run('preprocess', lambda: [analyzer.preprocess_text(text) for text in texts], len(texts))
+    clean = [text for text in clean_all[:max_analysis_rows] if text]
+
+    if ANALYSIS_STAGES.intersection(stages) - {'analyze', 'e2e'}:
+        def tokenize():
+            contexts = [extractor.build_context(text) for text in clean]
+            for context in contexts:
+                context.tokens
+            return contexts
+
+        contexts = run('context', tokenize, len(clean))
+        features_list = [{} for _ in clean]
+        extractors = {
+            'basic': extractor.extract_basic_features,
+            'ngram': extractor.extract_ngram_features,
+            'char': extractor.extract_char_features,
+            'sentiment_dict': lambda text, context: extractor.extract_sentiment_dict_features(
+                text, context=context, lexicon=lexicon),
+            'tfidf': extractor.extract_tfidf_features
+        }
+        for family, extract in extractors.items():
+            values = run(f'features.{family}', lambda: [
+                extract(text, context=context) for text, context in zip(clean, contexts)
+            ], len(clean))
+            for features, value in zip(features_list, values):
+                features[family] = value
+
+        # 模型和集成各自使用新的上下文,两者都包含SnowNLP分词
+        if 'model' in stages:
+            model = MultiClassSentiment(language=language)
+            fresh = [extractor.build_context(text) for text in clean]
+            run('model', lambda: model.predict_batch(clean, features_list, fresh), len(clean))
+        if 'ensemble' in stages:
+            ensemble = EnsembleModel(language=language)
+            fresh = [extractor.build_context(text) for text in clean]
+            run('ensemble', lambda: ensemble.predict_batch(clean, features_list, fresh), len(clean))
+
+    # 完整的逐条分析(含批内去重),其结果列用于后续统计阶段;未选中时只分析少量样本
+    analyzed = sample if 'analyze' in stages else sample[:1000]
+    frame = pd.DataFrame(run('analyze', lambda: analyzer.analyze_columns(analyzed), len(analyzed)))
+    # 统计和聚合阶段使用完整语料: 分析结果循环扩展到语料大小
+    repeats = -(-len(texts) // max(len(frame), 1))
+    frame = pd.concat([frame] * repeats, ignore_index=True).iloc[:len(texts)]
+    frame['date'] = corpus[date_col].to_numpy()
+    frame['location'] = corpus[location_col].to_numpy()
+
+    run('statistics', lambda: analyzer.get_column_statistics(frame), len(frame))
+    run('aggregation.time', lambda: calculate_time_statistics(frame, 'day'), len(frame))
+    run('aggregation.location', lambda: calculate_location_statistics(frame), len(frame))
+
+    if 'serialization' in stages:
+        payload = {'success': True, 'total': len(frame), 'results': frame, 'statistics': {}}
+        run('serialization', lambda: json.dumps(serialize_results(payload), ensure_ascii=False), len(frame))
+
+    if 'e2e' in stages and client is not None:
+        csv_bytes = corpus.iloc[:max_analysis_rows].to_csv(index=False).encode('utf-8')
+        run('e2e', lambda: _post_csv(client, csv_bytes, language), min(len(corpus), max_analysis_rows))
+
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    """当前代码的git提交,不在git仓库中时返回None"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    与基线结果对比
+
+    吞吐量低于基线 (1 - tolerance) 倍或峰值内存高于基线 (1 + tolerance) 倍时记为回退
+
+    Returns:
+        回退描述列表
+    """
+    def index(report):
+        return {
+            (run['language'], run['rows'], stage): metrics
+            for run in report['runs'] for stage, metrics in run['stages'].items()
+        }
+
+    base = index(baseline)
+    regressions = []
+    print("=" * 70)
+    print(f"与基线对比 (基线提交: {baseline['meta'].get('commit')}, 容差 {tolerance:.0%})")
+    print("=" * 70)
+    for key, metrics in index(current).items():
+        old = base.get(key)
+        if old is None or not old.get('comments_per_sec') or not metrics.get('comments_per_sec'):
+            continue
+        ratio = metrics['comments_per_sec'] / old['comments_per_sec']
+        memory_ratio = metrics['peak_rss_mb'] / old['peak_rss_mb'] if old['peak_rss_mb'] else 1.0
+        flags = []
+        if ratio < 1 - tolerance:
+            flags.append(f'吞吐量下降 {1 - ratio:.0%}')
+        if memory_ratio > 1 + tolerance:
+            flags.append(f'峰值内存增加 {memory_ratio - 1:.0%}')
+        language, rows, stage = key
+        print(f"  {language} {rows:>9} {stage:<24} 吞吐量 {ratio:>6.2f}x  内存 {memory_ratio:>6.2f}x"
+              f"  {'回退: ' + ', '.join(flags) if flags else ''}")
+        if flags:
+            regressions.append(f"{language}/{rows}/{stage}: {', '.join(flags)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='情感分析流水线基准套件')
+    parser.add_argument('--language', choices=['zh', 'en', 'both'], default='both', help='语料语言')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000], help='语料规模(评论条数)')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1, help='重复评论比例')
+    parser.add_argument('--mean-fragments', type=float, default=3.0, help='每条评论的平均短语数')
+    parser.add_argument('--missing-ratio', type=float, default=0.05, help='日期和地域缺失比例')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, metavar='STAGE',
+                        help=f'运行的阶段: {", ".join(STAGES)}')
+    parser.add_argument('--max-analysis-rows', type=int, default=100000, help='逐条分析阶段使用的最大评论数')
+    parser.add_argument('-o', '--output', default=None, help='结果JSON路径(默认 benchmark_results/<时间>.json)')
+    parser.add_argument('--compare', default=None, help='基线结果JSON,对比并标记回退')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='判定回退的相对容差')
+    parser.add_argument('--write-csv', default=None, metavar='DIR', help='将生成的语料保存为CSV')
+    args = parser.parse_args()
+
+    client = None
+    if 'e2e' in args.stages:
+        from app import app
+        app.config['TESTING'] = True
+        client = app.test_client()
+
+    languages = ['zh', 'en'] if args.language == 'both' else [args.language]
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'duplicate_ratio': args.duplicate_ratio,
+            'mean_fragments': args.mean_fragments,
+            'max_analysis_rows': args.max_analysis_rows,
+            'seed': args.seed
+        },
+        'runs': []
+    }
+
+    for language in languages:
+        for rows in args.sizes:
+            corpus = generate_corpus(
+                language, rows, duplicate_ratio=args.duplicate_ratio,
+                mean_fragments=args.mean_fragments, missing_ratio=args.missing_ratio, seed=args.seed
+            )
+            if args.write_csv:
+                os.makedirs(args.write_csv, exist_ok=True)
+                corpus.to_csv(os.path.join(args.write_csv, f'{language}_{rows}.csv'), index=False)
+
+            print("=" * 70)
+            print(f"语言: {language}  评论条数: {rows}  重复比例: {args.duplicate_ratio}")
+            print("=" * 70)
+            stages = run_benchmark(corpus, language, args.stages, args.max_analysis_rows, client)
+            report['runs'].append({'language': language, 'rows': rows, 'stages': stages})
+
+    output = args.output or os.path.join(DEFAULT_OUTPUT_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"发现 {len(regressions)} 项性能回退")
+            sys.exit(1)
+        print("未发现性能回退")
+
+
+if __name__ == '__main__':
+    main()
@@ -10,7 +10,9 @@ class Config:
     
     # 文件上传配置
     UPLOAD_FOLDER = 'uploads'
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+    MAX_CONTENT_LENGTH = 512 * 1024 * 1024  # 512MB,流式格式(ndjson/columnar)和异步任务按块读取和分析
+    JSON_MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB,format=json 在编码前保留全部逐条结果,上传大小单独限制
+    CSV_CHUNK_SIZE = 5000  # 流式读取CSV时每块的行数
     ALLOWED_EXTENSIONS = {'csv'}
     
     # CORS配置 - 添加所有可能的前端端口
@@ -23,9 +25,68 @@ class Config:
         'http://127.0.0.1:8100'
     ]
     
+    # 异步任务配置
+    JOB_WORKERS = 2  # 同时执行的分析任务数
+    JOB_QUEUE_SIZE = 16  # 排队和执行中任务的上限,超出时返回429
+    JOB_TTL = 3600  # 已完成任务结果的保留时间(秒)
+    
     # 分析配置
     DEFAULT_LANGUAGE = 'zh'
     DEFAULT_FEATURES = ['basic', 'sentiment_dict']
+    TIME_GRANULARITY = 'day'  # 时间统计默认粒度: day/week/month
+    LOCATION_TOP_N = 20  # 地域统计默认返回的地域数量
+    TOP_TERMS_N = 0  # 每个情感类别返回的TF-IDF代表词数量,0表示不统计(可按请求用 top_terms_n 开启)
+    TFIDF_HASH_FEATURES = 2 ** 18  # 哈希特征维数,限制大语料下的词表和文档频率内存;设置为None时建立显式词表
+    TFIDF_VECTORIZER_PATH = os.environ.get('TFIDF_VECTORIZER_PATH')  # 预先拟合并保存的向量化器(npz),沿用其词表和IDF
+    
+    # 启动时在后台预热jieba、SnowNLP和TextBlob,预热完成前 /api/health 返回503
+    WARM_UP_ON_START = True
+    ANALYZER_REGISTRY_SIZE = 16  # 进程内保留的分析器(不同语言/特征/模型配置)数量上限
+    
+    # 并行分析配置
+    ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', 0))  # 工作进程数,0表示串行分析
+    PARALLEL_MIN_BATCH = 2000  # 评论数低于该值时走串行路径
+    
+    # 情感词典目录,未设置时使用随代码发布的 lexicons/;文件修改后自动重新加载
+    LEXICON_DIR = os.environ.get('LEXICON_DIR')
+    
+    # 线性模型目录(train_model.py 的输出,文件名为 linear_{language}.npz / stacking_{language}.npz),未设置时使用 trained_models/
+    LINEAR_MODEL_DIR = os.environ.get('LINEAR_MODEL_DIR')
+    
+    # 模型集成默认配置,可按请求覆盖;stacking 需先用 train_model.py --stacking 训练元模型,否则使用固定权重
+    ENSEMBLE_METHOD = 'voting'
+    ENSEMBLE_MEMBERS = ['rule', 'rule_strict', 'rule_loose']
+    
+    # 近重复聚类(请求参数 near_duplicates=true 时启用): 字符2-gram集合的Jaccard相似度不低于该值、
+    # 且各分句命中的情感词及其否定极性相同的评论只分析一个代表
+    NEAR_DUPLICATE_THRESHOLD = 0.7
+    NEAR_DUPLICATE_MIN_LENGTH = 4  # 预处理后短于该长度的评论不参与聚类
+    
+    # 请求头带有该字段(值为1/true)时,响应附带本次请求各阶段的耗时明细
+    METRICS_DEBUG_HEADER = 'X-Debug-Timing'
+    
+    # 单次分析剖析: 请求带 profile=true 参数或 X-Profile: 1 请求头时记录 cProfile 和栈采样
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false') == 'true'
+    PROFILE_FOLDER = os.environ.get('PROFILE_FOLDER', 'profiles')
+    PROFILE_MAX_COUNT = 20  # 最多保留的剖析数量,超出时删除最早的剖析
+    PROFILE_MAX_BYTES = 50 * 1024 * 1024  # 剖析文件总大小上限
+    PROFILE_SAMPLE_INTERVAL = 0.005  # 栈采样间隔(秒)
+    
+    # 流式响应(format=ndjson/columnar)的gzip压缩级别,客户端请求头 Accept-Encoding 含gzip时压缩,0表示不压缩
+    RESPONSE_GZIP_LEVEL = 6
+    
+    # 结果缓存配置
+    RESULT_CACHE_SIZE = 50000  # 内存中缓存的评论结果条数
+    RESULT_CACHE_PATH = os.environ.get('RESULT_CACHE_PATH')  # SQLite持久化路径,未设置时仅缓存在内存
+    RESULT_CACHE_DISK_MAX_ROWS = 1000000  # SQLite中保留的结果条数上限,超出时删除最早写入的结果
+    
+    # 分析结果存储: 设置环境变量 RESULT_STORE_PATH 后逐条结果(含评论原文)写入该SQLite文件,
+    # 可通过 /api/analyses/<id>/results 分页筛选;未设置时不保存
+    RESULT_STORE_PATH = os.environ.get('RESULT_STORE_PATH')
+    RESULT_STORE_MAX_ANALYSES = 50  # 最多保留的分析数量,超出时删除最早的分析
+    RESULT_STORE_MAX_BYTES = 512 * 1024 * 1024  # 数据库占用空间上限,超出时删除最早的分析
+    RESULT_STORE_MAX_ROW_RESULTS = 2000000  # 增量分析保存的逐行结果数量上限,超出时删除最早写入的结果
+    INCREMENTAL_ANALYSIS = True  # 启用结果存储时默认按行指纹(评论原文 + 分析配置)复用已保存的逐行结果,可按请求用 incremental=false 关闭
     
     # 模型配置
     POSITIVE_THRESHOLD = 0.6
@@ -35,6 +96,7 @@ class DevelopmentConfig(Config):
     """开发环境配置"""
     DEBUG = True
     TESTING = False
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'true') == 'true'
 
 class ProductionConfig(Config):
     """生产环境配置"""
@@ -2,67 +2,52 @@
 特征工程模块
 实现多种特征提取方法
 """
-import jieba
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence
 from collections import Counter
+from collections.abc import Mapping
 import numpy as np
+from analysis_context import AnalysisContext
+from lexicon import Lexicon, get_store
+import metrics
+
+# 支持的特征族
+FEATURE_FAMILIES = ('basic', 'ngram', 'char', 'sentiment_dict', 'tfidf')
 
 class FeatureExtractor:
     """特征提取器"""
     
-    def __init__(self, language='zh', features=None):
+    def __init__(self, language='zh', features=None, lexicon_dir: Optional[str] = None):
         """
         初始化特征提取器
         
         Args:
             language: 语言类型
             features: 要使用的特征列表
+            lexicon_dir: 情感词典目录,默认使用随代码发布的 lexicons/
         """
         self.language = language
         self.features = features or ['basic']
         
-        # 加载情感词典
-        self.sentiment_dict = self._load_sentiment_dict()
-    
-    def _load_sentiment_dict(self) -> Dict[str, int]:
-        """加载情感词典"""
-        # 中文情感词典(简化版)
-        zh_dict = {
-            # 正面词
-            '好': 1, '棒': 1, '优秀': 1, '满意': 1, '喜欢': 1, '推荐': 1,
-            '值得': 1, '赞': 1, '完美': 1, '精致': 1, '舒适': 1, '实惠': 1,
-            '快': 1, '方便': 1, '漂亮': 1, '美': 1, '不错': 1, '可以': 1,
-            # 负面词
-            '差': -1, '坏': -1, '烂': -1, '失望': -1, '不满': -1, '后悔': -1,
-            '垃圾': -1, '骗': -1, '假': -1, '次': -1, '慢': -1, '贵': -1,
-            '难用': -1, '不好': -1, '问题': -1, '糟糕': -1, '质量差': -1
-        }
-        
-        # 英文情感词典(简化版)
-        en_dict = {
-            # Positive
-            'good': 1, 'great': 1, 'excellent': 1, 'perfect': 1, 'love': 1,
-            'like': 1, 'best': 1, 'amazing': 1, 'awesome': 1, 'wonderful': 1,
-            'nice': 1, 'happy': 1, 'satisfied': 1, 'recommend': 1, 'worth': 1,
-            # Negative
-            'bad': -1, 'terrible': -1, 'poor': -1, 'worst': -1, 'hate': -1,
-            'disappointing': -1, 'awful': -1, 'horrible': -1, 'waste': -1,
-            'useless': -1, 'disappointed': -1, 'regret': -1, 'problem': -1
-        }
-        
-        return zh_dict if self.language == 'zh' else en_dict
+        # 情感词典由进程内共享的词典存储加载,文件变化后自动重新编译
+        self.lexicon_store = get_store(lexicon_dir)
+    
+    @property
+    def lexicon(self) -> Lexicon:
+        """当前生效的情感词典"""
+        return self.lexicon_store.get(self.language)
     
-    def _tokenize(self, text: str) -> List[str]:
-        """分词"""
-        if self.language == 'zh':
-            return list(jieba.cut(text))
-        else:
-            return text.lower().split()
+    def build_context(self, text: str) -> AnalysisContext:
+        """构建单条评论的分析上下文"""
+        return AnalysisContext(text, language=self.language)
     
-    def extract_basic_features(self, text: str) -> Dict[str, Any]:
+    def _get_context(self, text: str, context: Optional[AnalysisContext]) -> AnalysisContext:
+        """复用调用方传入的上下文,未传入时新建"""
+        return context if context is not None else self.build_context(text)
+    
+    def extract_basic_features(self, text: str, context: Optional[AnalysisContext] = None) -> Dict[str, Any]:
         """提取基础特征"""
-        tokens = self._tokenize(text)
+        tokens = self._get_context(text, context).tokens
         
         return {
             'word_count': len(tokens),
@@ -71,9 +56,9 @@ class FeatureExtractor:
             'unique_words': len(set(tokens))
         }
     
-    def extract_ngram_features(self, text: str, n=2) -> Dict[str, Any]:
+    def extract_ngram_features(self, text: str, n=2, context: Optional[AnalysisContext] = None) -> Dict[str, Any]:
         """提取N-gram特征"""
-        tokens = self._tokenize(text)
+        tokens = self._get_context(text, context).tokens
         
         # Bi-gram
         bigrams = [' '.join(tokens[i:i+n]) for i in range(len(tokens)-n+1)]
@@ -90,11 +75,13 @@ class FeatureExtractor:
             'top_trigrams': trigram_freq.most_common(3)
         }
     
-    def extract_char_features(self, text: str) -> Dict[str, Any]:
+    def extract_char_features(self, text: str, context: Optional[AnalysisContext] = None) -> Dict[str, Any]:
         """提取字符级特征"""
+        context = self._get_context(text, context)
+        
         # 字符n-gram
-        char_bigrams = [text[i:i+2] for i in range(len(text)-1)]
-        char_trigrams = [text[i:i+3] for i in range(len(text)-2)]
+        char_bigrams = context.char_ngrams(2)
+        char_trigrams = context.char_ngrams(3)
         
         # 特殊字符统计
         exclamation_count = text.count('!') + text.count('!')
@@ -108,33 +95,31 @@ class FeatureExtractor:
             'uppercase_ratio': sum(1 for c in text if c.isupper()) / len(text) if text else 0
         }
     
-    def extract_sentiment_dict_features(self, text: str) -> Dict[str, Any]:
-        """提取情感词典特征"""
-        tokens = self._tokenize(text)
+    def extract_sentiment_dict_features(self, text: str, context: Optional[AnalysisContext] = None,
+                                        lexicon: Optional[Lexicon] = None) -> Dict[str, Any]:
+        """
+        提取情感词典特征
         
-        positive_count = 0
-        negative_count = 0
-        sentiment_score = 0
+        在原始文本上做最左最长匹配,不依赖分词结果,多字词条(如"质量差")不会因切分不同而漏匹配;
+        否定词翻转、程度副词放大窗口内紧随其后的情感词
         
-        for token in tokens:
-            if token in self.sentiment_dict:
-                score = self.sentiment_dict[token]
-                sentiment_score += score
-                if score > 0:
-                    positive_count += 1
-                else:
-                    negative_count += 1
+        Args:
+            lexicon: 使用的词典快照,默认取当前生效的词典
+        """
+        tokens = self._get_context(text, context).tokens
+        features = (lexicon or self.lexicon).analyze(text)
         
         return {
-            'positive_words': positive_count,
-            'negative_words': negative_count,
-            'sentiment_score': sentiment_score,
-            'sentiment_ratio': (positive_count - negative_count) / len(tokens) if tokens else 0
+            'positive_words': features['positive_words'],
+            'negative_words': features['negative_words'],
+            'sentiment_score': features['sentiment_score'],
+            'sentiment_ratio': (features['positive_words'] - features['negative_words']) / len(tokens) if tokens else 0,
+            'matches': features['matches']
         }
     
-    def extract_tfidf_features(self, text: str) -> Dict[str, Any]:
+    def extract_tfidf_features(self, text: str, context: Optional[AnalysisContext] = None) -> Dict[str, Any]:
         """提取TF-IDF特征(简化版)"""
-        tokens = self._tokenize(text)
+        tokens = self._get_context(text, context).tokens
         token_freq = Counter(tokens)
         
         # 计算词频(TF)
@@ -150,28 +135,121 @@ class FeatureExtractor:
             'vocab_size': len(tf_scores)
         }
     
-    def extract(self, text: str) -> Dict[str, Any]:
+    def extract(self, text: str, context: Optional[AnalysisContext] = None,
+                lexicon: Optional[Lexicon] = None) -> Dict[str, Any]:
         """
         提取所有指定的特征
         
         Args:
             text: 输入文本
+            context: 分析上下文,各特征族共享同一份分词结果
+            lexicon: 情感词典快照,同一批评论使用同一版本
             
         Returns:
             特征字典
         """
+        context = self._get_context(text, context)
         all_features = {}
         
         for feature_type in self.features:
             if feature_type == 'basic':
-                all_features['basic'] = self.extract_basic_features(text)
+                all_features['basic'] = self.extract_basic_features(text, context=context)
             elif feature_type == 'ngram':
-                all_features['ngram'] = self.extract_ngram_features(text)
+                all_features['ngram'] = self.extract_ngram_features(text, context=context)
             elif feature_type == 'char':
-                all_features['char'] = self.extract_char_features(text)
+                all_features['char'] = self.extract_char_features(text, context=context)
             elif feature_type == 'sentiment_dict':
-                all_features['sentiment_dict'] = self.extract_sentiment_dict_features(text)
+                all_features['sentiment_dict'] = self.extract_sentiment_dict_features(text, context=context, lexicon=lexicon)
             elif feature_type == 'tfidf':
-                all_features['tfidf'] = self.extract_tfidf_features(text)
+                all_features['tfidf'] = self.extract_tfidf_features(text, context=context)
         
         return all_features
+    
+    def _family_extractor(self, feature_type: str, lexicon: Optional[Lexicon] = None):
+        """特征族对应的提取函数 (text, context) -> 特征,未知特征族返回None"""
+        if feature_type == 'sentiment_dict':
+            return lambda text, context: self.extract_sentiment_dict_features(text, context=context, lexicon=lexicon)
+        return {
+            'basic': self.extract_basic_features,
+            'ngram': self.extract_ngram_features,
+            'char': self.extract_char_features,
+            'tfidf': self.extract_tfidf_features
+        }.get(feature_type)
+    
+    def extract_batch(self, texts: List[str], contexts: List[AnalysisContext],
+                      lexicon: Optional[Lexicon] = None,
+                      required: Optional[Sequence[str]] = None) -> List['FeatureView']:
+        """
+        为一批文本构建按需计算的特征视图
+        
+        required 中的特征族按特征族依次对整批文本预先计算(分词和每个特征族的耗时分别计入运行指标),
+        其余启用的特征族在首次访问时才计算
+        
+        Args:
+            texts: 输入文本列表
+            contexts: 每条文本的分析上下文
+            lexicon: 情感词典快照,同一批评论使用同一版本
+            required: 需要预先计算的特征族,为None时计算所有启用的特征族
+            
+        Returns:
+            特征视图列表,读取结果与逐条调用 extract 相同
+        """
+        views = [FeatureView(self, text, context, lexicon) for text, context in zip(texts, contexts)]
+        families = [
+            feature_type for feature_type in dict.fromkeys(self.features)
+            if feature_type in FEATURE_FAMILIES and (required is None or feature_type in required)
+        ]
+        if not families:
+            return views
+        
+        n = len(texts)
+        with metrics.timed('tokenize', n):
+            for context in contexts:
+                context.tokens
+        
+        for feature_type in families:
+            extractor = self._family_extractor(feature_type, lexicon)
+            with metrics.timed(f'features.{feature_type}', n):
+                for view, text, context in zip(views, texts, contexts):
+                    view._values[feature_type] = extractor(text, context=context)
+        
+        return views
+
+
+class FeatureView(Mapping):
+    """
+    单条评论的特征视图
+    
+    只包含启用的特征族,每个特征族在首次读取时计算并缓存;
+    判断特征族是否存在(in)不会触发计算
+    """
+    
+    def __init__(self, extractor: FeatureExtractor, text: str, context: AnalysisContext,
+                 lexicon: Optional[Lexicon] = None):
+        self._extractor = extractor
+        self._text = text
+        self._context = context
+        self._lexicon = lexicon
+        self._families = [f for f in dict.fromkeys(extractor.features) if f in FEATURE_FAMILIES]
+        self._values = {}
+    
+    def __getitem__(self, feature_type: str) -> Dict[str, Any]:
+        if feature_type not in self._values:
+            if feature_type not in self._families:
+                raise KeyError(feature_type)
+            extractor = self._extractor._family_extractor(feature_type, self._lexicon)
+            self._values[feature_type] = extractor(self._text, context=self._context)
+        return self._values[feature_type]
+    
+    def __contains__(self, feature_type) -> bool:
+        return feature_type in self._families
+    
+    def __iter__(self):
+        return iter(self._families)
+    
+    def __len__(self) -> int:
+        return len(self._families)
+    
+    def materialize(self) -> Dict[str, Any]:
+        """计算所有启用的特征族,返回普通字典"""
+        return {feature_type: self[feature_type] for feature_type in self._families}
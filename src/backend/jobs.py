@@ -0,0 +1,219 @@
+"""
+异步分析任务模块
+大文件上传后立即返回任务ID,由后台线程池执行分析,客户端轮询进度并分页获取结果
+"""
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Dict, Any, Optional
+from pipeline import analyze_csv_stream
+
+# 估算行数时每次读取的字节数
+COUNT_BLOCK_SIZE = 1 << 20
+
+
+class JobQueueFull(Exception):
+    """任务队列已满"""
+
+
+def estimate_csv_rows(filepath: str) -> int:
+    """
+    按换行符估算CSV的数据行数(不解析CSV)
+
+    引号内含换行的字段会被多计,空行会被pandas跳过,因此只是估计值,
+    分析过程中按实际处理的行数修正
+    """
+    lines = 0
+    last = b'\n'
+    with open(filepath, 'rb') as f:
+        while True:
+            block = f.read(COUNT_BLOCK_SIZE)
+            if not block:
+                break
+            lines += block.count(b'\n')
+            last = block[-1:]
+    if last != b'\n':
+        # 最后一行没有换行符
+        lines += 1
+    # 去掉表头
+    return max(lines - 1, 0)
+
+
+class Job:
+    """分析任务"""
+
+    def __init__(self, job_id: str, filename: str, filepath: str):
+        self.id = job_id
+        self.filename = filename
+        self.filepath = filepath
+        self.status = 'queued'  # queued / running / completed / failed
+        self.total_rows = None
+        self.rows_done = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.result = None
+        self.profile_id = None  # 开启剖析时与任务ID相同
+        self.analysis_id = None  # 结果写入结果存储时与任务ID相同
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('completed', 'failed')
+
+    def to_dict(self) -> Dict[str, Any]:
+        """任务状态和进度"""
+        elapsed = None
+        throughput = None
+        eta = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+            if elapsed > 0 and self.rows_done:
+                throughput = self.rows_done / elapsed
+                if self.total_rows is not None and not self.finished:
+                    eta = max(self.total_rows - self.rows_done, 0) / throughput
+
+        return {
+            'id': self.id,
+            'status': self.status,
+            'filename': self.filename,
+            'progress': {
+                'rows_done': self.rows_done,
+                'total_rows': self.total_rows,
+                'percent': round(self.rows_done / self.total_rows * 100, 2) if self.total_rows else None,
+                'elapsed_seconds': round(elapsed, 2) if elapsed is not None else None,
+                'rows_per_second': round(throughput, 2) if throughput is not None else None,
+                'eta_seconds': round(eta, 2) if eta is not None else None
+            },
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+            'profile_id': self.profile_id,
+            'analysis_id': self.analysis_id
+        }
+
+
+class JobManager:
+    """任务管理器: 有界队列、可配置并发数、完成任务按TTL清理"""
+
+    def __init__(self, upload_folder: str, max_workers: int = 2, max_queue: int = 16,
+                 ttl: int = 3600, chunksize: int = 5000, profile_store=None, result_store=None):
+        """
+        初始化任务管理器
+
+        Args:
+            upload_folder: 任务上传文件的暂存目录
+            max_workers: 同时执行的任务数
+            max_queue: 未完成任务(排队中和执行中)的上限
+            ttl: 已完成任务的保留时间(秒)
+            chunksize: 流式读取CSV时每块的行数
+            profile_store: 剖析结果存储(ProfileStore),为None时不支持剖析
+            result_store: 分析结果存储(ResultStore),提供时以任务ID作为分析ID写入结果
+        """
+        self.upload_folder = upload_folder
+        self.profile_store = profile_store
+        self.result_store = result_store
+        self.max_queue = max_queue
+        self.ttl = ttl
+        self.chunksize = chunksize
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+
+    def submit(self, file, analyzer, profile: bool = False, **options) -> Job:
+        """
+        提交分析任务
+
+        Args:
+            file: 上传的文件(werkzeug FileStorage)
+            analyzer: SentimentAnalyzer实例
+            profile: 是否剖析本次分析(需配置 profile_store),剖析ID与任务ID相同
+            options: 传给 analyze_csv_stream 的其他参数
+
+        Returns:
+            新建的任务
+        """
+        self.cleanup()
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if pending >= self.max_queue:
+                raise JobQueueFull('任务队列已满,请稍后重试')
+
+            job_id = uuid.uuid4().hex
+            # 请求结束后上传流即被关闭,后台任务需要读取暂存文件
+            filepath = os.path.join(self.upload_folder, f'job_{job_id}.csv')
+            job = Job(job_id, file.filename, filepath)
+            if profile and self.profile_store is not None:
+                job.profile_id = job_id
+            if self.result_store is not None:
+                job.analysis_id = job_id
+            self._jobs[job_id] = job
+
+        try:
+            file.save(filepath)
+        except Exception:
+            with self._lock:
+                del self._jobs[job_id]
+            raise
+
+        self._executor.submit(self._run, job, analyzer, options)
+        return job
+
+    def _run(self, job: Job, analyzer, options: Dict[str, Any]) -> None:
+        """在后台线程中执行分析"""
+        job.started_at = time.time()
+        job.status = 'running'
+        try:
+            # 按换行符估算总行数,用于计算进度和剩余时间(不预先解析整个CSV)
+            job.total_rows = estimate_csv_rows(job.filepath)
+
+            def on_progress(rows_done):
+                job.rows_done = rows_done
+                if rows_done > job.total_rows:
+                    job.total_rows = rows_done
+
+            recording = nullcontext({})
+            if job.profile_id is not None:
+                recording = self.profile_store.record(job.profile_id, {'source': 'job', 'filename': job.filename})
+            with recording as profile_meta, open(job.filepath, 'rb') as f:
+                job.result = analyze_csv_stream(
+                    f, job.filename, analyzer,
+                    chunksize=self.chunksize,
+                    progress_callback=on_progress,
+                    result_store=self.result_store,
+                    analysis_id=job.analysis_id,
+                    **options
+                )
+                profile_meta['rows'] = job.result['total']
+            job.total_rows = job.result['total']
+            status = 'completed'
+        except Exception as e:
+            job.error = str(e)
+            status = 'failed'
+        finally:
+            if os.path.exists(job.filepath):
+                os.remove(job.filepath)
+
+        job.finished_at = time.time()
+        job.status = status
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """查询任务"""
+        self.cleanup()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cleanup(self) -> None:
+        """清理超过保留时间的已完成任务"""
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished and now - job.finished_at > self.ttl
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
@@ -0,0 +1,418 @@
+"""
+情感词典匹配模块
+基于Aho-Corasick自动机一次扫描原始文本,匹配多字词条,
+并在窗口内处理否定词和程度副词,耗时与评论长度成线性关系,与词典规模无关
+
+词典从 lexicons/ 目录下的版本化文件加载(如 zh_general.txt、zh_electronics.txt),
+文件变化后自动重新编译并整体替换,无需重启服务
+"""
+import os
+import time
+import hashlib
+import threading
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+import metrics
+
+# 词条类型
+SENTIMENT = 0
+NEGATOR = 1
+DEGREE = 2
+
+# 中文否定词和程度副词
+ZH_NEGATORS = ['不', '没', '没有', '无', '非', '别', '未', '不太', '不是', '并不', '毫不', '从不']
+ZH_DEGREE_ADVERBS = {
+    '极其': 2.0, '超级': 1.8, '最': 1.8, '太': 1.5, '非常': 1.5, '特别': 1.5,
+    '十分': 1.5, '相当': 1.3, '很': 1.3, '挺': 1.2, '比较': 1.1, '还': 0.9,
+    '有点': 0.8, '有些': 0.8, '稍微': 0.7, '略': 0.7
+}
+
+# 英文否定词和程度副词
+EN_NEGATORS = [
+    'not', 'no', 'never', 'hardly', "don't", "doesn't", "didn't", "isn't",
+    "wasn't", "aren't", "won't", "can't", 'cannot', 'nothing'
+]
+EN_DEGREE_ADVERBS = {
+    'extremely': 2.0, 'absolutely': 1.8, 'very': 1.5, 'really': 1.3, 'so': 1.3,
+    'too': 1.3, 'quite': 1.2, 'pretty': 1.2, 'rather': 1.1, 'slightly': 0.7,
+    'somewhat': 0.8, 'a bit': 0.8
+}
+
+# 否定词和程度副词的作用范围在子句内
+CLAUSE_DELIMITERS = set(',.!?;:，。！？；：、\n')
+
+# 随代码发布的词典目录
+DEFAULT_LEXICON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lexicons')
+
+
+def parse_lexicon(content: str) -> Tuple[Dict[str, float], Optional[str]]:
+    """
+    解析词典文件内容
+
+    每行一个词条,格式为 "词<TAB或空格>权重",权重省略时为1;
+    空行和以 # 开头的注释行被忽略,文件头部可用 "# version: ..." 声明版本
+
+    Returns:
+        (词条及权重, 声明的版本)
+    """
+    entries = {}
+    version = None
+    for line in content.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#'):
+            name, _, value = line[1:].partition(':')
+            if version is None and not entries and name.strip().lower() == 'version':
+                version = value.strip()
+            continue
+        parts = line.rsplit(None, 1)
+        if len(parts) == 2:
+            try:
+                entries[parts[0]] = float(parts[1])
+                continue
+            except ValueError:
+                pass
+        entries[line] = 1.0
+    return entries, version
+
+
+class LexiconMatcher:
+    """编译后的多模式词典匹配器(Aho-Corasick自动机)"""
+
+    def __init__(self, entries: Dict[str, float], negators: Iterable[str] = (),
+                 degree_adverbs: Optional[Dict[str, float]] = None,
+                 window: int = 4, word_boundary: bool = False, lowercase: bool = False):
+        """
+        编译词典
+
+        Args:
+            entries: 情感词条及权重(正数为正面,负数为负面)
+            negators: 否定词
+            degree_adverbs: 程度副词及倍数
+            window: 否定词/程度副词与情感词之间允许的最大字符间隔
+            word_boundary: 是否要求匹配位于单词边界(英文)
+            lowercase: 是否忽略大小写
+        """
+        self.window = window
+        self.word_boundary = word_boundary
+        self.lowercase = lowercase
+        self.size = len(entries)
+
+        # goto[state] = {字符: 下一状态}; term[state] = (长度, 类型, 权重)
+        self._goto = [{}]
+        self._term = [None]
+        for word in negators:
+            self._add(word, NEGATOR, 0.0)
+        for word, weight in (degree_adverbs or {}).items():
+            self._add(word, DEGREE, float(weight))
+        # 情感词条最后加入,与否定词同形时以情感词为准(如"无")
+        for word, weight in entries.items():
+            self._add(word, SENTIMENT, float(weight))
+        self._build_links()
+
+    def _add(self, word: str, kind: int, weight: float) -> None:
+        """向字典树中插入一个词条"""
+        if self.lowercase:
+            word = word.lower()
+        if not word:
+            return
+        state = 0
+        for ch in word:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._term.append(None)
+            state = nxt
+        self._term[state] = (len(word), kind, weight)
+
+    def _build_links(self) -> None:
+        """广度优先构建失败指针和输出指针"""
+        n = len(self._goto)
+        self._fail = [0] * n
+        # 输出指针: 沿失败链最近的一个词条结束状态
+        self._out = [0] * n
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, nxt in self._goto[state].items():
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                fallback = self._goto[f].get(ch, 0)
+                self._fail[nxt] = fallback if fallback != nxt else 0
+                self._out[nxt] = self._fail[nxt] if self._term[self._fail[nxt]] else self._out[self._fail[nxt]]
+                queue.append(nxt)
+
+    def _is_boundary(self, text: str, start: int, end: int) -> bool:
+        """匹配两端是否为单词边界"""
+        if start > 0 and text[start - 1].isalnum():
+            return False
+        if end < len(text) and text[end].isalnum():
+            return False
+        return True
+
+    def find(self, text: str) -> List[Tuple[int, int, int, float]]:
+        """
+        扫描文本,返回最左最长、互不重叠的匹配
+
+        Returns:
+            [(start, end, kind, weight)] 按位置排序
+        """
+        if self.lowercase:
+            text = text.lower()
+        goto, fail, term, out = self._goto, self._fail, self._term, self._out
+
+        # 每个起始位置上最长的匹配
+        best = {}
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+
+            s = state if term[state] else out[state]
+            while s:
+                length, kind, weight = term[s]
+                start = i + 1 - length
+                if (not self.word_boundary or self._is_boundary(text, start, i + 1)) and \
+                        length > best.get(start, (0,))[0]:
+                    best[start] = (length, kind, weight)
+                s = out[s]
+
+        matches = []
+        pos = 0
+        for start in sorted(best):
+            if start < pos:
+                continue
+            length, kind, weight = best[start]
+            matches.append((start, start + length, kind, weight))
+            pos = start + length
+        return matches
+
+    def _in_scope(self, text: str, modifier_end: int, start: int) -> bool:
+        """修饰词是否仍作用于当前情感词(窗口内且未跨越子句)"""
+        if start - modifier_end > self.window:
+            return False
+        return not any(ch in CLAUSE_DELIMITERS for ch in text[modifier_end:start])
+
+    def analyze(self, text: str) -> Dict[str, Any]:
+        """
+        计算文本的情感词典特征
+
+        Returns:
+            positive_words/negative_words/sentiment_score 以及每个情感词的匹配位置
+        """
+        positive = 0
+        negative = 0
+        score = 0.0
+        spans = []
+
+        negations = []  # 尚未作用的否定词结束位置
+        degree = None   # (结束位置, 倍数)
+
+        for start, end, kind, weight in self.find(text):
+            if kind == NEGATOR:
+                negations.append(end)
+                continue
+            if kind == DEGREE:
+                degree = (end, weight)
+                continue
+
+            negated = sum(1 for e in negations if self._in_scope(text, e, start)) % 2 == 1
+            multiplier = degree[1] if degree and self._in_scope(text, degree[0], start) else 1.0
+            value = weight * multiplier * (-1 if negated else 1)
+            negations = []
+            degree = None
+
+            score += value
+            if value > 0:
+                positive += 1
+            elif value < 0:
+                negative += 1
+            spans.append({
+                'term': text[start:end],
+                'start': start,
+                'end': end,
+                'weight': round(value, 4),
+                'negated': negated
+            })
+
+        return {
+            'positive_words': positive,
+            'negative_words': negative,
+            'sentiment_score': round(score, 4),
+            'matches': spans
+        }
+
+
+class Lexicon:
+    """某一语言已编译的只读词典快照"""
+
+    def __init__(self, language: str, version: str, matcher: LexiconMatcher, files: List[Dict[str, Any]]):
+        """
+        Args:
+            language: 语言类型
+            version: 词典版本(所有文件内容的哈希),内容不变则版本不变
+            matcher: 编译好的匹配器
+            files: 参与合并的词典文件信息
+        """
+        self.language = language
+        self.version = version
+        self.matcher = matcher
+        self.files = files
+        self.loaded_at = time.time()
+
+    def analyze(self, text: str) -> Dict[str, Any]:
+        """计算文本的情感词典特征"""
+        return self.matcher.analyze(text)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'version': self.version,
+            'entries': self.matcher.size,
+            'files': self.files,
+            'loaded_at': self.loaded_at
+        }
+
+
+class LexiconStore:
+    """
+    词典目录的热加载存储
+
+    每种语言合并目录下所有 {language}_*.txt 文件({language}_general.txt 最先加载,
+    其余领域词典按文件名顺序覆盖同名词条)。最多每 check_interval 秒检查一次文件的
+    修改时间和大小,发生变化时在锁外完整编译新词典,再整体替换引用;
+    正在进行的分析继续使用旧快照,不会读到一半新一半旧的词典
+    """
+
+    def __init__(self, directory: Optional[str] = None, check_interval: float = 2.0):
+        """
+        Args:
+            directory: 词典目录,默认使用随代码发布的 lexicons/
+            check_interval: 检查文件变化的最小间隔(秒)
+        """
+        self.directory = directory or DEFAULT_LEXICON_DIR
+        self.check_interval = check_interval
+        self._lexicons = {}    # language -> Lexicon
+        self._signatures = {}  # language -> 文件签名
+        self._checked_at = {}  # language -> 上次检查时间
+        self._lock = threading.Lock()
+
+    def _list_files(self, language: str) -> List[str]:
+        """列出某一语言的词典文件"""
+        prefix = f'{language}_'
+        try:
+            names = [
+                name for name in os.listdir(self.directory)
+                if name.startswith(prefix) and name.endswith('.txt')
+            ]
+        except FileNotFoundError:
+            return []
+        names.sort(key=lambda name: (name != f'{language}_general.txt', name))
+        return [os.path.join(self.directory, name) for name in names]
+
+    @staticmethod
+    def _signature(files: List[str]) -> Tuple:
+        """文件签名: 文件名、修改时间和大小"""
+        signature = []
+        for path in files:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _load(self, language: str, files: List[str]) -> Lexicon:
+        """读取并编译词典文件"""
+        entries = {}
+        digest = hashlib.sha1()
+        info = []
+        for path in files:
+            with open(path, 'rb') as f:
+                content = f.read()
+            digest.update(os.path.basename(path).encode('utf-8') + b'\0' + content)
+            file_entries, declared_version = parse_lexicon(content.decode('utf-8'))
+            entries.update(file_entries)
+            info.append({
+                'name': os.path.basename(path),
+                'version': declared_version,
+                'entries': len(file_entries)
+            })
+        version = digest.hexdigest()[:12] if files else 'empty'
+        return Lexicon(language, version, build_matcher(language, entries), info)
+
+    def get(self, language: str) -> Lexicon:
+        """
+        获取某一语言当前生效的词典,必要时重新加载
+
+        Args:
+            language: 语言类型
+        """
+        now = time.monotonic()
+        lexicon = self._lexicons.get(language)
+        if lexicon is not None and now - self._checked_at.get(language, 0) < self.check_interval:
+            return lexicon
+
+        with self._lock:
+            self._checked_at[language] = now
+            files = self._list_files(language)
+            signature = self._signature(files)
+            lexicon = self._lexicons.get(language)
+            if lexicon is not None and signature == self._signatures.get(language):
+                return lexicon
+            try:
+                new_lexicon = self._load(language, [path for path, _, _ in signature])
+            except Exception as e:
+                # 文件正在写入或格式错误时保留旧词典,下次检查时重试
+                if lexicon is None:
+                    raise
+                print(f"词典重新加载错误: {e}")
+                metrics.count_error('lexicon.reload')
+                return lexicon
+            self._lexicons[language] = new_lexicon
+            self._signatures[language] = signature
+            return new_lexicon
+
+    def get_status(self) -> Dict[str, Any]:
+        """各语言当前生效的词典版本"""
+        return {
+            'directory': self.directory,
+            'languages': {language: self.get(language).to_dict() for language in ('zh', 'en')}
+        }
+
+
+def build_matcher(language: str, entries: Dict[str, float]) -> LexiconMatcher:
+    """按语言的否定词、程度副词和匹配规则编译词典"""
+    if language == 'zh':
+        return LexiconMatcher(entries, ZH_NEGATORS, ZH_DEGREE_ADVERBS, window=4)
+    return LexiconMatcher(
+        entries, EN_NEGATORS, EN_DEGREE_ADVERBS,
+        window=16, word_boundary=True, lowercase=True
+    )
+
+
+# 按目录共享的词典存储,同一进程内的所有特征提取器共用一份编译结果;
+# 工作进程经fork创建时直接继承父进程已编译的词典
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(directory: Optional[str] = None) -> LexiconStore:
+    """
+    获取目录对应的词典存储
+
+    Args:
+        directory: 词典目录,默认使用随代码发布的 lexicons/
+    """
+    directory = os.path.abspath(directory or DEFAULT_LEXICON_DIR)
+    with _stores_lock:
+        store = _stores.get(directory)
+        if store is None:
+            store = LexiconStore(directory)
+            _stores[directory] = store
+        return store
@@ -0,0 +1,298 @@
+"""
+可训练的线性情感分类模型
+在词/字符n-gram的TF-IDF稀疏特征上训练三分类逻辑回归(softmax回归),
+模型(向量化器 + 权重)保存为单个压缩npz文件,批量预测只需一次稀疏矩阵乘法
+"""
+import io
+import os
+import hashlib
+import threading
+import numpy as np
+from scipy.optimize import minimize
+from scipy.special import logsumexp
+from typing import List, Dict, Any, Optional, Tuple
+from analysis_context import AnalysisContext
+import metrics
+from vectorizer import TfidfVectorizer
+from models import _argmax_labels, _round_like_python, probabilities_to_results
+
+# 概率矩阵的列顺序与规则模型一致
+CLASSES = ('positive', 'neutral', 'negative')
+
+# 训练好的模型默认存放目录,文件名为 linear_{language}.npz
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trained_models')
+
+
+def model_path(language: str, directory: Optional[str] = None) -> str:
+    """某一语言的线性模型文件路径"""
+    return os.path.join(directory or DEFAULT_MODEL_DIR, f'linear_{language}.npz')
+
+
+def stacking_path(language: str, directory: Optional[str] = None) -> str:
+    """某一语言的堆叠集成元模型文件路径"""
+    return os.path.join(directory or DEFAULT_MODEL_DIR, f'stacking_{language}.npz')
+
+
+def fit_softmax(X, labels: List[str], alpha: float = 1e-4, max_iter: int = 200,
+                balanced: bool = False) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any]]:
+    """
+    训练三分类softmax回归: 用L-BFGS最小化带L2正则的交叉熵
+
+    Args:
+        X: 形状为 (样本数, 特征数) 的稀疏或稠密特征矩阵
+        labels: 每个样本的类别(positive/neutral/negative)
+        alpha: L2正则系数
+        max_iter: 最大迭代次数
+        balanced: 是否按类别频率的倒数加权样本
+
+    Returns:
+        (权重, 偏置, 训练信息)
+    """
+    y = np.array([CLASSES.index(label) for label in labels])
+    n_samples, n_features = X.shape
+    n_classes = len(CLASSES)
+    Y = np.zeros((n_samples, n_classes))
+    Y[np.arange(n_samples), y] = 1
+
+    sample_weight = np.ones(n_samples)
+    if balanced:
+        class_counts = np.bincount(y, minlength=n_classes)
+        sample_weight = n_samples / (n_classes * class_counts[y])
+    sample_weight /= sample_weight.sum()
+
+    def loss_and_grad(params):
+        W = params[:-n_classes].reshape(n_features, n_classes)
+        b = params[-n_classes:]
+        logits = X @ W + b
+        log_probs = logits - logsumexp(logits, axis=1, keepdims=True)
+        loss = -(sample_weight * (Y * log_probs).sum(axis=1)).sum() + 0.5 * alpha * (W * W).sum()
+        residual = (np.exp(log_probs) - Y) * sample_weight[:, None]
+        grad_W = X.T @ residual + alpha * W
+        grad_b = residual.sum(axis=0)
+        return loss, np.concatenate([np.asarray(grad_W).ravel(), grad_b])
+
+    result = minimize(
+        loss_and_grad, np.zeros(n_features * n_classes + n_classes),
+        jac=True, method='L-BFGS-B', options={'maxiter': max_iter}
+    )
+    coef = result.x[:-n_classes].reshape(n_features, n_classes).astype(np.float32)
+    intercept = result.x[-n_classes:].astype(np.float32)
+    return coef, intercept, {'iterations': int(result.nit), 'loss': float(result.fun), 'features': n_features}
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    """按行softmax"""
+    return np.exp(logits - logsumexp(logits, axis=1, keepdims=True))
+
+
+class LinearSentimentModel:
+    """三分类线性情感模型"""
+
+    # 模型只使用自身的TF-IDF特征,不需要预先计算FeatureExtractor的任何特征族
+    required_features = ()
+
+    def __init__(self, vectorizer: TfidfVectorizer, coef: Optional[np.ndarray] = None,
+                 intercept: Optional[np.ndarray] = None, version: Optional[str] = None):
+        """
+        Args:
+            vectorizer: TF-IDF向量化器(训练时拟合)
+            coef: 形状为 (特征数, 3) 的权重
+            intercept: 形状为 (3,) 的偏置
+            version: 模型版本(模型文件内容的哈希),用于结果缓存键
+        """
+        self.vectorizer = vectorizer
+        self.language = vectorizer.language
+        self.coef = coef
+        self.intercept = intercept
+        self.version = version
+
+    def fit(self, texts: List[str], labels: List[str], alpha: float = 1e-4,
+            max_iter: int = 200, balanced: bool = False) -> Dict[str, Any]:
+        """
+        训练模型: 拟合向量化器,再用L-BFGS最小化带L2正则的交叉熵
+
+        Args:
+            texts: 预处理后的文本
+            labels: 每条文本的类别(positive/neutral/negative)
+            alpha: L2正则系数
+            max_iter: 最大迭代次数
+            balanced: 是否按类别频率的倒数加权样本
+
+        Returns:
+            训练信息(迭代次数、最终损失)
+        """
+        X = self.vectorizer.fit_transform(texts)
+        self.coef, self.intercept, info = fit_softmax(X, labels, alpha=alpha, max_iter=max_iter, balanced=balanced)
+        return info
+
+    def predict_proba(self, texts: List[str], contexts: Optional[List[AnalysisContext]] = None) -> np.ndarray:
+        """
+        批量预测三分类概率
+
+        Args:
+            texts: 预处理后的文本
+            contexts: 每条文本的分析上下文,复用其中的分词结果
+
+        Returns:
+            形状为 (N, 3) 的概率矩阵,列依次为 positive/neutral/negative
+        """
+        if len(texts) == 0:
+            return np.empty((0, len(CLASSES)))
+        tokens_list = [context.tokens for context in contexts] if contexts is not None else None
+        X = self.vectorizer.transform(texts, tokens_list)
+        return softmax(np.asarray(X @ self.coef, dtype=float) + self.intercept)
+
+    def predict_batch(self, texts: List[str], features_list: List[Dict[str, Any]],
+                      contexts: Optional[List[AnalysisContext]] = None) -> List[Tuple[str, Dict[str, float]]]:
+        """
+        批量预测(接口与 MultiClassSentiment.predict_batch 一致,features_list 不参与计算)
+
+        Returns:
+            (sentiment, probabilities) 列表
+        """
+        with metrics.timed('model.linear', len(texts)):
+            probs = _round_like_python(self.predict_proba(texts, contexts), 4)
+        return probabilities_to_results(_argmax_labels(probs), probs)
+
+    def predict(self, text: str, features: Dict[str, Any],
+                context: Optional[AnalysisContext] = None) -> Tuple[str, Dict[str, float]]:
+        """预测单条评论"""
+        return self.predict_batch([text], [features], [context] if context is not None else None)[0]
+
+    def save(self, path: str) -> None:
+        """保存模型(向量化器和float32权重写入同一个压缩npz文件)"""
+        arrays = {f'vectorizer_{name}': value for name, value in self.vectorizer.to_arrays().items()}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                coef=self.coef.astype(np.float32),
+                intercept=self.intercept.astype(np.float32),
+                classes=np.array(CLASSES),
+                **arrays
+            )
+
+    @classmethod
+    def load(cls, path: str) -> 'LinearSentimentModel':
+        """加载 save 保存的模型"""
+        with open(path, 'rb') as f:
+            content = f.read()
+        with np.load(io.BytesIO(content), allow_pickle=False) as data:
+            if tuple(data['classes'].tolist()) != CLASSES:
+                raise ValueError(f'模型类别不匹配: {data["classes"].tolist()}')
+            vectorizer = TfidfVectorizer.from_arrays({
+                name[len('vectorizer_'):]: data[name]
+                for name in data.files if name.startswith('vectorizer_')
+            })
+            return cls(
+                vectorizer,
+                coef=data['coef'],
+                intercept=data['intercept'],
+                version=hashlib.sha1(content).hexdigest()[:12]
+            )
+
+
+class StackingMetaLearner:
+    """
+    堆叠集成的元模型
+
+    以各成员模型的三分类对数概率为特征训练softmax回归,学习如何组合成员的输出
+    """
+
+    def __init__(self, language: str, members: List[str], coef: Optional[np.ndarray] = None,
+                 intercept: Optional[np.ndarray] = None, version: Optional[str] = None):
+        """
+        Args:
+            language: 语言类型
+            members: 成员模型名称(顺序与训练时一致)
+            coef: 形状为 (成员数 * 3, 3) 的权重
+            intercept: 形状为 (3,) 的偏置
+            version: 元模型版本(文件内容的哈希)
+        """
+        self.language = language
+        self.members = list(members)
+        self.coef = coef
+        self.intercept = intercept
+        self.version = version
+
+    @staticmethod
+    def _features(member_probs: np.ndarray) -> np.ndarray:
+        """(N, 成员数, 3) 的成员概率 -> (N, 成员数 * 3) 的对数概率特征"""
+        return np.log(np.clip(member_probs, 1e-6, 1)).reshape(len(member_probs), -1)
+
+    def fit(self, member_probs: np.ndarray, labels: List[str], alpha: float = 1e-3,
+            max_iter: int = 500) -> Dict[str, Any]:
+        """
+        在留出的带标签数据上训练元模型
+
+        Args:
+            member_probs: 形状为 (N, 成员数, 3) 的成员概率
+            labels: 每条评论的类别
+        """
+        self.coef, self.intercept, info = fit_softmax(
+            self._features(member_probs), labels, alpha=alpha, max_iter=max_iter
+        )
+        return info
+
+    def predict_proba(self, member_probs: np.ndarray) -> np.ndarray:
+        """组合成员概率,返回 (N, 3) 的概率矩阵"""
+        if len(member_probs) == 0:
+            return np.empty((0, len(CLASSES)))
+        return softmax(self._features(member_probs) @ self.coef.astype(float) + self.intercept)
+
+    def save(self, path: str) -> None:
+        """保存元模型(npz)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                language=np.array(self.language),
+                members=np.array(self.members),
+                coef=self.coef.astype(np.float32),
+                intercept=self.intercept.astype(np.float32),
+                classes=np.array(CLASSES)
+            )
+
+    @classmethod
+    def load(cls, path: str) -> 'StackingMetaLearner':
+        """加载 save 保存的元模型"""
+        with open(path, 'rb') as f:
+            content = f.read()
+        with np.load(io.BytesIO(content), allow_pickle=False) as data:
+            return cls(
+                str(data['language']),
+                data['members'].tolist(),
+                coef=data['coef'],
+                intercept=data['intercept'],
+                version=hashlib.sha1(content).hexdigest()[:12]
+            )
+
+
+# 按路径缓存已加载的模型,文件更新后重新加载
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(path: str, loader=None):
+    """
+    加载模型文件(同一文件在进程内只加载一次,修改时间变化后重新加载)
+
+    Args:
+        path: 模型文件路径
+        loader: 加载函数,默认为 LinearSentimentModel.load
+
+    Raises:
+        FileNotFoundError: 模型文件不存在
+    """
+    loader = loader or LinearSentimentModel.load
+    mtime = os.stat(path).st_mtime_ns
+    with _models_lock:
+        cached = _models.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, loader(path))
+            _models[path] = cached
+        return cached[1]
@@ -0,0 +1,205 @@
+"""
+运行指标模块
+记录各分析阶段的耗时直方图、处理条数和错误次数,以Prometheus文本格式导出;
+请求开启计时后,同一请求内各阶段的耗时同时汇总为逐请求的耗时明细
+"""
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+# 阶段耗时直方图的桶上界(秒)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 当前请求的耗时明细,未开启计时时为None(线程和异步任务之间互不影响)
+_request_timings: ContextVar[Optional[Dict[str, Dict[str, float]]]] = ContextVar('request_timings', default=None)
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str = '') -> str:
+    """标签转换为 {name="value",...},值中的反斜杠、引号和换行按Prometheus规则转义"""
+    parts = [
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    ]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    """数值格式化: 整数不带小数点"""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    """按标签分组的累积直方图"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        # 标签值 -> [各桶计数..., 总和, 总次数]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        """记录一次观测值"""
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        """Prometheus文本格式"""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for label_values, series in items:
+            labels = tuple(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                bucket_labels = _format_labels(labels, 'le="{}"'.format(bound))
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            bucket_labels = _format_labels(labels, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{bucket_labels} {int(series[-1])}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(series[-2])}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {int(series[-1])}')
+        return lines
+
+
+class Counter:
+    """按标签分组的计数器"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *label_values: str) -> None:
+        """增加计数"""
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        """Prometheus文本格式"""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f'{self.name}{_format_labels(tuple(zip(self.label_names, label_values)))} {_format_value(value)}')
+        return lines
+
+
+stage_seconds = Histogram('sentiment_stage_seconds', '各分析阶段每批的耗时(秒)', ('stage',))
+stage_rows = Counter('sentiment_stage_rows_total', '各分析阶段处理的评论条数', ('stage',))
+stage_errors = Counter('sentiment_stage_errors_total', '各分析阶段捕获的错误次数', ('stage',))
+request_seconds = Histogram('sentiment_http_request_seconds', 'API请求耗时(秒)', ('endpoint', 'method', 'status'))
+
+# 导出时调用的收集函数: 返回 {指标名: 数值},导出为gauge(如结果缓存统计)
+_collectors: List[Tuple[str, str, Callable[[], Dict[str, Any]]]] = []
+
+
+def register_collector(prefix: str, help_text: str, collect: Callable[[], Dict[str, Any]]) -> None:
+    """
+    注册在导出时读取的统计信息
+
+    Args:
+        prefix: 指标名前缀,导出为 {prefix}_{键}
+        help_text: 指标说明
+        collect: 返回统计字典的函数,只导出其中的数值项
+    """
+    _collectors.append((prefix, help_text, collect))
+
+
+def observe(stage: str, seconds: float, rows: int = 0) -> None:
+    """
+    记录一个阶段的耗时和处理条数
+
+    Args:
+        stage: 阶段名(如 features.sentiment_dict、model.score)
+        seconds: 耗时(秒)
+        rows: 本次处理的评论条数
+    """
+    stage_seconds.observe(seconds, stage)
+    if rows:
+        stage_rows.inc(rows, stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.get(stage)
+        if entry is None:
+            entry = timings[stage] = {'seconds': 0.0, 'calls': 0, 'rows': 0}
+        entry['seconds'] += seconds
+        entry['calls'] += 1
+        entry['rows'] += rows
+
+
+@contextmanager
+def timed(stage: str, rows: int = 0):
+    """记录代码块耗时的上下文管理器"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start, rows)
+
+
+def count_error(stage: str) -> None:
+    """记录一次被捕获的错误"""
+    stage_errors.inc(1, stage)
+
+
+def start_request_timing():
+    """
+    为当前请求开启耗时明细
+
+    Returns:
+        传给 finish_request_timing 的令牌
+    """
+    return _request_timings.set({})
+
+
+def finish_request_timing(token) -> Dict[str, Any]:
+    """
+    结束当前请求的耗时明细
+
+    Returns:
+        {阶段名: {'ms', 'calls', 'rows'}},按耗时降序
+    """
+    timings = _request_timings.get() or {}
+    _request_timings.reset(token)
+    return {
+        stage: {'ms': round(entry['seconds'] * 1000, 3), 'calls': entry['calls'], 'rows': entry['rows']}
+        for stage, entry in sorted(timings.items(), key=lambda item: -item[1]['seconds'])
+    }
+
+
+def render() -> str:
+    """所有指标的Prometheus文本格式"""
+    lines = []
+    for metric in (stage_seconds, stage_rows, stage_errors, request_seconds):
+        lines.extend(metric.render())
+    for prefix, help_text, collect in _collectors:
+        try:
+            values = collect()
+        except Exception as e:
+            print(f"指标收集错误: {e}")
+            continue
+        for key, value in values.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            lines.append(f'# HELP {prefix}_{key} {help_text}')
+            lines.append(f'# TYPE {prefix}_{key} gauge')
+            lines.append(f'{prefix}_{key} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
@@ -2,17 +2,27 @@
 模型模块
 实现多分类情感分析和模型集成
 """
+import os
 import numpy as np
-from typing import Tuple, Dict, Any
-from snownlp import SnowNLP
+from typing import Tuple, Dict, Any, List, Optional
+from snownlp import sentiment as snownlp_sentiment
+from analysis_context import AnalysisContext
+import metrics
 try:
     from textblob import TextBlob
 except:
     TextBlob = None
+try:
+    from snownlp_scorer import get_scorer as get_snownlp_scorer
+except ImportError:
+    get_snownlp_scorer = None
 
 class MultiClassSentiment:
     """多分类情感分析模型"""
     
+    # 概率映射只读取情感词典特征,其余特征族不需要预先计算
+    required_features = ('sentiment_dict',)
+    
     def __init__(self, language='zh'):
         """
         初始化模型
@@ -25,11 +35,18 @@ class MultiClassSentiment:
         self.positive_threshold = 0.6
         self.negative_threshold = 0.4
     
-    def _get_snownlp_score(self, text: str) -> float:
-        """使用SnowNLP获取情感得分"""
+    def _get_snownlp_score(self, text: str, context: Optional[AnalysisContext] = None) -> float:
+        """
+        使用SnowNLP获取情感得分
+        
+        直接调用SnowNLP的情感分类器,等价于SnowNLP(text).sentiments,
+        但复用上下文中的分词结果,且不再为每条评论构建SnowNLP对象(其构造函数会额外计算BM25)
+        """
         try:
-            s = SnowNLP(text)
-            return s.sentiments
+            if context is None:
+                context = AnalysisContext(text, language=self.language)
+            ret, prob = snownlp_sentiment.classifier.classifier.classify(context.snownlp_words)
+            return prob if ret == 'pos' else 1 - prob
         except:
             return 0.5
     
@@ -97,23 +114,103 @@ class MultiClassSentiment:
             'negative': round(negative, 4)
         }
     
-    def predict(self, text: str, features: Dict[str, Any]) -> Tuple[str, Dict[str, float]]:
+    def _calculate_probabilities_batch(self, scores: np.ndarray, word_counts: np.ndarray) -> np.ndarray:
         """
-        预测情感类别和概率
+        批量计算三分类概率,结果与逐条调用 _calculate_probabilities 逐位一致
         
         Args:
-            text: 输入文本
-            features: 提取的特征
+            scores: 形状为 (N,) 的基础情感得分
+            word_counts: 形状为 (N, 3) 的情感词典计数,列依次为
+                         是否有情感词典特征、正面词数、负面词数(见 lexicon_counts)
             
         Returns:
-            (sentiment, probabilities) 情感类别和各类别概率
+            形状为 (N, 3) 的概率矩阵,列依次为 positive/neutral/negative
+        """
+        scores = np.asarray(scores, dtype=float)
+        
+        # 基础概率基于情感得分,中性区间内中性概率下降更快
+        distance = np.abs(2 * scores - 1)
+        polar = (scores >= self.positive_threshold) | (scores <= self.negative_threshold)
+        positive = scores.copy()
+        negative = 1 - scores
+        neutral = np.where(polar, 1 - distance, 1 - distance * 2)
+        
+        # 使用情感词典特征调整
+        has_dict = word_counts[:, 0] > 0
+        pos_words = word_counts[:, 1]
+        neg_words = word_counts[:, 2]
+        more_pos = has_dict & (pos_words > neg_words)
+        more_neg = has_dict & (neg_words > pos_words)
+        balanced = has_dict & ~more_pos & ~more_neg
+        positive[more_pos] *= 1.1
+        negative[more_pos] *= 0.9
+        negative[more_neg] *= 1.1
+        positive[more_neg] *= 0.9
+        neutral[balanced] *= 1.1
+        
+        # 归一化(求和顺序与逐条计算相同)
+        probs = np.column_stack([positive, neutral, negative])
+        total = positive + neutral + negative
+        normalize = total > 0
+        probs[normalize] /= total[normalize, None]
+        
+        return _round_like_python(probs, 4)
+    
+    def get_score(self, text: str, context: Optional[AnalysisContext] = None) -> float:
+        """
+        获取基础情感得分([0, 1],越大越正面)
+        
+        Args:
+            text: 输入文本
+            context: 分析上下文,复用已有的分词结果
         """
-        # 获取基础情感得分
         if self.language == 'zh':
-            score = self._get_snownlp_score(text)
+            return self._get_snownlp_score(text, context)
         else:
-            score = self._get_textblob_score(text)
+            return self._get_textblob_score(text)
+    
+    def _get_snownlp_words(self, text: str, context: Optional[AnalysisContext]) -> Optional[List[str]]:
+        """SnowNLP分词结果,分词失败时返回None"""
+        try:
+            if context is None:
+                context = AnalysisContext(text, language=self.language)
+            return context.snownlp_words
+        except:
+            return None
+    
+    def get_scores(self, texts: List[str], contexts: Optional[List[AnalysisContext]] = None) -> np.ndarray:
+        """
+        批量获取基础情感得分
         
+        中文评论由向量化的SnowNLP打分器一次性计算(与逐条得分的差异在1e-12以内),
+        英文评论逐条使用TextBlob
+        
+        Args:
+            texts: 输入文本列表
+            contexts: 每条文本的分析上下文
+        """
+        if contexts is None:
+            contexts = [None] * len(texts)
+        n = len(texts)
+        if self.language == 'zh' and get_snownlp_scorer is not None:
+            with metrics.timed('model.segment', n):
+                docs = [self._get_snownlp_words(text, context) for text, context in zip(texts, contexts)]
+            with metrics.timed('model.score', n):
+                return get_snownlp_scorer().score_batch(docs)
+        with metrics.timed('model.score', n):
+            return np.array([self.get_score(text, context) for text, context in zip(texts, contexts)], dtype=float)
+    
+    def predict_from_score(self, score: float, features: Dict[str, Any]) -> Tuple[str, Dict[str, float]]:
+        """
+        根据已计算的基础情感得分预测类别和概率
+        
+        Args:
+            score: 基础情感得分
+            features: 提取的特征
+            
+        Returns:
+            (sentiment, probabilities) 情感类别和各类别概率
+        """
         # 计算三分类概率
         probabilities = self._calculate_probabilities(score, features)
         
@@ -127,131 +224,328 @@ class MultiClassSentiment:
             sentiment = 'neutral'
         
         return sentiment, probabilities
+    
+    def predict(self, text: str, features: Dict[str, Any],
+                context: Optional[AnalysisContext] = None) -> Tuple[str, Dict[str, float]]:
+        """
+        预测情感类别和概率
+        
+        Args:
+            text: 输入文本
+            features: 提取的特征
+            context: 分析上下文,复用已有的分词结果
+            
+        Returns:
+            (sentiment, probabilities) 情感类别和各类别概率
+        """
+        return self.predict_from_score(self.get_score(text, context), features)
+    
+    def predict_scores(self, scores, features_list: List[Dict[str, Any]]) -> List[Tuple[str, Dict[str, float]]]:
+        """
+        根据一批已计算的基础得分预测类别和概率
+        
+        Args:
+            scores: 基础情感得分序列
+            features_list: 每条文本的特征
+            
+        Returns:
+            (sentiment, probabilities) 列表
+        """
+        if len(features_list) == 0:
+            return []
+        labels, probs = self.predict_arrays(scores, lexicon_counts(features_list))
+        return probabilities_to_results(labels, probs)
+    
+    def predict_arrays(self, scores, word_counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        向量化预测: 基础得分和情感词典计数 -> 类别向量和 (N, 3) 概率矩阵
+        
+        Args:
+            scores: 形状为 (N,) 的基础情感得分
+            word_counts: 形状为 (N, 3) 的情感词典计数(见 lexicon_counts)
+        """
+        probs = self._calculate_probabilities_batch(scores, word_counts)
+        return _argmax_labels(probs), probs
+    
+    def predict_batch(self, texts: List[str], features_list: List[Dict[str, Any]],
+                      contexts: Optional[List[AnalysisContext]] = None) -> List[Tuple[str, Dict[str, float]]]:
+        """
+        批量预测: 批量计算基础得分,再一次性完成概率映射和类别判定
+        
+        Args:
+            texts: 输入文本列表
+            features_list: 每条文本的特征
+            contexts: 每条文本的分析上下文
+            
+        Returns:
+            (sentiment, probabilities) 列表
+        """
+        scores = self.get_scores(texts, contexts)
+        with metrics.timed('model.calibrate', len(texts)):
+            return self.predict_scores(scores, features_list)
+
+
+# 集成成员: 不同阈值的规则模型共享同一个基础得分,线性模型需先用 train_model.py 训练
+RULE_MEMBER_THRESHOLDS = {
+    'rule': (0.6, 0.4),
+    'rule_strict': (0.7, 0.3),
+    'rule_loose': (0.55, 0.45)
+}
+ENSEMBLE_MEMBERS = tuple(RULE_MEMBER_THRESHOLDS) + ('linear',)
+DEFAULT_ENSEMBLE_MEMBERS = ('rule', 'rule_strict', 'rule_loose')
+ENSEMBLE_METHODS = ('voting', 'stacking')
 
 
 class EnsembleModel:
     """集成模型"""
     
-    def __init__(self, language='zh', method='voting'):
+    # 规则成员的概率映射和固定权重堆叠只读取情感词典特征
+    required_features = ('sentiment_dict',)
+    
+    def __init__(self, language='zh', method='voting', members=None, model_dir=None):
         """
         初始化集成模型
         
         Args:
             language: 语言类型
             method: 集成方法 ('voting' 或 'stacking')
+            members: 成员模型名称列表(见 ENSEMBLE_MEMBERS),默认为三个不同阈值的规则模型
+            model_dir: 线性模型和堆叠元模型所在目录,为None时使用 trained_models/
+            
+        Raises:
+            ValueError: 集成方法或成员不支持
+            FileNotFoundError: 成员包含 linear 但线性模型文件不存在
         """
+        if method not in ENSEMBLE_METHODS:
+            raise ValueError(f'不支持的集成方法: {method}')
+        members = list(members or DEFAULT_ENSEMBLE_MEMBERS)
+        unknown = [name for name in members if name not in ENSEMBLE_MEMBERS]
+        if unknown or not members:
+            raise ValueError(f'不支持的集成成员: {", ".join(unknown)}')
+        
         self.language = language
         self.method = method
+        self.members = members
+        self.model_dir = model_dir
         
-        # 初始化多个基础模型
-        self.models = [
-            MultiClassSentiment(language=language),
-        ]
+        # 规则成员只在阈值上不同
+        self.models = []
+        for name in members:
+            if name in RULE_MEMBER_THRESHOLDS:
+                model = MultiClassSentiment(language=language)
+                model.positive_threshold, model.negative_threshold = RULE_MEMBER_THRESHOLDS[name]
+                self.models.append(model)
+        # 没有规则成员时仍保留一个用于计算基础得分
+        self.base_model = self.models[0] if self.models else MultiClassSentiment(language=language)
         
-        # 不同阈值的模型
-        self.model_strict = MultiClassSentiment(language=language)
-        self.model_strict.positive_threshold = 0.7
-        self.model_strict.negative_threshold = 0.3
-        
-        self.model_loose = MultiClassSentiment(language=language)
-        self.model_loose.positive_threshold = 0.55
-        self.model_loose.negative_threshold = 0.45
-        
-        self.models.extend([self.model_strict, self.model_loose])
+        from linear_model import model_path, stacking_path
+        self.linear_model_path = model_path(language, model_dir) if 'linear' in members else None
+        self.meta_learner_path = stacking_path(language, model_dir)
+        # 提前加载线性成员,模型文件不存在时在创建时即报错
+        self.linear_model
     
-    def _voting_ensemble(self, predictions: list) -> Tuple[str, Dict[str, float]]:
-        """投票集成"""
-        # 收集所有概率
-        all_probs = {
-            'positive': [],
-            'neutral': [],
-            'negative': []
-        }
-        
-        for _, probs in predictions:
-            for key in all_probs:
-                all_probs[key].append(probs[key])
-        
-        # 计算平均概率
-        avg_probs = {
-            key: round(np.mean(values), 4)
-            for key, values in all_probs.items()
+    @property
+    def linear_model(self):
+        """线性成员(模型文件更新后自动重新加载)"""
+        if self.linear_model_path is None:
+            return None
+        from linear_model import get_model
+        return get_model(self.linear_model_path)
+    
+    @property
+    def meta_learner(self):
+        """
+        与当前成员组合匹配的堆叠元模型,未训练时返回None
+        (此时 stacking 退回固定权重的加权平均)
+        """
+        if self.method != 'stacking' or not os.path.exists(self.meta_learner_path):
+            return None
+        from linear_model import get_model, StackingMetaLearner
+        meta_learner = get_model(self.meta_learner_path, StackingMetaLearner.load)
+        return meta_learner if meta_learner.members == self.members else None
+    
+    @property
+    def version(self) -> str:
+        """影响集成结果的配置,用于结果缓存键"""
+        linear_model = self.linear_model
+        meta_learner = self.meta_learner
+        return '{}:{}:{}:{}'.format(
+            self.method, '+'.join(self.members),
+            linear_model.version if linear_model is not None else '-',
+            meta_learner.version if meta_learner is not None else '-'
+        )
+    
+    def _rule_member_probabilities(self, scores: np.ndarray, word_counts: np.ndarray) -> Dict[str, np.ndarray]:
+        """各规则成员的 (N, 3) 概率"""
+        return {
+            name: model._calculate_probabilities_batch(scores, word_counts)
+            for name, model in zip([m for m in self.members if m in RULE_MEMBER_THRESHOLDS], self.models)
         }
+    
+    def member_probabilities(self, texts: List[str], features_list: List[Dict[str, Any]],
+                             contexts: Optional[List[AnalysisContext]] = None,
+                             scores: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        对整批评论依次运行所有成员,再按成员顺序堆叠
         
-        # 确定最终类别
-        max_prob = max(avg_probs.values())
-        if avg_probs['positive'] == max_prob:
-            sentiment = 'positive'
-        elif avg_probs['negative'] == max_prob:
-            sentiment = 'negative'
-        else:
-            sentiment = 'neutral'
-        
-        return sentiment, avg_probs
+        Args:
+            texts: 输入文本列表
+            features_list: 每条文本的特征
+            contexts: 每条文本的分析上下文
+            scores: 已计算的基础得分,为None时批量计算(只计算一次,所有规则成员共享)
+            
+        Returns:
+            形状为 (N, 成员数, 3) 的数组,最后一维依次为 positive/neutral/negative
+        """
+        probs = {}
+        if self.models:
+            if scores is None:
+                scores = self.base_model.get_scores(texts, contexts)
+            with metrics.timed('ensemble.rule_members', len(features_list)):
+                probs.update(self._rule_member_probabilities(np.asarray(scores, dtype=float),
+                                                             lexicon_counts(features_list)))
+        if 'linear' in self.members:
+            with metrics.timed('ensemble.linear_member', len(texts)):
+                probs['linear'] = _round_like_python(self.linear_model.predict_proba(texts, contexts), 4)
+        return np.stack([probs[name] for name in self.members], axis=1)
+    
+    def _voting_ensemble(self, member_probs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """投票集成: 对各成员概率取平均"""
+        avg_probs = np.round(member_probs.mean(axis=1), 4)
+        return _argmax_labels(avg_probs), avg_probs
+    
+    def _learned_stacking(self, member_probs: np.ndarray, meta_learner) -> Tuple[np.ndarray, np.ndarray]:
+        """堆叠集成: 由训练好的元模型组合成员概率"""
+        probs = _round_like_python(meta_learner.predict_proba(member_probs), 4)
+        return _argmax_labels(probs), probs
     
-    def _stacking_ensemble(self, predictions: list, features: Dict[str, Any]) -> Tuple[str, Dict[str, float]]:
-        """堆叠集成"""
-        # 使用特征加权
-        weights = [0.4, 0.3, 0.3]  # 不同模型的权重
+    def _stacking_ensemble(self, member_probs: np.ndarray,
+                           features_list: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """未训练元模型时的堆叠集成: 固定权重加权平均"""
+        # 首个成员权重0.4,其余成员平分剩余权重(默认三个成员时为 [0.4, 0.3, 0.3])
+        n_members = member_probs.shape[1]
+        weights = np.full(n_members, 0.6 / (n_members - 1) if n_members > 1 else 0.0)
+        weights[0] = 0.4 if n_members > 1 else 1.0
         
         # 加权平均
-        weighted_probs = {
-            'positive': 0,
-            'neutral': 0,
-            'negative': 0
-        }
-        
-        for i, (_, probs) in enumerate(predictions):
-            for key in weighted_probs:
-                weighted_probs[key] += probs[key] * weights[i]
+        weighted_probs = (member_probs * weights[None, :, None]).sum(axis=1)
         
         # 如果有情感词典特征,进一步调整
-        if 'sentiment_dict' in features:
-            sent_features = features['sentiment_dict']
-            sent_score = sent_features.get('sentiment_score', 0)
-            
-            if sent_score > 2:
-                weighted_probs['positive'] *= 1.15
-            elif sent_score < -2:
-                weighted_probs['negative'] *= 1.15
-            else:
-                weighted_probs['neutral'] *= 1.1
+        has_dict = np.array(['sentiment_dict' in f for f in features_list], dtype=bool)
+        sent_scores = np.array([
+            f['sentiment_dict'].get('sentiment_score', 0) if 'sentiment_dict' in f else 0
+            for f in features_list
+        ], dtype=float)
+        weighted_probs[:, 0] *= np.where(has_dict & (sent_scores > 2), 1.15, 1.0)
+        weighted_probs[:, 2] *= np.where(has_dict & (sent_scores < -2), 1.15, 1.0)
+        weighted_probs[:, 1] *= np.where(has_dict & (sent_scores >= -2) & (sent_scores <= 2), 1.1, 1.0)
         
         # 归一化
-        total = sum(weighted_probs.values())
-        if total > 0:
-            weighted_probs = {k: round(v/total, 4) for k, v in weighted_probs.items()}
+        total = weighted_probs[:, 0] + weighted_probs[:, 1] + weighted_probs[:, 2]
+        positive_total = total > 0
+        weighted_probs[positive_total] = _round_like_python(
+            weighted_probs[positive_total] / total[positive_total, None], 4
+        )
         
-        # 确定最终类别
-        max_prob = max(weighted_probs.values())
-        if weighted_probs['positive'] == max_prob:
-            sentiment = 'positive'
-        elif weighted_probs['negative'] == max_prob:
-            sentiment = 'negative'
-        else:
-            sentiment = 'neutral'
+        return _argmax_labels(weighted_probs), weighted_probs
+    
+    def _combine(self, member_probs: np.ndarray,
+                 features_list: List[Dict[str, Any]]) -> List[Tuple[str, Dict[str, float]]]:
+        """根据集成方法合并成员概率"""
+        if self.method == 'voting':
+            labels, probs = self._voting_ensemble(member_probs)
+        else:  # stacking
+            meta_learner = self.meta_learner
+            if meta_learner is not None:
+                labels, probs = self._learned_stacking(member_probs, meta_learner)
+            else:
+                labels, probs = self._stacking_ensemble(member_probs, features_list)
         
-        return sentiment, weighted_probs
+        return probabilities_to_results(labels, probs)
     
-    def predict(self, text: str, features: Dict[str, Any]) -> Tuple[str, Dict[str, float]]:
+    def predict_batch(self, texts: List[str], features_list: List[Dict[str, Any]],
+                      contexts: Optional[List[AnalysisContext]] = None) -> List[Tuple[str, Dict[str, float]]]:
+        """
+        批量集成预测
+        
+        Args:
+            texts: 输入文本列表
+            features_list: 每条文本的特征
+            contexts: 每条文本的分析上下文
+            
+        Returns:
+            (sentiment, probabilities) 列表
+        """
+        if len(texts) == 0:
+            return []
+        member_probs = self.member_probabilities(texts, features_list, contexts)
+        with metrics.timed('ensemble.combine', len(texts)):
+            return self._combine(member_probs, features_list)
+    
+    def predict(self, text: str, features: Dict[str, Any],
+                context: Optional[AnalysisContext] = None) -> Tuple[str, Dict[str, float]]:
         """
         集成预测
         
         Args:
             text: 输入文本
             features: 提取的特征
+            context: 分析上下文,复用已有的分词结果
             
         Returns:
             (sentiment, probabilities) 情感类别和各类别概率
         """
-        # 获取所有模型的预测
-        predictions = []
-        for model in self.models:
-            pred = model.predict(text, features)
-            predictions.append(pred)
-        
-        # 根据集成方法合并结果
-        if self.method == 'voting':
-            return self._voting_ensemble(predictions)
-        else:  # stacking
-            return self._stacking_ensemble(predictions, features)
+        return self.predict_batch([text], [features], [context])[0]
+
+
+def lexicon_counts(features_list: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    汇总一批特征中的情感词典计数
+    
+    Returns:
+        形状为 (N, 3) 的数组,列依次为是否有情感词典特征(0/1)、正面词数、负面词数
+    """
+    counts = [
+        (1, f['sentiment_dict'].get('positive_words', 0), f['sentiment_dict'].get('negative_words', 0))
+        if 'sentiment_dict' in f else (0, 0, 0)
+        for f in features_list
+    ]
+    return np.array(counts, dtype=float).reshape(-1, 3)
+
+
+def probabilities_to_results(labels: np.ndarray, probs: np.ndarray) -> List[Tuple[str, Dict[str, float]]]:
+    """将类别向量和 (N, 3) 概率矩阵转换为 (sentiment, probabilities) 列表"""
+    positive, neutral, negative = probs.T.tolist()
+    return [
+        (label, {'positive': p, 'neutral': u, 'negative': n})
+        for label, p, u, n in zip(labels.tolist(), positive, neutral, negative)
+    ]
+
+
+def _argmax_labels(probs: np.ndarray) -> np.ndarray:
+    """
+    根据 (N, 3) 概率矩阵确定类别
+    
+    与逐条判断保持一致: 并列最大时依次优先 positive、negative、neutral
+    """
+    max_prob = probs.max(axis=1)
+    return np.where(
+        probs[:, 0] == max_prob, 'positive',
+        np.where(probs[:, 2] == max_prob, 'negative', 'neutral')
+    )
+
+
+def _round_like_python(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """
+    向量化的四舍五入,结果与Python内置round逐元素完全一致
+    
+    np.round先乘10^ndigits再取整,乘法的舍入误差可能使恰好位于.5附近的值与
+    round()的结果不同,对这些少数元素回退到round()
+    """
+    scaled = values * 10.0 ** ndigits
+    rounded = np.round(values, ndigits)
+    frac = scaled - np.floor(scaled)
+    ambiguous = np.abs(frac - 0.5) < 1e-6
+    if ambiguous.any():
+        rounded[ambiguous] = [round(float(v), ndigits) for v in values[ambiguous]]
+    return rounded
@@ -0,0 +1,252 @@
+"""
+近重复评论聚类模块
+以字符n-gram集合的MinHash签名建立分段的局部敏感哈希索引查找候选,与某个代表评论的
+n-gram集合Jaccard相似度足够高、且各分句命中的情感词及其否定极性相同的评论归入该代表所在的簇;
+每簇只分析代表评论,结果传播给簇内其他评论(刷屏评论、只改了商品名的模板评论等)
+"""
+import re
+import hashlib
+import numpy as np
+from collections import Counter
+from typing import Dict, Any, List, Optional, Callable, Hashable, FrozenSet, Tuple
+from lexicon import LexiconMatcher, SENTIMENT, NEGATOR, CLAUSE_DELIMITERS
+
+# 大于 2^32 的素数;a < 2^32、x < 2^32、b < p 时 a * x + b < 2^64,
+# 32位哈希的线性变换 (a * x + b) mod p 在uint64内计算不会溢出
+MERSENNE_PRIME = np.uint64(4294967311)
+MAX_HASH = np.uint64(0xFFFFFFFF)
+
+# 分句的标点(与词典匹配中否定词、程度副词的作用范围一致)
+CLAUSE_PATTERN = re.compile('[' + re.escape(''.join(sorted(CLAUSE_DELIMITERS))) + ']+')
+
+# 簇大小分布的区间(上界含端点)
+SIZE_BUCKETS = ((2, 2), (3, 5), (6, 10), (11, 100), (101, None))
+
+
+class MinHasher:
+    """字符n-gram集合及其MinHash签名,n-gram的哈希值在进程内缓存(超过上限时清空)"""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 2, seed: int = 1,
+                 max_cached_shingles: int = 200000):
+        """
+        Args:
+            num_perm: 签名长度(哈希函数个数)
+            shingle_size: 字符n-gram的长度
+            seed: 哈希函数参数的随机种子
+            max_cached_shingles: 缓存的n-gram哈希数量上限
+        """
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.max_cached_shingles = max_cached_shingles
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(MAX_HASH) + 1, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(MERSENNE_PRIME), num_perm, dtype=np.uint64)
+        self._hashes: Dict[str, int] = {}
+
+    def _hash(self, shingle: str) -> int:
+        """n-gram的32位哈希(与进程无关,保证结果可复现)"""
+        value = self._hashes.get(shingle)
+        if value is None:
+            if len(self._hashes) >= self.max_cached_shingles:
+                self._hashes.clear()
+            value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), 'little')
+            self._hashes[shingle] = value
+        return value
+
+    def shingles(self, text: str) -> FrozenSet[int]:
+        """文本的字符n-gram集合(以32位哈希值表示)"""
+        n = self.shingle_size
+        return frozenset(self._hash(text[i:i+n]) for i in range(max(len(text) - n + 1, 1)))
+
+    def signature(self, shingles: FrozenSet[int]) -> np.ndarray:
+        """
+        n-gram集合的MinHash签名: 每个哈希函数下的最小哈希值
+
+        Returns:
+            长度为 num_perm 的uint64数组
+        """
+        hashes = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        permuted = (hashes[:, None] * self._a + self._b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0)
+
+
+class NearDuplicateIndex:
+    """
+    MinHash签名的分段(LSH)索引
+
+    签名分为 bands 段,任意一段完全相同的签名互为候选,再按n-gram集合的精确Jaccard相似度确认
+    (签名只用于查找候选,64个哈希函数的估计误差约为0.06,不足以直接判定);
+    只有代表评论进入索引,每个桶的候选数有上限,内存随代表数量线性增长
+    """
+
+    def __init__(self, threshold: float = 0.7, num_perm: int = 64, bands: int = 16,
+                 max_bucket_size: int = 32, max_candidates: int = 16):
+        """
+        Args:
+            threshold: 视为近重复的最小Jaccard相似度
+            num_perm: 签名长度
+            bands: 分段数(需整除 num_perm);段数越多召回越高,候选也越多
+            max_bucket_size: 每个桶保留的代表数量上限
+            max_candidates: 每条评论最多确认的候选数量
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError('threshold 必须在 (0, 1] 之间')
+        if num_perm % bands:
+            raise ValueError('bands 必须整除 num_perm')
+        self.threshold = threshold
+        self.rows = num_perm // bands
+        self.max_bucket_size = max_bucket_size
+        self.max_candidates = max_candidates
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._shingles: List[FrozenSet[int]] = []
+        self._keys: List[Hashable] = []
+
+    def find_or_add(self, signature: np.ndarray, shingles: FrozenSet[int], key: Hashable = None) -> int:
+        """
+        查找足够相似且附加键相同的代表,找不到时将该评论加入索引作为新的代表
+
+        Args:
+            signature: MinHash签名
+            shingles: n-gram集合
+            key: 附加键,只有附加键相同的评论才能归入同一簇
+
+        Returns:
+            代表的编号(按加入索引的顺序)
+        """
+        band_keys = [
+            signature[i * self.rows:(i + 1) * self.rows].tobytes()
+            for i in range(len(self._buckets))
+        ]
+        candidates = Counter()
+        for buckets, band_key in zip(self._buckets, band_keys):
+            candidates.update(buckets.get(band_key, ()))
+        # 相同段数越多的候选越可能足够相似,依次确认;每次最多确认 max_candidates 个
+        for candidate, _ in candidates.most_common(self.max_candidates):
+            if self._keys[candidate] != key:
+                continue
+            other = self._shingles[candidate]
+            common = len(shingles & other)
+            if common >= self.threshold * (len(shingles) + len(other) - common):
+                return candidate
+
+        representative = len(self._keys)
+        self._shingles.append(shingles)
+        self._keys.append(key)
+        for buckets, band_key in zip(self._buckets, band_keys):
+            bucket = buckets.setdefault(band_key, [])
+            if len(bucket) < self.max_bucket_size:
+                bucket.append(representative)
+        return representative
+
+
+def polarity_key(text: str, matcher: LexiconMatcher) -> Tuple[FrozenSet[Tuple[str, bool]], ...]:
+    """
+    聚类的附加键: 按分句依次给出每句命中的情感词及其是否被否定
+
+    字面相似的评论可能只差一个情感词("很好"与"很差")、一个否定词("推荐"与"不推荐"),
+    或多了、少了、调换了一个分句,这些评论的附加键不同,不归入同一簇;
+    同一分句内重复的情感词只计一次,相邻的含有相同情感词的分句合并(刷屏评论重复次数不同仍属同一簇),
+    不含情感词的分句保留,以区分分句数不同的评论;程度副词不影响极性,不计入
+
+    Args:
+        text: 预处理后的文本
+        matcher: 情感词典匹配器
+    """
+    clauses = []
+    for clause in CLAUSE_PATTERN.split(text):
+        if not clause:
+            continue
+        terms = set()
+        negated = False
+        if matcher.lowercase:
+            clause = clause.lower()
+        for start, end, kind, _ in matcher.find(clause):
+            if kind == NEGATOR:
+                negated = not negated
+            elif kind == SENTIMENT:
+                terms.add((clause[start:end], negated))
+                negated = False
+        terms = frozenset(terms)
+        if not terms or not clauses or clauses[-1] != terms:
+            clauses.append(terms)
+    return tuple(clauses)
+
+
+def cluster_near_duplicates(texts: List[str], threshold: float = 0.7, min_length: int = 4,
+                            hasher: Optional[MinHasher] = None,
+                            key: Optional[Callable[[str], Hashable]] = None) -> List[int]:
+    """
+    按输入顺序聚类近重复文本: 每条文本归入一个足够相似的已有代表,否则自身成为代表
+
+    Args:
+        texts: 预处理后的文本(应已去除完全相同的文本)
+        threshold: 视为近重复的最小Jaccard相似度
+        min_length: 参与聚类的最短文本长度,过短的文本n-gram太少,始终单独分析
+        hasher: MinHash计算器,为None时新建
+        key: 计算附加键的函数(如 polarity_key),附加键不同的文本不会归入同一簇
+
+    Returns:
+        每条文本所在簇的代表在 texts 中的下标(代表自身为其下标)
+    """
+    hasher = hasher or MinHasher()
+    index = NearDuplicateIndex(threshold, num_perm=hasher.num_perm)
+    representatives = []
+    positions = []
+    for i, text in enumerate(texts):
+        if len(text) < min_length:
+            representatives.append(i)
+            continue
+        shingles = hasher.shingles(text)
+        cluster = index.find_or_add(hasher.signature(shingles), shingles, key(text) if key is not None else None)
+        if cluster == len(positions):
+            positions.append(i)
+        representatives.append(positions[cluster])
+    return representatives
+
+
+class NearDuplicateStats:
+    """逐批累加近重复簇的大小(按评论条数计,只统计包含两条及以上不同文本的簇)"""
+
+    def __init__(self, top_n: int = 10):
+        """
+        Args:
+            top_n: 返回的最大簇数量
+        """
+        self.top_n = top_n
+        self.size_counts = Counter()
+        self.collapsed = 0
+
+    def update(self, cluster_sizes: List[int], collapsed: int) -> None:
+        """
+        累加一批的聚类结果
+
+        Args:
+            cluster_sizes: 各簇包含的评论条数
+            collapsed: 复用代表结果、未单独分析的不同文本数
+        """
+        self.size_counts.update(cluster_sizes)
+        self.collapsed += collapsed
+
+    def result(self) -> Dict[str, Any]:
+        """簇数量、簇内评论数、跳过分析的文本数、最大的簇和簇大小分布"""
+        largest = []
+        for size in sorted(self.size_counts, reverse=True):
+            largest.extend([size] * min(self.size_counts[size], self.top_n - len(largest)))
+            if len(largest) >= self.top_n:
+                break
+
+        distribution = {}
+        for low, high in SIZE_BUCKETS:
+            label = str(low) if low == high else (f'{low}-{high}' if high is not None else f'>{low - 1}')
+            distribution[label] = sum(
+                count for size, count in self.size_counts.items()
+                if size >= low and (high is None or size <= high)
+            )
+
+        return {
+            'clusters': sum(self.size_counts.values()),
+            'clustered_comments': sum(size * count for size, count in self.size_counts.items()),
+            'collapsed_texts': self.collapsed,
+            'largest_clusters': largest,
+            'size_distribution': distribution
+        }
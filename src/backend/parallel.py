@@ -0,0 +1,103 @@
+"""
+并行批量分析模块
+jieba和SnowNLP均为纯Python实现且受GIL限制,大批量评论通过进程池分片并行分析
+"""
+import os
+import math
+import atexit
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Tuple
+
+# 进程池(每个进程内全局唯一)
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+# 工作进程内按配置缓存的分析器
+_worker_analyzers = {}
+
+
+def _init_worker():
+    """工作进程初始化: 预先加载jieba词典和SnowNLP情感模型"""
+    import jieba
+    jieba.initialize()
+    # 导入即加载SnowNLP情感模型
+    from snownlp import sentiment
+
+
+def _warm_up(_) -> int:
+    """预热任务,返回工作进程ID"""
+    return os.getpid()
+
+
+def _get_worker_analyzer(config: Dict[str, Any]):
+    """获取工作进程内缓存的分析器"""
+    from sentiment_analyzer import SentimentAnalyzer
+    key = repr(sorted(config.items()))
+    if key not in _worker_analyzers:
+        _worker_analyzers[key] = SentimentAnalyzer(**config)
+    return _worker_analyzers[key]
+
+
+def _predict_chunk(args) -> List[Tuple[str, Dict[str, float]]]:
+    """在工作进程内串行预测一个分片"""
+    config, clean_texts = args
+    return _get_worker_analyzer(config).predict_clean_texts(clean_texts)
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    获取进程池,首次调用时创建并预热所有工作进程
+
+    Args:
+        workers: 工作进程数
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+            _pool_workers = workers
+            # 每个进程至少执行一次预热任务,确保模型在首个请求前加载完毕
+            list(_pool.map(_warm_up, range(workers)))
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """关闭进程池"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+            _pool_workers = 0
+
+
+# 进程退出时关闭进程池,等待工作进程正常退出
+atexit.register(shutdown_pool)
+
+
+def predict_parallel(config: Dict[str, Any], texts: List[str], workers: int,
+                     chunk_size: int = 500) -> List[Tuple[str, Dict[str, float]]]:
+    """
+    将预处理后的评论分片后在进程池中并行预测,结果顺序与输入一致
+
+    Args:
+        config: 分析器构造参数(在工作进程内重建分析器)
+        texts: 预处理后的评论文本列表
+        workers: 工作进程数
+        chunk_size: 单个分片的最大条数
+
+    Returns:
+        (sentiment, probabilities) 列表
+    """
+    # 分片数至少为进程数的4倍,使各进程负载均衡
+    size = max(1, min(chunk_size, math.ceil(len(texts) / (workers * 4))))
+    chunks = [(config, texts[i:i+size]) for i in range(0, len(texts), size)]
+
+    results = []
+    for chunk_results in get_pool(workers).map(_predict_chunk, chunks):
+        results.extend(chunk_results)
+    return results
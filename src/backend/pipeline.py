@@ -0,0 +1,407 @@
+"""
+CSV分析流水线
+以流的方式分块读取上传的CSV,逐块完成情感分析和统计累加,
+不再把上传文件落盘后整体读入内存
+"""
+import time
+import pandas as pd
+from collections import Counter
+from typing import List, Dict, Any, Optional, Callable, Iterator, Tuple
+from aggregation import TimeAggregator, LocationAggregator
+from vectorizer import TfidfVectorizer, CorpusTermStats, DEFAULT_HASH_FEATURES
+from sentiment_analyzer import results_from_columns
+from result_store import row_fingerprints, ROW_RESULT_COLUMNS
+from near_duplicates import NearDuplicateStats
+import metrics
+
+# 支持的列名
+COMMENT_COLUMNS = ['评论内容', 'comment', 'text', 'review', '评论']
+DATE_COLUMNS = ['评论日期', 'date', '日期']
+LOCATION_COLUMNS = ['购买地', 'location', '地域', '地区']
+
+
+class CSVFormatError(ValueError):
+    """CSV文件格式不符合要求"""
+
+
+def find_column(columns, candidates: List[str]) -> Optional[str]:
+    """按候选顺序查找存在的列名"""
+    for col in candidates:
+        if col in columns:
+            return col
+    return None
+
+
+class FileStatsAccumulator:
+    """逐块累加CSV文件统计信息"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.columns = None
+        self.date_col = None
+        self.location_col = None
+        self.total_rows = 0
+        self.product_categories = None
+        self.shops = None
+        self.price_min = None
+        self.price_max = None
+        self.price_sum = 0.0
+        self.price_count = 0
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """累加一个数据块"""
+        if self.columns is None:
+            self.columns = chunk.columns.tolist()
+            self.date_col = find_column(chunk.columns, DATE_COLUMNS)
+            self.location_col = find_column(chunk.columns, LOCATION_COLUMNS)
+            if '产品类别' in chunk.columns:
+                self.product_categories = Counter()
+            if '店铺' in chunk.columns:
+                self.shops = Counter()
+
+        self.total_rows += len(chunk)
+
+        if self.product_categories is not None:
+            self.product_categories.update(chunk['产品类别'].value_counts().to_dict())
+        if self.shops is not None:
+            self.shops.update(chunk['店铺'].value_counts().to_dict())
+        if '价格' in chunk.columns:
+            prices = pd.to_numeric(chunk['价格'], errors='coerce').dropna()
+            if len(prices):
+                chunk_min, chunk_max = float(prices.min()), float(prices.max())
+                self.price_min = chunk_min if self.price_min is None else min(self.price_min, chunk_min)
+                self.price_max = chunk_max if self.price_max is None else max(self.price_max, chunk_max)
+                self.price_sum += float(prices.sum())
+                self.price_count += len(prices)
+
+    def result(self) -> Dict[str, Any]:
+        """返回文件统计信息"""
+        file_stats = {
+            'filename': self.filename,
+            'total_rows': self.total_rows,
+            'columns': self.columns or [],
+            'has_date': self.date_col is not None,
+            'has_location': self.location_col is not None,
+        }
+
+        # 添加其他可用列的统计
+        if self.product_categories is not None:
+            file_stats['product_categories'] = dict(self.product_categories.most_common(10))
+        if self.shops is not None:
+            file_stats['top_shops'] = dict(self.shops.most_common(5))
+        if self.columns and '价格' in self.columns:
+            file_stats['price_stats'] = {
+                'min': self.price_min if self.price_count else 0,
+                'max': self.price_max if self.price_count else 0,
+                'avg': self.price_sum / self.price_count if self.price_count else 0
+            }
+
+        return file_stats
+
+
+def iter_csv_chunks(stream, chunksize: int, encoding: str = 'utf-8'):
+    """从文件流中分块读取CSV"""
+    return pd.read_csv(stream, encoding=encoding, chunksize=chunksize)
+
+
+def _optional_str(values: pd.Series) -> pd.Series:
+    """整列转换为字符串,缺失值为None"""
+    return values.astype(str).astype(object).where(values.notna(), None)
+
+
+class SentimentStatsAccumulator:
+    """逐块累加情感类别数量和概率、得分之和(不保留逐条结果时计算统计信息)"""
+
+    def __init__(self):
+        self.counts = {'positive': 0, 'neutral': 0, 'negative': 0}
+        self.sums = {'positive': 0.0, 'neutral': 0.0, 'negative': 0.0, 'score': 0.0}
+
+    def update(self, frame: pd.DataFrame) -> None:
+        """累加一块分析结果"""
+        sentiments = frame['sentiment'].to_numpy(dtype=object)
+        for label in self.counts:
+            self.counts[label] += int((sentiments == label).sum())
+        for name in self.sums:
+            self.sums[name] += float(frame[name].to_numpy(dtype=float).sum())
+
+    def result(self, analyzer) -> Dict[str, Any]:
+        """返回统计信息(格式与 SentimentAnalyzer.get_column_statistics 一致)"""
+        return analyzer.statistics_from_totals(self.counts, self.sums)
+
+
+def analyze_comments(analyzer, comments: List[str], return_features: bool = False,
+                     row_store=None, near_duplicate_stats=None,
+                     collect_contexts: Optional[Dict[str, Any]] = None) -> Tuple[pd.DataFrame, int]:
+    """
+    分析一块评论;提供 row_store 时按行指纹复用已保存的逐行结果,只分析新增或变化的行
+
+    Args:
+        analyzer: SentimentAnalyzer实例
+        comments: 评论原文
+        return_features: 是否返回特征(特征不随行保存,此时不复用逐行结果)
+        row_store: 保存逐行结果的 ResultStore
+        near_duplicate_stats: 近重复簇大小的累加器(NearDuplicateStats)
+        collect_contexts: 提供时填入分析过程中构建的分析上下文(见 SentimentAnalyzer.analyze_columns)
+
+    Returns:
+        (列式结果, 复用的行数)
+    """
+    if row_store is None or return_features:
+        return pd.DataFrame(analyzer.analyze_columns(
+            comments, return_features=return_features, near_duplicate_stats=near_duplicate_stats,
+            collect_contexts=collect_contexts
+        )), 0
+
+    # 指纹包含词典和模型版本,二者更新后旧结果不再复用
+    analyzer.refresh_model()
+    lexicon_version = analyzer.feature_extractor.lexicon.version
+    fingerprints = row_fingerprints(comments, analyzer.cache_config(lexicon_version))
+    with metrics.timed('incremental.lookup', len(comments)):
+        stored = row_store.lookup_rows(fingerprints)
+
+    keys = fingerprints.tolist()
+    pending = [i for i, key in enumerate(keys) if key not in stored]
+    if pending:
+        fresh = pd.DataFrame(analyzer.analyze_columns(
+            [comments[i] for i in pending], near_duplicate_stats=near_duplicate_stats,
+            collect_contexts=collect_contexts
+        ))
+        lexicon_version = fresh['lexicon_version'].iloc[0]
+        with metrics.timed('incremental.store', len(pending)):
+            row_store.store_rows(fingerprints[pending], fresh)
+        stored.update(zip(
+            (keys[i] for i in pending),
+            zip(*(fresh[name].tolist() for name in ROW_RESULT_COLUMNS))
+        ))
+
+    frame = pd.DataFrame([stored[key] for key in keys], columns=list(ROW_RESULT_COLUMNS))
+    frame.insert(0, 'text', comments)
+    frame['lexicon_version'] = lexicon_version
+    return frame, len(comments) - len(pending)
+
+
+EMPTY_RESULT_COLUMNS = ['text', 'sentiment', 'positive', 'neutral', 'negative', 'score', 'lexicon_version']
+
+
+def iter_csv_analysis(stream, filename: str, analyzer, chunksize: int = 5000,
+                      progress_callback: Optional[Callable[[int], None]] = None,
+                      time_granularity: str = 'day',
+                      location_top_n: int = 20,
+                      top_terms_n: int = 0,
+                      vectorizer: Optional[TfidfVectorizer] = None,
+                      return_features: bool = False,
+                      keep_results: bool = True,
+                      row_store=None) -> Iterator[Tuple[str, Any]]:
+    """
+    流式分析上传的CSV,每分析完一块即产出该块的结果
+
+    参数含义见 analyze_csv_stream
+
+    Args:
+        keep_results: 是否在汇总中保留全部结果;为False时逐块结果产出后即释放,
+                      汇总中 results 为空DataFrame(统计信息总是逐块累加)
+        row_store: 保存逐行结果的 ResultStore,提供时只分析新增或变化的行,
+                   汇总中的 incremental 给出复用和重新分析的行数
+
+    Yields:
+        ('block', 该块结果的DataFrame),最后产出 ('summary', 分析结果和统计信息)
+    """
+    file_stats = FileStatsAccumulator(filename)
+    sentiment_stats = SentimentStatsAccumulator()
+    near_duplicate_stats = NearDuplicateStats() if analyzer.near_duplicate_threshold is not None else None
+    time_aggregator = TimeAggregator(time_granularity)
+    location_aggregator = LocationAggregator(location_top_n)
+    term_stats = None
+    if top_terms_n > 0:
+        if vectorizer is None or vectorizer.language != analyzer.language:
+            vectorizer = TfidfVectorizer(language=analyzer.language, n_features=DEFAULT_HASH_FEATURES)
+        term_stats = CorpusTermStats(vectorizer, analyzer.preprocess_text, top_terms_n)
+    comment_col = None
+    frames = []
+    rows_done = 0
+    rows_reused = 0
+
+    chunks = iter(iter_csv_chunks(stream, chunksize))
+    while True:
+        start = time.perf_counter()
+        chunk = next(chunks, None)
+        if chunk is None:
+            break
+        metrics.observe('csv.read', time.perf_counter() - start, len(chunk))
+        
+        if comment_col is None:
+            # 检查CSV格式 - 支持多种列名
+            comment_col = find_column(chunk.columns, COMMENT_COLUMNS)
+            if comment_col is None:
+                raise CSVFormatError('CSV文件必须包含评论内容、comment、text或review列')
+
+        with metrics.timed('file_stats', len(chunk)):
+            file_stats.update(chunk)
+
+        # 执行情感分析
+        comments = chunk[comment_col].fillna('').astype(str).tolist()
+        # 语料词频统计复用情感分析时的分词结果
+        contexts = {} if term_stats is not None else None
+        with metrics.timed('analyze', len(comments)):
+            frame, reused = analyze_comments(
+                analyzer, comments, return_features, row_store, near_duplicate_stats, contexts
+            )
+        rows_reused += reused
+
+        # 整列附加日期和地域信息,其余列随数据块一起释放
+        if file_stats.date_col:
+            with metrics.timed('aggregation.time', len(frame)):
+                frame['date'] = _optional_str(chunk[file_stats.date_col]).to_numpy()
+                time_aggregator.update(frame)
+        if file_stats.location_col:
+            with metrics.timed('aggregation.location', len(frame)):
+                frame['location'] = _optional_str(chunk[file_stats.location_col]).to_numpy()
+                location_aggregator.update(frame)
+        if term_stats is not None:
+            with metrics.timed('term_stats', len(comments)):
+                term_stats.update(comments, frame['sentiment'].to_numpy(), contexts)
+        with metrics.timed('statistics', len(frame)):
+            sentiment_stats.update(frame)
+        if keep_results:
+            frames.append(frame)
+
+        rows_done += len(frame)
+        if progress_callback is not None:
+            progress_callback(rows_done)
+        yield 'block', frame
+
+    results = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=EMPTY_RESULT_COLUMNS)
+    frames.clear()
+
+    # 计算时间和地域统计
+    time_stats = None
+    location_stats = None
+
+    if file_stats.date_col:
+        with metrics.timed('aggregation.time'):
+            time_stats = time_aggregator.result()
+
+    if file_stats.location_col:
+        with metrics.timed('aggregation.location'):
+            location_stats = location_aggregator.result()
+
+    statistics = sentiment_stats.result(analyzer)
+
+    with metrics.timed('term_stats'):
+        term_result = term_stats.result() if term_stats is not None else None
+
+    file_stats_result = file_stats.result()
+    if near_duplicate_stats is not None:
+        # 近重复簇在每个数据块内聚类
+        file_stats_result['near_duplicates'] = near_duplicate_stats.result()
+
+    summary = {
+        'success': True,
+        'total': rows_done,
+        'results': results,
+        'statistics': statistics,
+        'file_stats': file_stats_result,
+        'time_stats': time_stats,
+        'location_stats': location_stats,
+        'term_stats': term_result
+    }
+    if row_store is not None:
+        summary['incremental'] = {'reused_rows': rows_reused, 'scored_rows': rows_done - rows_reused}
+    yield 'summary', summary
+
+
+def analyze_csv_stream(stream, filename: str, analyzer, chunksize: int = 5000,
+                       progress_callback: Optional[Callable[[int], None]] = None,
+                       time_granularity: str = 'day',
+                       location_top_n: int = 20,
+                       top_terms_n: int = 0,
+                       vectorizer: Optional[TfidfVectorizer] = None,
+                       return_features: bool = False,
+                       keep_results: bool = True,
+                       result_store=None,
+                       analysis_id: Optional[str] = None,
+                       row_store=None) -> Dict[str, Any]:
+    """
+    流式分析上传的CSV
+
+    结果以列式DataFrame保存,只在序列化时(见 serialize_results)才转换为逐条字典
+
+    Args:
+        stream: 上传文件的二进制流
+        filename: 原始文件名
+        analyzer: SentimentAnalyzer实例
+        chunksize: 每块读取的行数
+        progress_callback: 每处理完一块后以累计行数回调
+        time_granularity: 时间统计粒度 ('day'、'week' 或 'month')
+        location_top_n: 地域统计返回的地域数量
+        top_terms_n: 每个情感类别返回的TF-IDF代表词数量,0表示不统计
+        vectorizer: 向量化器,已拟合时沿用其词表和IDF,为None时在本次上传的语料上建立词表
+        return_features: 是否在每条结果中附带所有启用的特征族(默认只计算模型需要的特征族)
+        keep_results: 是否在返回值中保留全部结果(为False时 results 为空DataFrame)
+        result_store: 结果存储(ResultStore),提供时逐块写入结果,可在服务端分页查询
+        analysis_id: 写入结果存储时使用的分析ID
+        row_store: 保存逐行结果的 ResultStore,提供时只分析新增或变化的行
+
+    Returns:
+        分析结果和统计信息,其中 results 为DataFrame
+    """
+    events = iter_csv_analysis(
+        stream, filename, analyzer, chunksize=chunksize, progress_callback=progress_callback,
+        time_granularity=time_granularity, location_top_n=location_top_n, top_terms_n=top_terms_n,
+        vectorizer=vectorizer, return_features=return_features, keep_results=keep_results,
+        row_store=row_store
+    )
+    if result_store is not None:
+        events = result_store.record(analysis_id, filename, events)
+    for kind, value in events:
+        if kind == 'summary':
+            return value
+
+
+def analyze_csv_serialized(stream, filename: str, analyzer, return_results: bool = True,
+                           result_store=None, analysis_id: Optional[str] = None,
+                           **options) -> Dict[str, Any]:
+    """
+    流式分析上传的CSV并直接返回可JSON序列化的响应
+
+    每块结果产出后即转换为逐条字典并释放,不保留全部数据块、也不再合并为一个DataFrame
+
+    Args:
+        stream: 上传文件的二进制流
+        filename: 原始文件名
+        analyzer: SentimentAnalyzer实例
+        return_results: 是否返回逐条结果;为False时响应中没有 results
+        result_store: 结果存储(ResultStore),提供时逐块写入结果
+        analysis_id: 写入结果存储时使用的分析ID
+        options: 传给 iter_csv_analysis 的其他参数
+
+    Returns:
+        与 serialize_results(analyze_csv_stream(...)) 相同的响应
+    """
+    events = iter_csv_analysis(stream, filename, analyzer, keep_results=False, **options)
+    if result_store is not None:
+        events = result_store.record(analysis_id, filename, events)
+    results = []
+    for kind, value in events:
+        if kind == 'block':
+            if return_results:
+                with metrics.timed('serialize', len(value)):
+                    results.extend(results_from_columns(value))
+        else:
+            body = dict(value)
+    if return_results:
+        body['results'] = results
+    else:
+        del body['results']
+    return body
+
+
+def serialize_results(payload: Dict[str, Any], start: int = 0, stop: Optional[int] = None) -> Dict[str, Any]:
+    """
+    将分析结果转换为可JSON序列化的响应
+
+    Args:
+        payload: analyze_csv_stream 的返回值
+        start, stop: 只序列化该区间内的结果(用于分页)
+    """
+    return {**payload, 'results': results_from_columns(payload['results'].iloc[start:stop])}
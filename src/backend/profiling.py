@@ -0,0 +1,208 @@
+"""
+单次分析的性能剖析模块
+按需对一次分析同时运行 cProfile 和栈采样,结果按请求ID保存在磁盘上,
+可下载为 pstats 文件或折叠栈(flamegraph.pl / speedscope 可直接读取)格式;
+未开启剖析的请求不安装任何钩子
+"""
+import os
+import io
+import re
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+# 剖析ID只允许十六进制字符,避免路径穿越
+PROFILE_ID_PATTERN = re.compile(r'^[0-9a-f]{8,64}$')
+
+# 可下载的格式: pstats 为 cProfile 原始数据,collapsed 为采样得到的折叠栈,text 为按累计耗时排序的摘要
+PROFILE_FORMATS = ('pstats', 'collapsed', 'text')
+
+FILE_SUFFIXES = {'pstats': '.prof', 'collapsed': '.collapsed', 'meta': '.json'}
+
+
+class StackSampler:
+    """在后台线程中定期采样目标线程的调用栈,统计折叠栈出现次数"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005, max_depth: int = 128):
+        """
+        Args:
+            thread_id: 被采样线程的 threading.get_ident()
+            interval: 采样间隔(秒)
+            max_depth: 每个栈保留的最大深度(从栈顶计)
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _label(self, code) -> str:
+        """函数的显示名: 函数名 (文件名:行号)"""
+        label = self._labels.get(code)
+        if label is None:
+            label = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+            self._labels[code] = label
+        return label
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        """折叠栈格式: 每行为 "根;...;栈顶 次数" """
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class ProfileStore:
+    """
+    剖析结果存储
+
+    每次剖析保存为 {id}.prof、{id}.collapsed 和 {id}.json 三个文件;
+    剖析数量或总大小超出上限时删除最早的剖析
+    """
+
+    def __init__(self, directory: str, max_profiles: int = 20, max_bytes: int = 50 * 1024 * 1024,
+                 sample_interval: float = 0.005):
+        """
+        Args:
+            directory: 保存目录
+            max_profiles: 最多保留的剖析数量
+            max_bytes: 所有剖析文件的总大小上限(字节)
+            sample_interval: 栈采样间隔(秒)
+        """
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self.max_bytes = max_bytes
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, profile_id: str, kind: str) -> str:
+        """剖析文件路径"""
+        return os.path.join(self.directory, profile_id + FILE_SUFFIXES[kind])
+
+    @contextmanager
+    def record(self, profile_id: str, meta: Optional[Dict[str, Any]] = None):
+        """
+        剖析代码块(只剖析当前线程),结束后保存结果
+
+        Args:
+            profile_id: 剖析ID(十六进制,通常为请求或任务ID)
+            meta: 随剖析保存的说明信息(文件名、行数等),代码块内可继续补充
+
+        Yields:
+            meta 字典
+        """
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            raise ValueError(f'无效的剖析ID: {profile_id}')
+        meta = dict(meta or {})
+        profiler = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), self.sample_interval)
+        started_at = time.time()
+        start = time.perf_counter()
+        sampler.start()
+        profiler.enable()
+        try:
+            yield meta
+        except Exception as e:
+            meta['error'] = str(e)
+            raise
+        finally:
+            profiler.disable()
+            sampler.stop()
+            meta.update({
+                'id': profile_id,
+                'created_at': started_at,
+                'duration_seconds': round(time.perf_counter() - start, 6),
+                'samples': sampler.samples,
+                'sample_interval': self.sample_interval
+            })
+            try:
+                self._save(profile_id, profiler, sampler, meta)
+            except Exception as e:
+                print(f"保存剖析结果错误: {e}")
+
+    def _save(self, profile_id: str, profiler: cProfile.Profile, sampler: StackSampler,
+              meta: Dict[str, Any]) -> None:
+        """写入剖析文件并按上限淘汰旧剖析"""
+        profiler.dump_stats(self.path(profile_id, 'pstats'))
+        with open(self.path(profile_id, 'collapsed'), 'w', encoding='utf-8') as f:
+            f.write(sampler.collapsed())
+        meta['bytes'] = sum(
+            os.path.getsize(self.path(profile_id, kind)) for kind in ('pstats', 'collapsed')
+        )
+        with open(self.path(profile_id, 'meta'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        self._evict()
+
+    def list(self) -> List[Dict[str, Any]]:
+        """所有剖析的说明信息,按时间从新到旧"""
+        profiles = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(FILE_SUFFIXES['meta']):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(profiles, key=lambda meta: meta.get('created_at', 0), reverse=True)
+
+    def _evict(self) -> None:
+        """超出数量或总大小上限时删除最早的剖析"""
+        with self._lock:
+            profiles = self.list()
+            total_bytes = sum(meta.get('bytes', 0) for meta in profiles)
+            while profiles and (len(profiles) > self.max_profiles or total_bytes > self.max_bytes):
+                oldest = profiles.pop()
+                total_bytes -= oldest.get('bytes', 0)
+                self.delete(oldest['id'])
+
+    def delete(self, profile_id: str) -> None:
+        """删除一次剖析的所有文件"""
+        for kind in FILE_SUFFIXES:
+            path = self.path(profile_id, kind)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        """剖析的说明信息,不存在时返回None"""
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        try:
+            with open(self.path(profile_id, 'meta'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def summary(self, profile_id: str, limit: int = 40) -> str:
+        """按累计耗时排序的文本摘要"""
+        output = io.StringIO()
+        stats = pstats.Stats(self.path(profile_id, 'pstats'), stream=output)
+        stats.sort_stats('cumulative').print_stats(limit)
+        return output.getvalue()
@@ -0,0 +1,147 @@
+"""
+分析器注册表
+进程内按配置复用预先构建好的分析器,并在启动时预热jieba、SnowNLP和TextBlob
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from sentiment_analyzer import SentimentAnalyzer
+
+# 预热用的样例评论
+WARM_UP_SAMPLES = {
+    'zh': '这个商品质量很好,物流也很快,非常满意',
+    'en': 'Great product, fast delivery, very satisfied'
+}
+
+
+class AnalyzerRegistry:
+    """
+    线程安全的分析器注册表
+
+    分析器在分析过程中不保存请求相关的状态(结果缓存自带锁),
+    因此同一配置的分析器可以在多个请求线程之间共享;
+    最多保留 max_analyzers 个分析器,超出时淘汰最久未使用的
+    """
+
+    def __init__(self, max_analyzers: int = 16, **analyzer_options):
+        """
+        Args:
+            max_analyzers: 保留的分析器数量上限
+            analyzer_options: 所有分析器共用的构造参数(workers、cache等)
+        """
+        self.max_analyzers = max_analyzers
+        self.analyzer_options = analyzer_options
+        self._analyzers = OrderedDict()
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        # 预热状态
+        self.ready = False
+        self.warm_up_error = None
+        self.timings = {}
+        self._created_at = time.perf_counter()
+
+    @staticmethod
+    def make_key(language: str, features: List[str], use_ensemble: bool, model: str = 'rule',
+                 ensemble_method: str = 'voting', ensemble_members: Optional[List[str]] = None,
+                 near_duplicate_threshold: Optional[float] = None) -> Tuple:
+        """注册表键,特征顺序不影响分析结果(集成成员的顺序与堆叠元模型对应,保留原顺序)"""
+        return (language, tuple(sorted(set(features))), use_ensemble, model,
+                ensemble_method, tuple(ensemble_members or ()), near_duplicate_threshold)
+
+    def get(self, language: str = 'zh', features: Optional[List[str]] = None,
+            use_ensemble: bool = False, model: str = 'rule', ensemble_method: str = 'voting',
+            ensemble_members: Optional[List[str]] = None,
+            near_duplicate_threshold: Optional[float] = None) -> SentimentAnalyzer:
+        """
+        获取指定配置的分析器,不存在时创建
+
+        Args:
+            language: 语言类型
+            features: 特征工程方法列表
+            use_ensemble: 是否使用模型集成
+            model: 基础模型类型 ('rule' 或 'linear')
+            ensemble_method: 集成方法 ('voting' 或 'stacking')
+            ensemble_members: 集成成员列表,为None时使用默认成员
+            near_duplicate_threshold: 近重复聚类的最小Jaccard相似度,为None时不聚类
+        """
+        features = features or ['basic']
+        key = self.make_key(language, features, use_ensemble, model, ensemble_method, ensemble_members,
+                            near_duplicate_threshold)
+        with self._lock:
+            analyzer = self._analyzers.get(key)
+            if analyzer is None:
+                analyzer = SentimentAnalyzer(
+                    language=language,
+                    features=list(key[1]),
+                    use_ensemble=use_ensemble,
+                    model=model,
+                    ensemble_method=ensemble_method,
+                    ensemble_members=ensemble_members,
+                    near_duplicate_threshold=near_duplicate_threshold,
+                    **self.analyzer_options
+                )
+                self._analyzers[key] = analyzer
+                while len(self._analyzers) > self.max_analyzers:
+                    self._analyzers.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._analyzers.move_to_end(key)
+            return analyzer
+
+    def _timed(self, name: str, func, *args) -> Any:
+        """执行并记录耗时(毫秒)"""
+        start = time.perf_counter()
+        value = func(*args)
+        self.timings[name] = round((time.perf_counter() - start) * 1000, 2)
+        return value
+
+    def warm_up(self, configs: List[Dict[str, Any]]) -> None:
+        """
+        预热: 加载jieba词典,并对每个配置分别测量首次(冷)和再次(热)分析耗时
+
+        Args:
+            configs: 分析器配置列表,如 [{'language': 'zh', 'features': ['basic']}]
+        """
+        try:
+            import jieba
+            self._timed('jieba_initialize_ms', jieba.initialize)
+
+            for config in configs:
+                analyzer = self.get(**config)
+                sample = [analyzer.preprocess_text(WARM_UP_SAMPLES.get(analyzer.language, ''))]
+                name = '{}_{}{}'.format(
+                    analyzer.language,
+                    '+'.join(analyzer.features),
+                    '_ensemble' if analyzer.use_ensemble else ''
+                )
+                # 绕过结果缓存,测量真实的模型耗时
+                self._timed(f'{name}_cold_ms', analyzer.predict_clean_texts, sample)
+                self._timed(f'{name}_warm_ms', analyzer.predict_clean_texts, sample)
+        except Exception as e:
+            # 预热失败时不标记就绪,健康检查报告错误
+            print(f"模型预热错误: {e}")
+            self.warm_up_error = str(e)
+            return
+        self.timings['startup_to_ready_ms'] = round((time.perf_counter() - self._created_at) * 1000, 2)
+        self.ready = True
+
+    def start_warm_up(self, configs: List[Dict[str, Any]]) -> threading.Thread:
+        """在后台线程中预热,不阻塞服务启动"""
+        thread = threading.Thread(target=self.warm_up, args=(configs,), name='analyzer-warm-up', daemon=True)
+        thread.start()
+        return thread
+
+    def get_status(self) -> Dict[str, Any]:
+        """预热状态和耗时"""
+        with self._lock:
+            analyzers = len(self._analyzers)
+        return {
+            'ready': self.ready,
+            'analyzers': analyzers,
+            'max_analyzers': self.max_analyzers,
+            'evictions': self.evictions,
+            'timings': dict(self.timings),
+            'error': self.warm_up_error
+        }
@@ -0,0 +1,175 @@
+"""
+分析结果的响应格式
+除默认的整体JSON外,支持逐块流式输出的NDJSON和列式JSON:
+每分析完一块CSV即编码并发送该块结果,首字节时间和内存占用不再随结果总量增长;
+可选gzip压缩,安装了 orjson 时用它编码JSON
+"""
+import json
+import zlib
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Iterable, Iterator, Optional, Tuple
+from sentiment_analyzer import results_from_columns
+import metrics
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# json 为原有的整体JSON响应,ndjson 为每行一条结果,columnar 为按列分块的JSON
+RESPONSE_FORMATS = ('json', 'ndjson', 'columnar')
+
+MIMETYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'columnar': 'application/json'
+}
+
+# 列式格式中情感类别以下标表示,下标对应的类别名写在响应开头
+CLASSES = ('positive', 'neutral', 'negative')
+
+# 列式格式中按原样输出的可选列
+OPTIONAL_COLUMNS = ('lexicon_version', 'date', 'location', 'features')
+
+
+def _default(value):
+    """标准库json无法编码的numpy类型"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f'无法序列化的类型: {type(value).__name__}')
+
+
+def dumps(obj) -> bytes:
+    """编码为紧凑的UTF-8 JSON(优先使用orjson)"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+def negotiate_format(requested: Optional[str], accept_mimetypes) -> Optional[str]:
+    """
+    确定响应格式: 优先使用 format 参数,否则按Accept请求头在JSON和NDJSON之间选择
+
+    Args:
+        requested: format 参数,未提供时为None
+        accept_mimetypes: request.accept_mimetypes
+
+    Returns:
+        响应格式,format 参数无效时为None
+    """
+    if requested:
+        return requested if requested in RESPONSE_FORMATS else None
+    best = accept_mimetypes.best_match([MIMETYPES['json'], MIMETYPES['ndjson']])
+    return 'ndjson' if best == MIMETYPES['ndjson'] else 'json'
+
+
+def _summary(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """汇总信息(不含逐条结果)"""
+    return {key: value for key, value in payload.items() if key != 'results'}
+
+
+def _ndjson_rows(frame: pd.DataFrame, include_text: bool) -> bytes:
+    """一块结果编码为NDJSON,每行一条结果"""
+    rows = results_from_columns(frame)
+    if not include_text:
+        for row in rows:
+            del row['text']
+    return b''.join(dumps(row) + b'\n' for row in rows)
+
+
+def _columnar_block(frame: pd.DataFrame, offset: int, include_text: bool) -> Dict[str, Any]:
+    """一块结果的列式表示: 类别下标、得分和三类概率各为一个数组"""
+    block = {
+        'offset': offset,
+        'sentiment': pd.Categorical(frame['sentiment'], categories=CLASSES).codes.tolist(),
+        'score': frame['score'].tolist(),
+        'probabilities': {label: frame[label].tolist() for label in CLASSES}
+    }
+    if include_text:
+        block['text'] = frame['text'].tolist()
+    for name in OPTIONAL_COLUMNS:
+        if name in frame:
+            block[name] = frame[name].tolist()
+    return block
+
+
+def iter_ndjson(events: Iterable[Tuple[str, Any]], include_text: bool = False) -> Iterator[bytes]:
+    """
+    NDJSON响应体: 每行一条结果,最后一行为 {"type": "summary", ...} 汇总;
+    中途出错时以 {"type": "error", ...} 行结束
+
+    Args:
+        events: pipeline.iter_csv_analysis 产出的事件
+        include_text: 结果中是否包含原文
+    """
+    try:
+        for kind, value in events:
+            if kind == 'block':
+                with metrics.timed('serialize', len(value)):
+                    data = _ndjson_rows(value, include_text)
+                if data:
+                    yield data
+            else:
+                yield dumps({'type': 'summary', **_summary(value)}) + b'\n'
+    except Exception as e:
+        print(f"流式输出分析结果错误: {e}")
+        metrics.count_error('serialize')
+        yield dumps({'type': 'error', 'success': False, 'error': str(e)}) + b'\n'
+
+
+def iter_columnar(events: Iterable[Tuple[str, Any]], include_text: bool = False) -> Iterator[bytes]:
+    """
+    列式JSON响应体: {"format": "columnar", "classes": [...], "blocks": [...], 汇总信息...}
+    每块CSV的结果为 blocks 中的一项,汇总信息在所有块之后输出;
+    中途出错时以 "success": false 和 "error" 结束文档
+
+    Args:
+        events: pipeline.iter_csv_analysis 产出的事件
+        include_text: 每块是否包含原文列
+    """
+    yield b'{"format":"columnar","classes":' + dumps(CLASSES) + b',"blocks":['
+    offset = 0
+    separator = b''
+    try:
+        for kind, value in events:
+            if kind == 'block':
+                if len(value) == 0:
+                    continue
+                with metrics.timed('serialize', len(value)):
+                    data = dumps(_columnar_block(value, offset, include_text))
+                yield separator + data
+                separator = b','
+                offset += len(value)
+            else:
+                # 去掉汇总对象的左花括号,接在 blocks 数组之后
+                yield b'],' + dumps(_summary(value))[1:]
+    except Exception as e:
+        print(f"流式输出分析结果错误: {e}")
+        metrics.count_error('serialize')
+        yield b'],' + dumps({'success': False, 'error': str(e)})[1:]
+
+
+def stream_body(events: Iterable[Tuple[str, Any]], response_format: str,
+                include_text: bool = False) -> Iterator[bytes]:
+    """按响应格式(ndjson 或 columnar)编码分析事件"""
+    if response_format == 'ndjson':
+        return iter_ndjson(events, include_text)
+    return iter_columnar(events, include_text)
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """
+    逐块gzip压缩,每块之后同步刷新,客户端无需等待整个响应即可解压已收到的部分
+
+    Args:
+        chunks: 未压缩的数据块
+        level: 压缩级别(1-9)
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,166 @@
+"""
+分析结果缓存模块
+购物评论重复度很高("好评"、"默认好评"、模板评论),按内容哈希缓存分析结果,
+内存中为有界LRU缓存,可选持久化到SQLite以便服务重启后继续使用(同样有条数上限)
+"""
+import json
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+
+
+def make_cache_key(clean_text: str, config: Dict[str, Any]) -> str:
+    """
+    根据预处理后的文本和分析配置生成缓存键
+
+    Args:
+        clean_text: 预处理后的评论文本
+        config: 影响分析结果的配置(语言、特征、集成方式等)
+    """
+    payload = json.dumps([clean_text, config], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """线程安全的有界LRU结果缓存"""
+
+    def __init__(self, max_size: int = 50000, db_path: Optional[str] = None,
+                 max_disk_rows: Optional[int] = 1000000):
+        """
+        初始化结果缓存
+
+        Args:
+            max_size: 内存中最多缓存的条数
+            db_path: SQLite文件路径,为None时不持久化
+            max_disk_rows: SQLite中最多保留的条数,超出时删除最早写入的结果;为None时不限制
+        """
+        self.max_size = max_size
+        self.db_path = db_path
+        self.max_disk_rows = max_disk_rows
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 统计计数
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+        self.disk_evictions = 0
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL)'
+            )
+            self._db.commit()
+
+    def _remember(self, key: str, value: Any) -> None:
+        """写入内存LRU(调用方需持有锁)"""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def _load_from_disk(self, keys: List[str]) -> Dict[str, Any]:
+        """从SQLite批量读取(调用方需持有锁)"""
+        found = {}
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i+500]
+            placeholders = ','.join('?' * len(batch))
+            rows = self._db.execute(
+                f'SELECT key, value FROM results WHERE key IN ({placeholders})', batch
+            )
+            for key, value in rows:
+                found[key] = json.loads(value)
+        return found
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        批量查询缓存
+
+        Returns:
+            命中的 {key: value}
+        """
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    found[key] = self._data[key]
+                else:
+                    missing.append(key)
+
+            if missing and self._db is not None:
+                disk_found = self._load_from_disk(missing)
+                for key, value in disk_found.items():
+                    self._remember(key, value)
+                found.update(disk_found)
+                self.disk_hits += len(disk_found)
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key: str) -> Optional[Any]:
+        """查询单个缓存项"""
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Iterable[Tuple[str, Any]]) -> None:
+        """批量写入缓存"""
+        items = list(items)
+        with self._lock:
+            for key, value in items:
+                self._remember(key, value)
+            if self._db is not None and items:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO results (key, value) VALUES (?, ?)',
+                    [(key, json.dumps(value, ensure_ascii=False)) for key, value in items]
+                )
+                self._evict_from_disk()
+                self._db.commit()
+
+    def _evict_from_disk(self) -> None:
+        """超出 max_disk_rows 时删除最早写入的结果(调用方需持有锁)"""
+        if self.max_disk_rows is None:
+            return
+        # INSERT OR REPLACE 重新写入的行获得新的rowid,rowid顺序即写入顺序
+        self.disk_evictions += self._db.execute(
+            'DELETE FROM results WHERE rowid <= '
+            '(SELECT rowid FROM results ORDER BY rowid DESC LIMIT 1 OFFSET ?)', (self.max_disk_rows,)
+        ).rowcount
+
+    def put(self, key: str, value: Any) -> None:
+        """写入单个缓存项"""
+        self.put_many([(key, value)])
+
+    def clear(self) -> None:
+        """清空缓存和统计"""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = self.disk_hits = self.disk_evictions = 0
+            if self._db is not None:
+                self._db.execute('DELETE FROM results')
+                self._db.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_hits': self.disk_hits,
+                'disk_evictions': self.disk_evictions,
+                'max_disk_rows': self.max_disk_rows if self._db is not None else None,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'persistent': self._db is not None
+            }
@@ -0,0 +1,483 @@
+"""
+分析结果存储模块
+每次分析的逐条结果按分析ID写入本地SQLite,按情感、得分、日期和地域建立索引,
+前端可在服务端分页、筛选和排序,不必一次接收全部结果;
+最积极/最消极的前K条评论在筛选结果上用堆选出,无需整体排序;
+另按行指纹(评论原文 + 分析配置)保存逐行结果,重复上传时只分析新增或变化的行
+"""
+import json
+import time
+import heapq
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Tuple
+
+# 可排序的字段: 参数名 -> 列名(date 按规范化后的日期排序)
+SORT_COLUMNS = {
+    'row': 'row',
+    'score': 'score',
+    'positive': 'positive',
+    'neutral': 'neutral',
+    'negative': 'negative',
+    'date': 'day',
+    'location': 'location'
+}
+
+SENTIMENTS = ('positive', 'neutral', 'negative')
+
+# 前K条评论的方向: positive 取得分最高的评论,negative 取得分最低的评论
+TOP_DIRECTIONS = ('positive', 'negative')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS analyses (
+    id TEXT PRIMARY KEY,
+    filename TEXT,
+    created_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    summary TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    analysis_id TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    text TEXT,
+    sentiment TEXT,
+    positive REAL,
+    neutral REAL,
+    negative REAL,
+    score REAL,
+    lexicon_version TEXT,
+    date TEXT,
+    day TEXT,
+    location TEXT,
+    features TEXT,
+    PRIMARY KEY (analysis_id, row)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS results_sentiment ON results (analysis_id, sentiment);
+CREATE INDEX IF NOT EXISTS results_score ON results (analysis_id, score);
+CREATE INDEX IF NOT EXISTS results_day ON results (analysis_id, day);
+CREATE INDEX IF NOT EXISTS results_location ON results (analysis_id, location);
+CREATE TABLE IF NOT EXISTS row_results (
+    id INTEGER PRIMARY KEY,
+    fingerprint INTEGER NOT NULL UNIQUE,
+    sentiment TEXT NOT NULL,
+    positive REAL NOT NULL,
+    neutral REAL NOT NULL,
+    negative REAL NOT NULL,
+    score REAL NOT NULL
+);
+'''
+
+# 逐行结果中保存的列(lexicon_version 由当前词典决定,不随行保存)
+ROW_RESULT_COLUMNS = ('sentiment', 'positive', 'neutral', 'negative', 'score')
+
+RESULT_FIELDS = ('row', 'text', 'sentiment', 'positive', 'neutral', 'negative', 'score',
+                 'lexicon_version', 'date', 'location', 'features')
+
+
+class ResultFilters:
+    """结果查询的筛选条件"""
+
+    def __init__(self, sentiment: Optional[str] = None, min_score: Optional[float] = None,
+                 max_score: Optional[float] = None, start_date: Optional[str] = None,
+                 end_date: Optional[str] = None, location: Optional[str] = None,
+                 keyword: Optional[str] = None):
+        """
+        Args:
+            sentiment: 情感类别
+            min_score, max_score: 得分范围(含端点)
+            start_date, end_date: 日期范围(含端点,可解析的日期字符串)
+            location: 地域(精确匹配)
+            keyword: 评论原文包含的关键词
+        """
+        if sentiment is not None and sentiment not in SENTIMENTS:
+            raise ValueError(f'sentiment 必须是 {", ".join(SENTIMENTS)} 之一')
+        self.sentiment = sentiment
+        self.min_score = min_score
+        self.max_score = max_score
+        self.start_date = _normalize_day(start_date, 'start_date')
+        self.end_date = _normalize_day(end_date, 'end_date')
+        self.location = location
+        self.keyword = keyword
+
+    def where(self, analysis_id: str) -> Tuple[str, List[Any]]:
+        """WHERE子句和参数"""
+        clauses = ['analysis_id = ?']
+        params = [analysis_id]
+        if self.sentiment is not None:
+            clauses.append('sentiment = ?')
+            params.append(self.sentiment)
+        if self.min_score is not None:
+            clauses.append('score >= ?')
+            params.append(self.min_score)
+        if self.max_score is not None:
+            clauses.append('score <= ?')
+            params.append(self.max_score)
+        if self.start_date is not None:
+            clauses.append('day >= ?')
+            params.append(self.start_date)
+        if self.end_date is not None:
+            clauses.append('day <= ?')
+            params.append(self.end_date)
+        if self.location is not None:
+            clauses.append('location = ?')
+            params.append(self.location)
+        if self.keyword:
+            # 关键词中的 % 和 _ 按字面匹配
+            escaped = self.keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            clauses.append("text LIKE ? ESCAPE '\\'")
+            params.append(f'%{escaped}%')
+        return ' AND '.join(clauses), params
+
+
+def row_fingerprints(texts: List[str], config: Dict[str, Any]) -> np.ndarray:
+    """
+    行指纹: 评论原文和分析配置的64位哈希(向量化计算,无需预处理)
+
+    Args:
+        texts: 评论原文
+        config: 影响分析结果的配置(SentimentAnalyzer.cache_config),配置变化后指纹随之变化
+
+    Returns:
+        int64 数组(可直接作为SQLite整数主键)
+    """
+    digest = hashlib.sha1(json.dumps(config, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+    hashes = pd.util.hash_pandas_object(pd.Series(texts, dtype=object), index=False, hash_key=digest[:16])
+    return hashes.to_numpy().view(np.int64)
+
+
+def _normalize_day(value: Optional[str], name: str) -> Optional[str]:
+    """日期参数规范化为 YYYY-MM-DD"""
+    if value is None or value == '':
+        return None
+    day = pd.to_datetime(value, errors='coerce')
+    if pd.isna(day):
+        raise ValueError(f'{name} 不是有效日期: {value}')
+    return day.strftime('%Y-%m-%d')
+
+
+def _optional_column(frame: pd.DataFrame, name: str) -> List[Any]:
+    """可选列的值,列不存在时全为None"""
+    if name not in frame:
+        return [None] * len(frame)
+    return [value if isinstance(value, str) else None for value in frame[name].tolist()]
+
+
+def _row_to_result(row: sqlite3.Row) -> Dict[str, Any]:
+    """数据库行转换为结果字典(字段与 results_from_columns 一致,另加行号)"""
+    result = {
+        'row': row['row'],
+        'text': row['text'],
+        'sentiment': row['sentiment'],
+        'probabilities': {
+            'positive': row['positive'],
+            'neutral': row['neutral'],
+            'negative': row['negative']
+        },
+        'score': row['score'],
+        'lexicon_version': row['lexicon_version'],
+        'date': row['date'],
+        'location': row['location']
+    }
+    if row['features'] is not None:
+        result['features'] = json.loads(row['features'])
+    return result
+
+
+class ResultStore:
+    """
+    线程安全的SQLite分析结果存储,超过保留数量或大小上限时删除最早的分析
+
+    写入共用一个连接并持有锁;查询每次打开只读连接,借助WAL模式与写入并发,
+    长时间的扫描(如前K条)不会阻塞正在进行的分析
+    """
+
+    def __init__(self, db_path: str, max_analyses: int = 50, max_row_results: int = 2000000,
+                 max_bytes: Optional[int] = None):
+        """
+        Args:
+            db_path: SQLite文件路径(':memory:' 表示只保存在内存中)
+            max_analyses: 最多保留的分析数量
+            max_row_results: 最多保留的逐行结果数量,超出时删除最早写入的结果
+            max_bytes: 数据库占用空间上限(字节),超出时删除最早的已结束分析,为None时不限制
+        """
+        self.db_path = db_path
+        self.max_analyses = max_analyses
+        self.max_row_results = max_row_results
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    @contextmanager
+    def _reader(self):
+        """
+        查询用的连接: 文件数据库每次打开独立的只读连接,不占用写入锁;
+        内存数据库无法共享,退回到持有锁的写入连接
+        """
+        if self.db_path == ':memory:':
+            with self._lock:
+                yield self._db
+            return
+        db = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True, check_same_thread=False)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def create(self, analysis_id: str, filename: Optional[str] = None) -> None:
+        """登记一次新的分析"""
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO analyses (id, filename, created_at, status) VALUES (?, ?, ?, ?)',
+                (analysis_id, filename, time.time(), 'running')
+            )
+            self._db.commit()
+
+    def append(self, analysis_id: str, frame: pd.DataFrame, offset: int) -> None:
+        """
+        写入一块结果
+
+        Args:
+            analysis_id: 分析ID
+            frame: 列式结果(analyze_columns 的输出,可含 date/location/features 列)
+            offset: 该块第一条结果的行号
+        """
+        if len(frame) == 0:
+            return
+        dates = _optional_column(frame, 'date')
+        days = pd.to_datetime(pd.Series(dates, dtype=object), errors='coerce').dt.strftime('%Y-%m-%d')
+        features = (
+            [json.dumps(value, ensure_ascii=False) if value is not None else None for value in frame['features'].tolist()]
+            if 'features' in frame else [None] * len(frame)
+        )
+        rows = zip(
+            [analysis_id] * len(frame),
+            range(offset, offset + len(frame)),
+            frame['text'].tolist(),
+            frame['sentiment'].tolist(),
+            frame['positive'].tolist(),
+            frame['neutral'].tolist(),
+            frame['negative'].tolist(),
+            frame['score'].tolist(),
+            _optional_column(frame, 'lexicon_version'),
+            dates,
+            days.where(days.notna(), None).tolist(),
+            _optional_column(frame, 'location'),
+            features
+        )
+        with self._lock:
+            self._db.executemany(
+                'INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows
+            )
+            self._db.commit()
+
+    def finish(self, analysis_id: str, payload: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None) -> None:
+        """
+        记录分析完成(保存不含逐条结果的汇总信息)或失败,并按上限淘汰旧分析
+
+        Args:
+            payload: analyze_csv_stream 的返回值,失败时为None
+            error: 失败原因
+        """
+        with self._lock:
+            if payload is not None:
+                summary = {key: value for key, value in payload.items() if key != 'results'}
+                self._db.execute(
+                    'UPDATE analyses SET status = ?, total = ?, summary = ? WHERE id = ?',
+                    ('completed', payload['total'], json.dumps(summary, ensure_ascii=False), analysis_id)
+                )
+            else:
+                self._db.execute(
+                    'UPDATE analyses SET status = ?, summary = ? WHERE id = ?',
+                    ('failed', json.dumps({'error': error}, ensure_ascii=False), analysis_id)
+                )
+            self._db.commit()
+        self._evict()
+
+    def record(self, analysis_id: str, filename: Optional[str],
+               events: Iterable[Tuple[str, Any]]) -> Iterator[Tuple[str, Any]]:
+        """
+        在 pipeline.iter_csv_analysis 的事件流经过时写入每块结果和最终汇总
+
+        Yields:
+            原样转发的事件
+        """
+        self.create(analysis_id, filename)
+        offset = 0
+        finished = False
+        try:
+            for kind, value in events:
+                if kind == 'block':
+                    self.append(analysis_id, value, offset)
+                    offset += len(value)
+                else:
+                    self.finish(analysis_id, value)
+                    finished = True
+                yield kind, value
+        except Exception as e:
+            self.finish(analysis_id, error=str(e))
+            finished = True
+            raise
+        finally:
+            # 客户端中途断开流式响应时生成器被关闭(GeneratorExit),同样标记为失败
+            if not finished:
+                self.finish(analysis_id, error='分析未完成: 响应被中断')
+
+    def lookup_rows(self, fingerprints: np.ndarray) -> Dict[int, Tuple[Any, ...]]:
+        """
+        按行指纹批量查询已保存的逐行结果
+
+        Returns:
+            {指纹: (sentiment, positive, neutral, negative, score)}
+        """
+        keys = list(dict.fromkeys(fingerprints.tolist()))
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i+500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._db.execute(
+                    f'SELECT fingerprint, {", ".join(ROW_RESULT_COLUMNS)} FROM row_results '
+                    f'WHERE fingerprint IN ({placeholders})', batch
+                )
+                for row in rows:
+                    found[row[0]] = tuple(row[1:])
+        return found
+
+    def store_rows(self, fingerprints: np.ndarray, frame: pd.DataFrame) -> None:
+        """
+        保存逐行结果
+
+        Args:
+            fingerprints: 每行的指纹(与 frame 的行对应)
+            frame: 列式结果(analyze_columns 的输出)
+        """
+        if len(frame) == 0:
+            return
+        rows = zip(fingerprints.tolist(), *(frame[name].tolist() for name in ROW_RESULT_COLUMNS))
+        with self._lock:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO row_results (fingerprint, sentiment, positive, neutral, negative, score) '
+                'VALUES (?, ?, ?, ?, ?, ?)', rows
+            )
+            self._db.commit()
+
+    def size_bytes(self) -> int:
+        """数据库中已使用页面占用的字节数(删除后释放的页面会被复用,不计入)"""
+        with self._lock:
+            page_size = self._db.execute('PRAGMA page_size').fetchone()[0]
+            page_count = self._db.execute('PRAGMA page_count').fetchone()[0]
+            free_pages = self._db.execute('PRAGMA freelist_count').fetchone()[0]
+        return (page_count - free_pages) * page_size
+
+    def _evict(self) -> None:
+        """超出保留数量或大小上限时删除最早的分析和最早写入的逐行结果"""
+        with self._lock:
+            self._db.execute(
+                'DELETE FROM row_results WHERE id <= '
+                '(SELECT id FROM row_results ORDER BY id DESC LIMIT 1 OFFSET ?)', (self.max_row_results,)
+            )
+            self._db.commit()
+            expired = [row['id'] for row in self._db.execute(
+                'SELECT id FROM analyses ORDER BY created_at DESC LIMIT -1 OFFSET ?', (self.max_analyses,)
+            )]
+        for analysis_id in expired:
+            self.delete(analysis_id)
+
+        if self.max_bytes is None:
+            return
+        while self.size_bytes() > self.max_bytes:
+            # 正在写入的分析不删除
+            with self._lock:
+                oldest = self._db.execute(
+                    "SELECT id FROM analyses WHERE status != 'running' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+            if oldest is None:
+                break
+            self.delete(oldest['id'])
+
+    def delete(self, analysis_id: str) -> bool:
+        """删除一次分析及其结果,返回是否存在"""
+        with self._lock:
+            self._db.execute('DELETE FROM results WHERE analysis_id = ?', (analysis_id,))
+            deleted = self._db.execute('DELETE FROM analyses WHERE id = ?', (analysis_id,)).rowcount
+            self._db.commit()
+        return deleted > 0
+
+    def get(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        """分析的状态和汇总信息,不存在时返回None"""
+        with self._lock:
+            row = self._db.execute('SELECT * FROM analyses WHERE id = ?', (analysis_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': row['id'],
+            'filename': row['filename'],
+            'created_at': row['created_at'],
+            'status': row['status'],
+            'total': row['total'],
+            **(json.loads(row['summary']) if row['summary'] else {})
+        }
+
+    def query(self, analysis_id: str, filters: Optional[ResultFilters] = None, sort: str = 'row',
+              order: str = 'asc', page: int = 1, per_page: int = 100) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        分页查询结果
+
+        Args:
+            filters: 筛选条件
+            sort: 排序字段(见 SORT_COLUMNS),相同值按行号排序
+            order: asc 或 desc
+            page, per_page: 页码(从1开始)和每页条数
+
+        Returns:
+            (本页结果, 符合条件的总条数)
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f'sort 必须是 {", ".join(SORT_COLUMNS)} 之一')
+        if order not in ('asc', 'desc'):
+            raise ValueError('order 必须是 asc 或 desc')
+        where, params = (filters or ResultFilters()).where(analysis_id)
+        column = SORT_COLUMNS[sort]
+        order_by = f'{column} {order.upper()}' + (', row ASC' if column != 'row' else '')
+        with self._reader() as db:
+            total = db.execute(f'SELECT COUNT(*) FROM results WHERE {where}', params).fetchone()[0]
+            rows = db.execute(
+                f'SELECT * FROM results WHERE {where} ORDER BY {order_by} LIMIT ? OFFSET ?',
+                params + [per_page, (page - 1) * per_page]
+            ).fetchall()
+        return [_row_to_result(row) for row in rows], total
+
+    def top_k(self, analysis_id: str, k: int = 10, direction: str = 'positive',
+              filters: Optional[ResultFilters] = None) -> List[Dict[str, Any]]:
+        """
+        最积极(得分最高)或最消极(得分最低)的前K条评论
+
+        逐行读取符合条件的结果,用大小为K的堆选出前K条,内存与K成正比;
+        得分相同时行号靠前的优先
+
+        Args:
+            k: 返回条数
+            direction: positive 或 negative
+            filters: 筛选条件
+        """
+        if direction not in TOP_DIRECTIONS:
+            raise ValueError(f'direction 必须是 {", ".join(TOP_DIRECTIONS)} 之一')
+        where, params = (filters or ResultFilters()).where(analysis_id)
+        select = heapq.nlargest if direction == 'positive' else heapq.nsmallest
+        with self._reader() as db:
+            cursor = db.execute(
+                f'SELECT * FROM results WHERE {where} AND score IS NOT NULL ORDER BY row', params
+            )
+            rows = select(k, cursor, key=lambda row: row['score'])
+        return [_row_to_result(row) for row in rows]
@@ -3,16 +3,83 @@
 支持多分类、多特征工程和模型集成
 """
 import numpy as np
-from typing import List, Dict, Any
-from snownlp import SnowNLP
+from collections import Counter
+from typing import List, Dict, Any, Tuple, Optional
 from feature_engineering import FeatureExtractor
-from models import MultiClassSentiment, EnsembleModel
+from lexicon import Lexicon
+from analysis_context import AnalysisContext
+from models import MultiClassSentiment, EnsembleModel, DEFAULT_ENSEMBLE_MEMBERS
+from linear_model import get_model, model_path
+from result_cache import make_cache_key
+from near_duplicates import MinHasher, cluster_near_duplicates, polarity_key
+import parallel
+import metrics
 import re
 
+# 可选的基础模型: 规则+SnowNLP/TextBlob,或训练得到的线性分类器
+MODEL_TYPES = ('rule', 'linear')
+
+# 支持的语言
+LANGUAGES = ('zh', 'en')
+
+# 空文本的默认概率
+EMPTY_PROBABILITIES = {
+    'positive': 0.33,
+    'neutral': 0.34,
+    'negative': 0.33
+}
+
+
+def results_from_columns(columns) -> List[Dict[str, Any]]:
+    """
+    将列式结果转换为逐条的结果字典(仅在序列化时调用)
+    
+    Args:
+        columns: 包含 text/sentiment/positive/neutral/negative/score 列,
+                 可选 lexicon_version/date/location 列的字典或DataFrame
+    """
+    def as_list(name):
+        values = columns[name]
+        return values.tolist() if hasattr(values, 'tolist') else list(values)
+    
+    rows = zip(as_list('text'), as_list('sentiment'), as_list('positive'),
+               as_list('neutral'), as_list('negative'), as_list('score'))
+    results = [{
+        'text': text,
+        'sentiment': sentiment,
+        'probabilities': {
+            'positive': positive,
+            'neutral': neutral,
+            'negative': negative
+        },
+        'score': score
+    } for text, sentiment, positive, neutral, negative, score in rows]
+    
+    if 'lexicon_version' in columns:
+        for result, version in zip(results, as_list('lexicon_version')):
+            result['lexicon_version'] = version
+    
+    # 请求 return_features 时附带各特征族的取值(空评论为None)
+    if 'features' in columns:
+        for result, features in zip(results, as_list('features')):
+            result['features'] = features
+    
+    # 日期和地域为可选的字符串列,缺失值(None/NaN)统一输出为None
+    for name in ('date', 'location'):
+        if name in columns:
+            for result, value in zip(results, as_list(name)):
+                result[name] = value if isinstance(value, str) else None
+    
+    return results
+
+
 class SentimentAnalyzer:
     """情感分析器主类"""
     
-    def __init__(self, language='zh', features=None, use_ensemble=False):
+    def __init__(self, language='zh', features=None, use_ensemble=False,
+                 workers=0, parallel_min_batch=2000, cache=None, lexicon_dir=None,
+                 model='rule', model_dir=None, ensemble_method='voting', ensemble_members=None,
+                 near_duplicate_threshold=None, near_duplicate_min_length=4):
         """
         初始化情感分析器
         
@@ -20,20 +87,105 @@ class SentimentAnalyzer:
             language: 语言类型 ('zh' 或 'en')
             features: 特征工程方法列表
             use_ensemble: 是否使用模型集成
+            workers: 批量分析的工作进程数(0或1表示串行)
+            parallel_min_batch: 启用多进程的最小批量,小批量时进程间通信开销占主导
+            cache: 结果缓存(ResultCache),为None时不缓存
+            lexicon_dir: 情感词典目录,为None时使用随代码发布的 lexicons/
+            model: 基础模型类型 ('rule' 或 'linear');线性模型不参与 use_ensemble
+            model_dir: 线性模型和堆叠元模型目录,为None时使用 trained_models/
+            ensemble_method: 集成方法 ('voting' 或 'stacking'),仅在 use_ensemble 时生效
+            ensemble_members: 集成成员列表(见 models.ENSEMBLE_MEMBERS),为None时使用默认成员
+            near_duplicate_threshold: 近重复聚类的最小Jaccard相似度(字符2-gram集合),为None时不聚类;
+                                      聚类后每簇只分析代表评论,结果传播给簇内其他评论
+            near_duplicate_min_length: 参与近重复聚类的最短文本长度(预处理后)
+            
+        Raises:
+            ValueError: 模型类型、集成方法或集成成员不支持
+            FileNotFoundError: 选择线性模型但模型文件不存在
         """
+        if model not in MODEL_TYPES:
+            raise ValueError(f'不支持的模型类型: {model}')
         self.language = language
         self.features = features or ['basic']
         self.use_ensemble = use_ensemble
+        self.workers = workers
+        self.parallel_min_batch = parallel_min_batch
+        self.cache = cache
+        self.lexicon_dir = lexicon_dir
+        self.model_type = model
+        self.model_dir = model_dir
+        self.ensemble_method = ensemble_method
+        self.ensemble_members = list(ensemble_members or DEFAULT_ENSEMBLE_MEMBERS)
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.near_duplicate_min_length = near_duplicate_min_length
+        self.minhasher = MinHasher() if near_duplicate_threshold is not None else None
         
         # 初始化特征提取器
-        self.feature_extractor = FeatureExtractor(language=language, features=self.features)
+        self.feature_extractor = FeatureExtractor(
+            language=language, features=self.features, lexicon_dir=lexicon_dir
+        )
         
         # 初始化模型
-        if use_ensemble:
-            self.model = EnsembleModel(language=language)
+        if model == 'linear':
+            self.model_path = model_path(language, model_dir)
+            self.model = get_model(self.model_path)
+        elif use_ensemble:
+            self.model = EnsembleModel(
+                language=language,
+                method=ensemble_method,
+                members=self.ensemble_members,
+                model_dir=model_dir
+            )
         else:
             self.model = MultiClassSentiment(language=language)
     
+    def get_config(self) -> Dict[str, Any]:
+        """返回重建同等分析器所需的参数(用于工作进程)"""
+        return {
+            'language': self.language,
+            'features': list(self.features),
+            'use_ensemble': self.use_ensemble,
+            'lexicon_dir': self.lexicon_dir,
+            'model': self.model_type,
+            'model_dir': self.model_dir,
+            'ensemble_method': self.ensemble_method,
+            'ensemble_members': list(self.ensemble_members),
+            'near_duplicate_threshold': self.near_duplicate_threshold,
+            'near_duplicate_min_length': self.near_duplicate_min_length
+        }
+    
+    def cache_config(self, lexicon_version: Optional[str] = None) -> Dict[str, Any]:
+        """
+        影响分析结果的配置,作为缓存键的一部分
+        
+        Args:
+            lexicon_version: 情感词典版本,仅在使用情感词典特征时计入,词典更新后旧结果不再命中
+        """
+        config = {
+            'language': self.language,
+            'features': sorted(self.features),
+            'use_ensemble': self.use_ensemble,
+            'ensemble_method': self.ensemble_method if self.is_ensemble else None,
+            'ensemble_members': list(self.ensemble_members) if self.is_ensemble else None,
+            'lexicon_version': lexicon_version if 'sentiment_dict' in self.features else None,
+            'model': self.model_type,
+            'model_version': getattr(self.model, 'version', None)
+        }
+        # 近重复聚类时结果为代表评论的结果,与逐条分析的结果分开缓存
+        if self.near_duplicate_threshold is not None:
+            config['near_duplicates'] = [self.near_duplicate_threshold, self.near_duplicate_min_length]
+        return config
+    
+    @property
+    def is_ensemble(self) -> bool:
+        """是否使用集成模型(线性模型不参与 use_ensemble)"""
+        return self.use_ensemble and self.model_type == 'rule'
+    
+    def refresh_model(self) -> None:
+        """线性模型文件被重新训练覆盖后,换用新模型"""
+        if self.model_type == 'linear':
+            self.model = get_model(self.model_path)
+    
     def preprocess_text(self, text: str) -> str:
         """文本预处理"""
         if not text or not isinstance(text, str):
@@ -50,63 +202,200 @@ class SentimentAnalyzer:
         
         return text.strip()
     
-    def analyze_single(self, text: str) -> Dict[str, Any]:
+    def predict_clean_texts(self, clean_texts: List[str], lexicon: Optional[Lexicon] = None,
+                            prepared: Optional[Dict[str, tuple]] = None,
+                            collect_contexts: Optional[Dict[str, AnalysisContext]] = None) -> List[Tuple[str, Dict[str, float]]]:
+        """
+        对预处理后的非空文本进行预测
+        
+        先为所有文本提取模型声明需要的特征族(required_features),再由模型一次性完成批量预测,
+        其余特征族只在被读取时计算;启用多进程且批量足够大时,分片交给进程池并行预测
+        
+        Args:
+            clean_texts: 预处理后的文本列表
+            lexicon: 情感词典快照,默认取当前生效的词典(工作进程各自检查词典文件)
+            prepared: {文本: (分析上下文, 特征视图)},已为部分文本构建时直接复用
+            collect_contexts: 提供时填入本进程内使用的 {文本: 分析上下文},供调用方复用分词结果
+            
+        Returns:
+            (sentiment, probabilities) 列表
+        """
+        if self.workers > 1 and len(clean_texts) >= self.parallel_min_batch:
+            # 工作进程内各阶段的耗时不计入本进程的指标,这里只记录整体耗时
+            with metrics.timed('parallel', len(clean_texts)):
+                return parallel.predict_parallel(self.get_config(), clean_texts, self.workers)
+        
+        lexicon = lexicon or self.feature_extractor.lexicon
+        model = self.model
+        if prepared is not None:
+            contexts = [prepared[clean_text][0] for clean_text in clean_texts]
+            features_list = [prepared[clean_text][1] for clean_text in clean_texts]
+        else:
+            # 构建分析上下文,分词等中间结果在特征提取和模型之间共享
+            contexts = [self.feature_extractor.build_context(clean_text) for clean_text in clean_texts]
+            features_list = self.feature_extractor.extract_batch(
+                clean_texts, contexts, lexicon=lexicon,
+                required=getattr(model, 'required_features', None)
+            )
+        if collect_contexts is not None:
+            collect_contexts.update(zip(clean_texts, contexts))
+        
+        return model.predict_batch(clean_texts, features_list, contexts)
+    
+    def analyze_single(self, text: str, return_features: bool = False) -> Dict[str, Any]:
         """
         分析单条评论
         
         Args:
             text: 评论文本
+            return_features: 是否在结果中附带所有启用的特征族
             
         Returns:
             包含情感分析结果的字典
         """
-        # 预处理
-        clean_text = self.preprocess_text(text)
+        return self.analyze_batch([text], return_features=return_features)[0]
+    
+    def analyze_columns(self, texts: List[str], return_features: bool = False,
+                        near_duplicate_stats=None,
+                        collect_contexts: Optional[Dict[str, AnalysisContext]] = None) -> Dict[str, list]:
+        """
+        批量分析评论,以列的形式返回结果
         
-        if not clean_text:
-            return {
-                'text': text,
-                'sentiment': 'neutral',
-                'probabilities': {
-                    'positive': 0.33,
-                    'neutral': 0.34,
-                    'negative': 0.33
-                },
-                'score': 0.5
-            }
+        批内相同的评论(预处理后)只分析一次,已缓存的评论直接复用结果;
+        启用近重复聚类时,未命中缓存的近重复评论只分析每簇的代表
         
-        # 提取特征
-        features = self.feature_extractor.extract(clean_text)
+        Args:
+            texts: 评论文本列表
+            return_features: 是否计算并返回所有启用的特征族(命中缓存的评论同样计算)
+            near_duplicate_stats: 近重复簇大小的累加器(NearDuplicateStats),为None时不统计
+            collect_contexts: 提供时填入本批构建的 {预处理后文本: 分析上下文}(命中缓存和多进程分析的评论除外),
+                              供调用方(如语料词频统计)复用分词结果
+            
+        Returns:
+            {'text', 'sentiment', 'positive', 'neutral', 'negative', 'score', 'lexicon_version'} 各列,
+            return_features 时另有 features 列
+        """
+        # 整批使用同一版本的情感词典和模型
+        lexicon = self.feature_extractor.lexicon
+        self.refresh_model()
         
-        # 获取预测结果
-        sentiment, probabilities = self.model.predict(clean_text, features)
+        # 预处理并去重
+        with metrics.timed('preprocess', len(texts)):
+            clean_texts = [self.preprocess_text(text) for text in texts]
+            unique_texts = list(dict.fromkeys(t for t in clean_texts if t))
         
-        # 计算综合得分(正面概率)
-        score = probabilities['positive']
+        # 查询缓存
+        outcomes = {}
+        keys = {}
+        if self.cache is not None and unique_texts:
+            with metrics.timed('cache.lookup', len(unique_texts)):
+                config = self.cache_config(lexicon.version)
+                keys = {t: make_cache_key(t, config) for t in unique_texts}
+                cached = self.cache.get_many(keys.values())
+                for t, key in keys.items():
+                    if key in cached:
+                        sentiment, probabilities = cached[key]
+                        outcomes[t] = (sentiment, probabilities)
         
-        return {
-            'text': text,
-            'sentiment': sentiment,
-            'probabilities': probabilities,
-            'score': round(score, 4)
+        # 需要返回特征时为所有评论计算全部启用的特征族,未命中缓存的评论预测时直接复用
+        prepared = None
+        features = {}
+        if return_features and unique_texts:
+            contexts = [self.feature_extractor.build_context(t) for t in unique_texts]
+            views = self.feature_extractor.extract_batch(unique_texts, contexts, lexicon=lexicon)
+            prepared = dict(zip(unique_texts, zip(contexts, views)))
+            features = {t: view.materialize() for t, view in zip(unique_texts, views)}
+            if collect_contexts is not None:
+                collect_contexts.update(zip(unique_texts, contexts))
+        
+        # 分析未命中的评论
+        pending = [t for t in unique_texts if t not in outcomes]
+        if pending:
+            representatives = self._near_duplicate_representatives(
+                pending, clean_texts, lexicon, near_duplicate_stats
+            )
+            scored = [t for t, rep in zip(pending, representatives) if t == rep]
+            predictions = self.predict_clean_texts(
+                scored, lexicon=lexicon, prepared=prepared, collect_contexts=collect_contexts
+            )
+            outcomes.update(zip(scored, predictions))
+            for t, rep in zip(pending, representatives):
+                if t != rep:
+                    outcomes[t] = outcomes[rep]
+            if self.cache is not None:
+                with metrics.timed('cache.store', len(pending)):
+                    self.cache.put_many((keys[t], list(outcomes[t])) for t in pending)
+        
+        # 空文本的默认结果
+        outcomes[''] = ('neutral', EMPTY_PROBABILITIES)
+        rows = [outcomes[t] for t in clean_texts]
+        positive = [p['positive'] for _, p in rows]
+        
+        columns = {
+            'text': list(texts),
+            'sentiment': [sentiment for sentiment, _ in rows],
+            'positive': positive,
+            'neutral': [p['neutral'] for _, p in rows],
+            'negative': [p['negative'] for _, p in rows],
+            # 综合得分(正面概率)
+            'score': [0.5 if not t else round(v, 4) for t, v in zip(clean_texts, positive)],
+            'lexicon_version': [lexicon.version] * len(rows)
         }
+        if return_features:
+            columns['features'] = [features.get(t) for t in clean_texts]
+        return columns
     
-    def analyze_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
+    def _near_duplicate_representatives(self, pending: List[str], clean_texts: List[str],
+                                        lexicon, near_duplicate_stats=None) -> List[str]:
+        """
+        待分析文本的近重复聚类
+        
+        字面相似的评论可能只差一个情感词(如"很好"与"很差"),因此只有各分句命中的情感词及其否定极性
+        相同的评论才会归入同一簇(见 near_duplicates.polarity_key)
+        
+        Args:
+            pending: 待分析的不同文本
+            clean_texts: 整批预处理后的文本(用于按评论条数统计簇大小)
+            lexicon: 本批使用的情感词典
+            near_duplicate_stats: 簇大小的累加器
+            
+        Returns:
+            每条待分析文本所在簇的代表文本,未启用聚类时为文本自身
+        """
+        if self.near_duplicate_threshold is None:
+            return pending
+        
+        with metrics.timed('near_duplicates', len(pending)):
+            indices = cluster_near_duplicates(
+                pending, self.near_duplicate_threshold, self.near_duplicate_min_length,
+                self.minhasher, key=lambda text: polarity_key(text, lexicon.matcher)
+            )
+            representatives = [pending[i] for i in indices]
+            
+            if near_duplicate_stats is not None:
+                # 簇大小按评论条数计,只统计包含多条不同文本的簇
+                cluster_texts = Counter(representatives)
+                rep_of = {t: rep for t, rep in zip(pending, representatives) if cluster_texts[rep] > 1}
+                sizes = Counter(rep_of[t] for t in clean_texts if t in rep_of)
+                near_duplicate_stats.update(list(sizes.values()), len(rep_of) - len(sizes))
+        return representatives
+    
+    def analyze_batch(self, texts: List[str], return_features: bool = False,
+                      near_duplicate_stats=None) -> List[Dict[str, Any]]:
         """
         批量分析评论
         
         Args:
             texts: 评论文本列表
+            return_features: 是否在结果中附带所有启用的特征族
+            near_duplicate_stats: 近重复簇大小的累加器(NearDuplicateStats),为None时不统计
             
         Returns:
             分析结果列表
         """
-        results = []
-        for text in texts:
-            result = self.analyze_single(text)
-            results.append(result)
-        
-        return results
+        return results_from_columns(self.analyze_columns(
+            texts, return_features=return_features, near_duplicate_stats=near_duplicate_stats
+        ))
     
     def get_statistics(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
@@ -118,39 +407,60 @@ class SentimentAnalyzer:
         Returns:
             统计信息字典
         """
-        total = len(results)
-        if total == 0:
-            return {}
+        return self.get_column_statistics({
+            'sentiment': [r['sentiment'] for r in results],
+            'positive': [r['probabilities']['positive'] for r in results],
+            'neutral': [r['probabilities']['neutral'] for r in results],
+            'negative': [r['probabilities']['negative'] for r in results],
+            'score': [r['score'] for r in results]
+        })
+    
+    def get_column_statistics(self, columns) -> Dict[str, Any]:
+        """
+        根据列式结果计算统计信息
         
-        # 统计各类别数量
-        positive_count = sum(1 for r in results if r['sentiment'] == 'positive')
-        neutral_count = sum(1 for r in results if r['sentiment'] == 'neutral')
-        negative_count = sum(1 for r in results if r['sentiment'] == 'negative')
+        Args:
+            columns: 包含 sentiment/positive/neutral/negative/score 列的字典或DataFrame
+            
+        Returns:
+            统计信息字典
+        """
+        sentiments = np.asarray(columns['sentiment'], dtype=object)
+        if len(sentiments) == 0:
+            return {}
         
-        # 计算平均概率
-        avg_positive = np.mean([r['probabilities']['positive'] for r in results])
-        avg_neutral = np.mean([r['probabilities']['neutral'] for r in results])
-        avg_negative = np.mean([r['probabilities']['negative'] for r in results])
+        # 统计各类别数量和概率、得分之和
+        counts = {label: int((sentiments == label).sum()) for label in ('positive', 'neutral', 'negative')}
+        sums = {
+            name: float(np.sum(np.asarray(columns[name], dtype=float)))
+            for name in ('positive', 'neutral', 'negative', 'score')
+        }
+        return self.statistics_from_totals(counts, sums)
+    
+    @staticmethod
+    def statistics_from_totals(counts: Dict[str, int], sums: Dict[str, float]) -> Dict[str, Any]:
+        """
+        根据类别数量和概率、得分之和计算统计信息(可逐块累加后调用)
         
-        # 计算平均得分
-        avg_score = np.mean([r['score'] for r in results])
+        Args:
+            counts: {positive/neutral/negative: 条数}
+            sums: {positive/neutral/negative/score: 总和}
+            
+        Returns:
+            统计信息字典,没有结果时为空字典
+        """
+        total = sum(counts.values())
+        if total == 0:
+            return {}
         
         return {
             'total': total,
-            'counts': {
-                'positive': positive_count,
-                'neutral': neutral_count,
-                'negative': negative_count
-            },
+            'counts': dict(counts),
             'percentages': {
-                'positive': round(positive_count / total * 100, 2),
-                'neutral': round(neutral_count / total * 100, 2),
-                'negative': round(negative_count / total * 100, 2)
+                label: round(count / total * 100, 2) for label, count in counts.items()
             },
             'average_probabilities': {
-                'positive': round(avg_positive, 4),
-                'neutral': round(avg_neutral, 4),
-                'negative': round(avg_negative, 4)
+                label: round(sums[label] / total, 4) for label in counts
             },
-            'average_score': round(avg_score, 4)
+            'average_score': round(sums['score'] / total, 4)
         }
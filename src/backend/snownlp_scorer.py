@@ -0,0 +1,130 @@
+"""
+SnowNLP情感得分的批量计算模块
+将SnowNLP训练好的朴素贝叶斯模型一次性转换为词表索引和对数概率数组,
+一批评论的词频构成稀疏矩阵,与对数概率矩阵相乘即得到每条评论的类别得分
+"""
+import threading
+import numpy as np
+from scipy import sparse
+from typing import List, Optional, Sequence
+from snownlp import sentiment as snownlp_sentiment
+
+
+class SnowNLPScorer:
+    """
+    向量化的SnowNLP情感打分器
+
+    与 snownlp.classification.bayes.Bayes.classify 使用相同的模型参数:
+    类别k的得分为 log(P(k)) + Σ log(freq_k(w)),未登录词按加一平滑计 1/total_k;
+    两类时正面概率为 1 / (1 + exp(s_neg - s_pos))
+    """
+
+    def __init__(self, bayes=None):
+        """
+        从SnowNLP的贝叶斯模型构建打分器
+
+        Args:
+            bayes: snownlp.classification.bayes.Bayes 实例,默认使用SnowNLP自带的情感模型
+        """
+        if bayes is None:
+            bayes = snownlp_sentiment.classifier.classifier
+        self.source = bayes
+        self.source_model = bayes.d
+
+        self.classes = list(bayes.d.keys())
+        vocabulary = {}
+        for prob in bayes.d.values():
+            for word in prob.d:
+                vocabulary.setdefault(word, len(vocabulary))
+        self.vocabulary = vocabulary
+
+        # 词表 × 类别 的对数概率矩阵,以及每个类别的先验和未登录词对数概率
+        n_classes = len(self.classes)
+        self.log_probs = np.empty((len(vocabulary), n_classes))
+        self.log_priors = np.empty(n_classes)
+        self.log_unknown = np.empty(n_classes)
+        for k, name in enumerate(self.classes):
+            prob = bayes.d[name]
+            total = prob.getsum()
+            self.log_priors[k] = np.log(total) - np.log(bayes.total)
+            self.log_unknown[k] = np.log(prob.none / total)
+            counts = np.full(len(vocabulary), float(prob.none))
+            for word, count in prob.d.items():
+                counts[vocabulary[word]] = count
+            self.log_probs[:, k] = np.log(counts / total)
+
+        self.positive_index = self.classes.index('pos') if 'pos' in self.classes else 0
+
+    def is_current(self, bayes) -> bool:
+        """打分器是否仍对应该贝叶斯模型(Bayes.load 会整体替换模型参数)"""
+        return self.source is bayes and self.source_model is bayes.d
+
+    def _count_matrix(self, docs: Sequence[Optional[List[str]]]):
+        """
+        构建 文档 × 词表 的稀疏词频矩阵和每条文档的未登录词数
+        """
+        vocabulary = self.vocabulary
+        indptr = [0]
+        indices = []
+        unknown = np.zeros(len(docs))
+        for i, words in enumerate(docs):
+            for word in words or ():
+                index = vocabulary.get(word)
+                if index is None:
+                    unknown[i] += 1
+                else:
+                    indices.append(index)
+            indptr.append(len(indices))
+        data = np.ones(len(indices))
+        matrix = sparse.csr_matrix(
+            (data, np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(docs), len(vocabulary))
+        )
+        return matrix, unknown
+
+    def log_scores(self, docs: Sequence[Optional[List[str]]]) -> np.ndarray:
+        """
+        计算每条文档在各类别下的对数得分
+
+        Returns:
+            形状为 (N, 类别数) 的数组
+        """
+        counts, unknown = self._count_matrix(docs)
+        return self.log_priors + counts @ self.log_probs + unknown[:, None] * self.log_unknown
+
+    def score_batch(self, docs: Sequence[Optional[List[str]]]) -> np.ndarray:
+        """
+        批量计算情感得分,等价于逐条调用 SnowNLP(text).sentiments
+
+        Args:
+            docs: 每条评论经SnowNLP分词和停用词过滤后的词列表(None表示分词失败)
+
+        Returns:
+            形状为 (N,) 的正面概率,分词失败的评论为0.5
+        """
+        if len(docs) == 0:
+            return np.empty(0)
+        scores = self.log_scores(docs)
+        # P(k) = 1 / Σ_j exp(s_j - s_k),指数溢出时概率为0(与SnowNLP一致)
+        with np.errstate(over='ignore'):
+            positive = 1 / np.exp(scores - scores[:, [self.positive_index]]).sum(axis=1)
+        positive[np.array([words is None for words in docs], dtype=bool)] = 0.5
+        return positive
+
+
+# 进程内共享的打分器,SnowNLP模型被重新训练或加载后自动重建
+_scorer = None
+_scorer_lock = threading.Lock()
+
+
+def get_scorer() -> SnowNLPScorer:
+    """获取当前SnowNLP情感模型对应的打分器"""
+    global _scorer
+    bayes = snownlp_sentiment.classifier.classifier
+    scorer = _scorer
+    if scorer is None or not scorer.is_current(bayes):
+        with _scorer_lock:
+            if _scorer is None or not _scorer.is_current(bayes):
+                _scorer = SnowNLPScorer(bayes)
+            scorer = _scorer
+    return scorer
@@ -0,0 +1,84 @@
+"""
+测试脚本 - 验证情感词典自动机匹配(与按jieba分词逐词查词典的计数对照)
+"""
+import sys
+import os
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lexicon import get_store, SENTIMENT
+from analysis_context import tokenize
+from benchmark_suite import generate_corpus, COLUMNS
+
+
+def _legacy_counts(tokens, matcher):
+    """原有实现: 逐个分词结果整词查词典,按权重正负计数(不处理否定词和程度副词)"""
+    positive = negative = 0
+    for token in tokens:
+        found = matcher.find(token)
+        if len(found) == 1 and found[0][:3] == (0, len(token), SENTIMENT):
+            if found[0][3] > 0:
+                positive += 1
+            else:
+                negative += 1
+    return positive, negative
+
+
+def test_matches_legacy_token_counts():
+    """测试情感词都是完整分词结果且没有否定时,自动机的计数与逐词查词典相同"""
+    matcher = get_store().get('zh').matcher
+    texts = generate_corpus('zh', 1000, duplicate_ratio=0.0, seed=5)[COLUMNS['zh'][0]].tolist()
+    compared = 0
+    for text in texts:
+        tokens = tokenize(text, 'zh')
+        spans = set()
+        position = 0
+        for token in tokens:
+            spans.add((position, position + len(token)))
+            position += len(token)
+
+        features = matcher.analyze(text)
+        if any(match['negated'] or (match['start'], match['end']) not in spans
+               for match in features['matches']):
+            continue
+        compared += 1
+        assert (features['positive_words'], features['negative_words']) == _legacy_counts(tokens, matcher), text
+    # 大部分评论可以对照
+    assert compared > len(texts) // 3
+
+
+def test_segmentation_independent():
+    """测试多字词条不受分词结果影响"""
+    matcher = get_store().get('zh').matcher
+    assert tokenize('这个质量差', 'zh') != ['这个', '质量差']
+    features = matcher.analyze('这个质量差')
+    assert [match['term'] for match in features['matches']] == ['质量差']
+    assert features['negative_words'] == 1
+
+
+def test_negation_and_degree():
+    """测试否定词翻转、程度副词放大,作用范围不跨分句"""
+    matcher = get_store().get('zh').matcher
+    assert matcher.analyze('推荐')['sentiment_score'] > 0
+    negated = matcher.analyze('不推荐')
+    assert negated['negative_words'] == 1 and negated['matches'][0]['negated']
+    assert matcher.analyze('非常好')['sentiment_score'] > matcher.analyze('好')['sentiment_score']
+    features = matcher.analyze('质量很好,不推荐')
+    assert (features['positive_words'], features['negative_words']) == (1, 1)
+
+
+def test_english_case_and_word_boundary():
+    """测试英文忽略大小写、只匹配完整单词"""
+    matcher = get_store().get('en').matcher
+    assert matcher.analyze('GOOD product')['positive_words'] == 1
+    assert matcher.analyze('goodness gracious')['matches'] == []
+    assert matcher.analyze('not good')['negative_words'] == 1
+
+
+if __name__ == '__main__':
+    test_matches_legacy_token_counts()
+    test_segmentation_independent()
+    test_negation_and_degree()
+    test_english_case_and_word_boundary()
+    print("所有情感词典测试通过!")
@@ -0,0 +1,129 @@
+"""
+测试脚本 - 验证向量化的概率映射和集成与逐条计算逐位一致
+"""
+import sys
+import os
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from models import MultiClassSentiment, EnsembleModel, RULE_MEMBER_THRESHOLDS, lexicon_counts, _round_like_python
+from lexicon import get_store
+from benchmark_suite import generate_corpus, COLUMNS
+
+LABELS = ('positive', 'neutral', 'negative')
+
+
+def _cases(rows: int = 20000, seed: int = 42):
+    """随机得分和情感词典特征,包含恰好落在阈值和0、0.5、1上的得分及没有词典特征的评论"""
+    rng = np.random.default_rng(seed)
+    scores = rng.random(rows)
+    edges = np.array([0.0, 0.3, 0.4, 0.45, 0.5, 0.55, 0.6, 0.7, 1.0])
+    scores[:len(edges) * 20] = np.repeat(edges, 20)
+    features_list = []
+    for p, n, score, has_dict in zip(rng.integers(0, 3, rows), rng.integers(0, 3, rows),
+                                     rng.integers(-5, 6, rows), rng.random(rows) > 0.2):
+        features_list.append({
+            'sentiment_dict': {'positive_words': int(p), 'negative_words': int(n), 'sentiment_score': int(score)}
+        } if has_dict else {})
+    return scores.tolist(), features_list
+
+
+def test_batch_calibration_matches_scalar():
+    """测试各组阈值下批量概率映射和类别与逐条计算完全相同"""
+    scores, features_list = _cases()
+    for positive_threshold, negative_threshold in RULE_MEMBER_THRESHOLDS.values():
+        model = MultiClassSentiment()
+        model.positive_threshold, model.negative_threshold = positive_threshold, negative_threshold
+        labels, probs = model.predict_arrays(scores, lexicon_counts(features_list))
+        for i, (score, features) in enumerate(zip(scores, features_list)):
+            label, expected = model.predict_from_score(score, features)
+            assert labels[i] == label
+            assert probs[i].tolist() == [expected['positive'], expected['neutral'], expected['negative']]
+            # 与原有的逐条实现一致
+            assert expected == model._calculate_probabilities(score, features)
+
+
+def test_round_like_python():
+    """测试向量化四舍五入与内置round逐元素一致(包括.5附近的值)"""
+    rng = np.random.default_rng(0)
+    values = np.concatenate([
+        rng.random(100000),
+        np.round(rng.random(10000), 5),
+        np.array([0.00005, 0.00015, 0.12345, 0.5, 2.675, 1.00005, 0.99995])
+    ])
+    rounded = _round_like_python(values, 4)
+    assert rounded.tolist() == [round(float(v), 4) for v in values]
+
+
+def _label(probabilities):
+    """逐条实现的类别判定: 最大概率,相同时依次取 positive、negative、neutral"""
+    max_prob = max(probabilities.values())
+    if probabilities['positive'] == max_prob:
+        return 'positive'
+    if probabilities['negative'] == max_prob:
+        return 'negative'
+    return 'neutral'
+
+
+def _scalar_ensemble(ensemble, score, features):
+    """逐条计算的集成结果(各成员分别映射概率,再逐类别投票或加权)"""
+    predictions = [model._calculate_probabilities(score, features) for model in ensemble.models]
+    if ensemble.method == 'voting':
+        probs = {key: round(np.mean([p[key] for p in predictions]), 4) for key in LABELS}
+        return _label(probs), probs
+
+    weights = [0.4, 0.3, 0.3]
+    probs = {key: 0 for key in LABELS}
+    for weight, prediction in zip(weights, predictions):
+        for key in probs:
+            probs[key] += prediction[key] * weight
+    if 'sentiment_dict' in features:
+        sent_score = features['sentiment_dict'].get('sentiment_score', 0)
+        if sent_score > 2:
+            probs['positive'] *= 1.15
+        elif sent_score < -2:
+            probs['negative'] *= 1.15
+        else:
+            probs['neutral'] *= 1.1
+    total = sum(probs.values())
+    if total > 0:
+        probs = {key: round(value / total, 4) for key, value in probs.items()}
+    return _label(probs), probs
+
+
+def test_ensemble_matches_scalar():
+    """测试基础得分只算一次、成员批量组合的集成与逐条计算完全相同"""
+    scores, features_list = _cases()
+    for method in ('voting', 'stacking'):
+        ensemble = EnsembleModel(method=method)
+        member_probs = ensemble.member_probabilities([''] * len(scores), features_list, scores=np.array(scores))
+        results = ensemble._combine(member_probs, features_list)
+        for (label, probs), score, features in zip(results, scores, features_list):
+            expected_label, expected = _scalar_ensemble(ensemble, score, features)
+            assert label == expected_label
+            assert probs == {key: float(value) for key, value in expected.items()}
+
+
+def test_ensemble_predict_batch():
+    """测试集成对真实评论的批量预测与逐条得分、逐条集成一致"""
+    texts = generate_corpus('zh', 200, duplicate_ratio=0.0, seed=3)[COLUMNS['zh'][0]].tolist()
+    lexicon = get_store().get('zh')
+    features_list = [{'sentiment_dict': lexicon.analyze(text)} for text in texts]
+    for method in ('voting', 'stacking'):
+        ensemble = EnsembleModel(method=method)
+        results = ensemble.predict_batch(texts, features_list)
+        for (label, probs), text, features in zip(results, texts, features_list):
+            expected_label, expected = _scalar_ensemble(ensemble, ensemble.base_model.get_score(text), features)
+            assert label == expected_label
+            # 批量得分与逐条得分的差异在1e-12以内,四舍五入后相同
+            assert probs == {key: float(value) for key, value in expected.items()}
+
+
+if __name__ == '__main__':
+    test_batch_calibration_matches_scalar()
+    test_round_like_python()
+    test_ensemble_matches_scalar()
+    test_ensemble_predict_batch()
+    print("所有模型测试通过!")
@@ -0,0 +1,86 @@
+"""
+测试脚本 - 验证近重复评论聚类
+"""
+import sys
+import os
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lexicon import get_store
+from near_duplicates import cluster_near_duplicates, polarity_key, NearDuplicateStats
+from sentiment_analyzer import SentimentAnalyzer
+
+TEMPLATE = '这款华为手机质量很好,物流也很快,推荐购买'
+TEMPLATE_VARIANT = '这款小米手机质量很好,物流也很快,推荐购买'
+
+
+def _cluster(texts):
+    """按默认参数聚类,附加键为中文词典的情感极性"""
+    matcher = get_store().get('zh').matcher
+    return cluster_near_duplicates(texts, key=lambda text: polarity_key(text, matcher))
+
+
+def test_spam_repeats_cluster():
+    """测试重复次数不同的刷屏评论归入同一簇"""
+    texts = ['好评好评好评好评好评', '好评好评好评好评好评好评', '好评好评好评']
+    assert _cluster(texts) == [0, 0, 0]
+
+
+def test_template_cluster():
+    """测试只改了商品名的模板评论归入同一簇"""
+    texts = [TEMPLATE, TEMPLATE_VARIANT, '这款华为耳机质量很好,物流也很快,推荐购买']
+    assert _cluster(texts) == [0, 0, 0]
+
+
+def test_polarity_flip_not_clustered():
+    """测试只差一个情感词、否定词或分句的评论不归入同一簇"""
+    texts = [
+        TEMPLATE,
+        '这款华为手机质量很差,物流也很快,推荐购买',
+        '这款华为手机质量很好,物流也很快,不推荐购买',
+        '这款华为手机质量很好,物流也很快'
+    ]
+    assert _cluster(texts) == [0, 1, 2, 3]
+
+
+def test_polarity_key():
+    """测试附加键忽略重复的情感词和程度副词,区分否定"""
+    matcher = get_store().get('zh').matcher
+    assert polarity_key('好评好评好评', matcher) == polarity_key('好评好评', matcher)
+    assert polarity_key('质量很好', matcher) == polarity_key('质量非常好', matcher)
+    assert polarity_key('推荐购买', matcher) != polarity_key('不推荐购买', matcher)
+    assert polarity_key('质量很好,包装一般', matcher) != polarity_key('包装一般,质量很好', matcher)
+
+
+def test_short_texts_not_clustered():
+    """测试过短的文本始终单独分析"""
+    assert cluster_near_duplicates(['好评', '好评好'], min_length=4) == [0, 1]
+
+
+def test_analyzer_propagation():
+    """测试分析器只分析每簇的代表,结果传播给簇内评论并统计簇大小"""
+    analyzer = SentimentAnalyzer(language='zh', near_duplicate_threshold=0.7)
+    stats = NearDuplicateStats()
+    texts = [TEMPLATE, TEMPLATE_VARIANT, TEMPLATE_VARIANT, '好评好评好评', '好评好评好评好评', '物流太慢了,包装也不好']
+    columns = analyzer.analyze_columns(texts, near_duplicate_stats=stats)
+    assert columns['sentiment'][0] == columns['sentiment'][1] == columns['sentiment'][2]
+    assert columns['score'][3] == columns['score'][4]
+
+    result = stats.result()
+    assert result['clusters'] == 2
+    assert result['clustered_comments'] == 5
+    assert result['collapsed_texts'] == 2
+    assert result['largest_clusters'] == [3, 2]
+    assert result['size_distribution']['2'] == 1
+    assert result['size_distribution']['3-5'] == 1
+
+
+if __name__ == '__main__':
+    test_spam_repeats_cluster()
+    test_template_cluster()
+    test_polarity_flip_not_clustered()
+    test_polarity_key()
+    test_short_texts_not_clustered()
+    test_analyzer_propagation()
+    print("所有近重复聚类测试通过!")
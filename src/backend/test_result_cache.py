@@ -0,0 +1,51 @@
+"""
+测试脚本 - 验证结果缓存的内存LRU和SQLite持久化的条数上限
+"""
+import sys
+import os
+import shutil
+import tempfile
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from result_cache import ResultCache
+
+
+def test_memory_lru():
+    """测试内存缓存超出上限时淘汰最久未使用的条目"""
+    cache = ResultCache(max_size=2)
+    cache.put_many([('a', 1), ('b', 2)])
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get_many(['a', 'c']) == {'a': 1, 'c': 3}
+    assert cache.get_stats()['evictions'] == 1
+
+
+def test_disk_eviction():
+    """测试SQLite中超出条数上限时删除最早写入的结果,重新写入的结果视为最新"""
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'cache.db')
+        cache = ResultCache(max_size=1, db_path=path, max_disk_rows=3)
+        cache.put_many([('a', 1), ('b', 2), ('c', 3)])
+        cache.put('a', 10)
+        cache.put('d', 4)
+        cache._db.close()
+
+        # 新实例只能从磁盘读取
+        reopened = ResultCache(max_size=10, db_path=path, max_disk_rows=3)
+        assert reopened.get_many(['a', 'b', 'c', 'd']) == {'a': 10, 'c': 3, 'd': 4}
+        assert reopened.get_stats()['disk_hits'] == 3
+        count = reopened._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        assert count == 3
+        reopened._db.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    test_memory_lru()
+    test_disk_eviction()
+    print("所有结果缓存测试通过!")
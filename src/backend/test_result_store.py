@@ -0,0 +1,185 @@
+"""
+测试脚本 - 验证分析结果存储的查询、筛选、排序和前K条评论
+"""
+import sys
+import os
+import shutil
+import tempfile
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+from result_store import ResultStore, ResultFilters
+
+ROWS = [
+    # text, sentiment, score, date, location
+    ('质量很好,非常满意', 'positive', 0.92, '2024-01-01', '北京'),
+    ('物流太慢了', 'negative', 0.12, '2024-01-02', '上海'),
+    ('还可以吧', 'neutral', 0.50, '2024-01-02', '北京'),
+    ('100%好评', 'positive', 0.92, '2024-01-03', '广州'),
+    ('包装破损,很失望', 'negative', 0.05, '2024-01-05', '上海'),
+    ('颜色和图片一样', 'neutral', 0.55, None, None),
+]
+
+
+def _frame(rows):
+    """构造 analyze_columns 形式的列式结果"""
+    return pd.DataFrame({
+        'text': [row[0] for row in rows],
+        'sentiment': [row[1] for row in rows],
+        'positive': [row[2] for row in rows],
+        'neutral': [0.1] * len(rows),
+        'negative': [round(1 - row[2], 4) for row in rows],
+        'score': [row[2] for row in rows],
+        'lexicon_version': ['v1'] * len(rows),
+        'date': [row[3] for row in rows],
+        'location': [row[4] for row in rows]
+    })
+
+
+def _create_store(directory, **options):
+    """写入两块结果并完成一次分析"""
+    store = ResultStore(os.path.join(directory, 'analyses.db'), **options)
+
+    def events():
+        yield 'block', _frame(ROWS[:3])
+        yield 'block', _frame(ROWS[3:])
+        yield 'summary', {'success': True, 'total': len(ROWS)}
+
+    for _ in store.record('a1', 'comments.csv', events()):
+        pass
+    return store
+
+
+def test_query_filters():
+    """测试分页查询和各筛选条件"""
+    directory = tempfile.mkdtemp()
+    try:
+        store = _create_store(directory)
+        assert store.get('a1')['status'] == 'completed'
+
+        results, total = store.query('a1')
+        assert total == len(ROWS)
+        assert [r['row'] for r in results] == list(range(len(ROWS)))
+        assert results[0]['probabilities']['positive'] == 0.92
+
+        _, total = store.query('a1', ResultFilters(sentiment='negative'))
+        assert total == 2
+        results, _ = store.query('a1', ResultFilters(min_score=0.5, max_score=0.6))
+        assert [r['row'] for r in results] == [2, 5]
+        results, _ = store.query('a1', ResultFilters(start_date='2024/01/02', end_date='2024-01-03'))
+        assert [r['row'] for r in results] == [1, 2, 3]
+        results, _ = store.query('a1', ResultFilters(location='上海'))
+        assert [r['row'] for r in results] == [1, 4]
+        # 关键词中的 % 按字面匹配
+        results, _ = store.query('a1', ResultFilters(keyword='100%'))
+        assert [r['row'] for r in results] == [3]
+        results, _ = store.query('a1', ResultFilters(keyword='%'))
+        assert [r['row'] for r in results] == [3]
+
+        # 分页
+        results, total = store.query('a1', page=2, per_page=4)
+        assert total == len(ROWS)
+        assert [r['row'] for r in results] == [4, 5]
+
+        for params in ({'sentiment': 'happy'}, {'start_date': 'not a date'}):
+            try:
+                ResultFilters(**params)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f'{params} 应当被拒绝')
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_query_sort():
+    """测试排序(相同值按行号排序)"""
+    directory = tempfile.mkdtemp()
+    try:
+        store = _create_store(directory)
+        results, _ = store.query('a1', sort='score', order='desc')
+        assert [r['row'] for r in results] == [0, 3, 5, 2, 1, 4]
+        results, _ = store.query('a1', sort='score', order='asc')
+        assert [r['row'] for r in results] == [4, 1, 2, 5, 0, 3]
+        results, _ = store.query('a1', ResultFilters(location='北京'), sort='date', order='desc')
+        assert [r['row'] for r in results] == [2, 0]
+
+        for params in ({'sort': 'text'}, {'order': 'up'}):
+            try:
+                store.query('a1', **params)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f'{params} 应当被拒绝')
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_top_k():
+    """测试最积极/最消极的前K条评论"""
+    directory = tempfile.mkdtemp()
+    try:
+        store = _create_store(directory)
+        assert [r['row'] for r in store.top_k('a1', 2, 'positive')] == [0, 3]
+        assert [r['row'] for r in store.top_k('a1', 3, 'negative')] == [4, 1, 2]
+        neutral = store.top_k('a1', 5, 'positive', ResultFilters(sentiment='neutral'))
+        assert [r['row'] for r in neutral] == [5, 2]
+        assert store.top_k('missing', 3) == []
+        try:
+            store.top_k('a1', 3, 'sideways')
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('无效的 direction 应当被拒绝')
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_interrupted_stream():
+    """测试流式响应中途断开时分析标记为失败"""
+    directory = tempfile.mkdtemp()
+    try:
+        store = ResultStore(os.path.join(directory, 'analyses.db'))
+
+        def events():
+            yield 'block', _frame(ROWS[:3])
+            yield 'block', _frame(ROWS[3:])
+            yield 'summary', {'success': True, 'total': len(ROWS)}
+
+        recorded = store.record('a2', None, events())
+        next(recorded)
+        recorded.close()
+        assert store.get('a2')['status'] == 'failed'
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_eviction():
+    """测试按分析数量和占用空间淘汰旧分析"""
+    directory = tempfile.mkdtemp()
+    try:
+        store = _create_store(directory, max_analyses=2)
+        for analysis_id in ('a2', 'a3'):
+            store.create(analysis_id)
+            store.append(analysis_id, _frame(ROWS), 0)
+            store.finish(analysis_id, {'success': True, 'total': len(ROWS)})
+        assert store.get('a1') is None
+        assert store.get('a3')['status'] == 'completed'
+
+        store.max_bytes = 0
+        store.create('a4')
+        store.finish('a4', {'success': True, 'total': 0})
+        assert all(store.get(analysis_id) is None for analysis_id in ('a2', 'a3', 'a4'))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    test_query_filters()
+    test_query_sort()
+    test_top_k()
+    test_interrupted_stream()
+    test_eviction()
+    print("所有结果存储测试通过!")
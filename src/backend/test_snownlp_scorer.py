@@ -0,0 +1,54 @@
+"""
+测试脚本 - 验证批量SnowNLP打分器与 SnowNLP(text).sentiments 一致
+"""
+import sys
+import os
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from snownlp import SnowNLP, sentiment
+from snownlp_scorer import get_scorer
+from models import MultiClassSentiment
+from benchmark_suite import generate_corpus, COLUMNS
+
+# 浮点求和顺序不同带来的误差上限
+TOLERANCE = 1e-12
+
+
+def _texts():
+    """合成评论,外加未登录词、纯标点和很长的评论"""
+    texts = generate_corpus('zh', 300, duplicate_ratio=0.0, seed=7)[COLUMNS['zh'][0]].tolist()
+    return texts + ['犇犇犇猋猋', '!!!', '质量很好,' * 40 + '就是物流太慢了']
+
+
+def test_score_batch_matches_snownlp():
+    """测试批量打分与逐条 SnowNLP(text).sentiments 的最大误差"""
+    texts = _texts()
+    reference = np.array([SnowNLP(text).sentiments for text in texts])
+    scores = get_scorer().score_batch([sentiment.classifier.handle(text) for text in texts])
+    assert np.abs(reference - scores).max() < TOLERANCE
+
+
+def test_failed_segmentation_is_neutral():
+    """测试分词失败(None)的评论得分为0.5,空批次返回空数组"""
+    scorer = get_scorer()
+    scores = scorer.score_batch([None, sentiment.classifier.handle('质量很好')])
+    assert scores[0] == 0.5
+    assert len(scorer.score_batch([])) == 0
+
+
+def test_model_get_scores_matches_single():
+    """测试模型的批量得分与逐条得分一致"""
+    model = MultiClassSentiment(language='zh')
+    texts = _texts()[:100]
+    single = np.array([model.get_score(text) for text in texts])
+    assert np.abs(model.get_scores(texts) - single).max() < TOLERANCE
+
+
+if __name__ == '__main__':
+    test_score_batch_matches_snownlp()
+    test_failed_segmentation_is_neutral()
+    test_model_get_scores_matches_single()
+    print("所有SnowNLP打分器测试通过!")
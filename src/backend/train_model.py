@@ -0,0 +1,169 @@
+"""
+线性情感模型训练脚本
+
+用法:
+    python train_model.py labeled.csv                          # 训练中文模型,保存到 trained_models/linear_zh.npz
+    python train_model.py labeled.csv --language en            # 训练英文模型
+    python train_model.py labeled.csv --hash-features 262144   # 使用哈希特征限制模型大小
+    python train_model.py labeled.csv -o my_model.npz --balanced
+    python train_model.py heldout.csv --stacking                # 训练堆叠集成元模型,保存到 trained_models/stacking_zh.npz
+    python train_model.py heldout.csv --stacking --members rule rule_strict linear
+
+CSV需包含评论列(评论内容/comment/text/review/评论)和标签列(label/sentiment/情感/标签),
+标签取值为 positive/neutral/negative、正面/中性/负面 或 1/0/-1
+
+--stacking 模式在留出的带标签数据上训练元模型,学习如何组合各集成成员的输出;
+成员包含 linear 时应使用未参与线性模型训练的数据
+"""
+import sys
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+# 添加backend目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sentiment_analyzer import SentimentAnalyzer
+from pipeline import COMMENT_COLUMNS, find_column
+from vectorizer import TfidfVectorizer
+from linear_model import LinearSentimentModel, StackingMetaLearner, model_path, stacking_path, CLASSES
+from models import ENSEMBLE_MEMBERS, DEFAULT_ENSEMBLE_MEMBERS
+
+LABEL_COLUMNS = ['label', 'sentiment', '情感', '标签']
+
+LABEL_ALIASES = {
+    'positive': 'positive', 'pos': 'positive', '正面': 'positive', '1': 'positive',
+    'neutral': 'neutral', '中性': 'neutral', '0': 'neutral',
+    'negative': 'negative', 'neg': 'negative', '负面': 'negative', '-1': 'negative'
+}
+
+
+def load_labeled(path: str, language: str):
+    """读取带标签的评论,返回预处理后的文本和标签"""
+    df = pd.read_csv(path, encoding='utf-8')
+    text_col = find_column(df.columns, COMMENT_COLUMNS)
+    label_col = find_column(df.columns, LABEL_COLUMNS)
+    if text_col is None or label_col is None:
+        raise ValueError('CSV文件必须包含评论列(comment/text/review)和标签列(label/sentiment)')
+
+    preprocess = SentimentAnalyzer(language=language).preprocess_text
+    texts, labels = [], []
+    for text, label in zip(df[text_col].fillna('').astype(str), df[label_col].astype(str)):
+        label = LABEL_ALIASES.get(label.strip().lower())
+        text = preprocess(text)
+        if label is None or not text:
+            continue
+        texts.append(text)
+        labels.append(label)
+    return texts, labels
+
+
+def member_probabilities(texts, language: str, members, model_dir=None) -> np.ndarray:
+    """用与线上相同的特征和成员批量计算 (N, 成员数, 3) 的成员概率"""
+    analyzer = SentimentAnalyzer(
+        language=language, features=['basic', 'sentiment_dict'], use_ensemble=True,
+        ensemble_members=members, model_dir=model_dir
+    )
+    extractor = analyzer.feature_extractor
+    contexts = [extractor.build_context(text) for text in texts]
+    features_list = extractor.extract_batch(
+        texts, contexts, lexicon=extractor.lexicon, required=analyzer.model.required_features
+    )
+    return analyzer.model.member_probabilities(texts, features_list, contexts)
+
+
+def report_accuracy(name: str, probs: np.ndarray, truth: np.ndarray) -> None:
+    """打印留出集准确率和各类别召回率"""
+    predicted = np.array(CLASSES)[probs.argmax(axis=1)]
+    print(f"{name}准确率: {(predicted == truth).mean():.4f}  ({len(truth)} 条)")
+    for label in CLASSES:
+        mask = truth == label
+        if mask.any():
+            print(f"  {label}: 召回率 {(predicted[mask] == label).mean():.4f}  ({int(mask.sum())} 条)")
+
+
+def train_stacking(args, texts, labels, train_idx, test_idx) -> None:
+    """训练堆叠集成元模型,并与投票集成对比留出集准确率"""
+    model_dir = os.path.dirname(args.output) if args.output else None
+    start = time.perf_counter()
+    member_probs = member_probabilities(texts, args.language, args.members, model_dir)
+    print(f"成员: {', '.join(args.members)}  样本: {len(texts)}  "
+          f"成员预测耗时: {time.perf_counter() - start:.2f}s")
+
+    meta_learner = StackingMetaLearner(args.language, args.members)
+    info = meta_learner.fit(
+        member_probs[train_idx], [labels[i] for i in train_idx],
+        alpha=args.alpha, max_iter=args.max_iter
+    )
+    print(f"训练样本: {len(train_idx)}  迭代: {info['iterations']}  损失: {info['loss']:.4f}")
+
+    if len(test_idx):
+        truth = np.array([labels[i] for i in test_idx])
+        report_accuracy('投票集成留出集', member_probs[test_idx].mean(axis=1), truth)
+        report_accuracy('堆叠集成留出集', meta_learner.predict_proba(member_probs[test_idx]), truth)
+
+    output = args.output or stacking_path(args.language)
+    meta_learner.save(output)
+    print(f"元模型已保存: {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='训练线性情感分类模型')
+    parser.add_argument('csv', help='带标签的评论CSV文件')
+    parser.add_argument('--language', choices=['zh', 'en'], default='zh', help='语言')
+    parser.add_argument('-o', '--output', default=None, help='模型文件路径(默认 trained_models/linear_{language}.npz,--stacking 时为 stacking_{language}.npz)')
+    parser.add_argument('--analyzer', choices=['word', 'char', 'both'], default='both', help='n-gram特征类型')
+    parser.add_argument('--hash-features', type=int, default=None, help='哈希特征维数,不设置时使用显式词表')
+    parser.add_argument('--alpha', type=float, default=1e-4, help='L2正则系数')
+    parser.add_argument('--max-iter', type=int, default=200, help='最大迭代次数')
+    parser.add_argument('--balanced', action='store_true', help='按类别频率的倒数加权样本')
+    parser.add_argument('--test-size', type=float, default=0.1, help='留出评估的样本比例')
+    parser.add_argument('--seed', type=int, default=42, help='划分训练/评估集的随机种子')
+    parser.add_argument('--stacking', action='store_true', help='训练堆叠集成元模型而不是线性模型')
+    parser.add_argument('--members', nargs='+', choices=ENSEMBLE_MEMBERS, default=list(DEFAULT_ENSEMBLE_MEMBERS),
+                        help='堆叠集成的成员(顺序需与线上 ENSEMBLE_MEMBERS 一致)')
+    args = parser.parse_args()
+    if args.stacking and args.alpha == parser.get_default('alpha'):
+        args.alpha = 1e-3
+
+    texts, labels = load_labeled(args.csv, args.language)
+    if not texts:
+        raise SystemExit('没有可用的带标签评论')
+
+    # 划分训练集和留出评估集
+    order = np.random.default_rng(args.seed).permutation(len(texts))
+    n_test = int(len(texts) * args.test_size)
+    test_idx, train_idx = order[:n_test], order[n_test:]
+
+    if args.stacking:
+        train_stacking(args, texts, labels, train_idx, test_idx)
+        return
+
+    model = LinearSentimentModel(TfidfVectorizer(
+        language=args.language, analyzer=args.analyzer, n_features=args.hash_features, sublinear_tf=True
+    ))
+    start = time.perf_counter()
+    info = model.fit(
+        [texts[i] for i in train_idx], [labels[i] for i in train_idx],
+        alpha=args.alpha, max_iter=args.max_iter, balanced=args.balanced
+    )
+    print(f"训练样本: {len(train_idx)}  特征数: {info['features']}  "
+          f"迭代: {info['iterations']}  损失: {info['loss']:.4f}  耗时: {time.perf_counter() - start:.2f}s")
+
+    if n_test:
+        test_texts = [texts[i] for i in test_idx]
+        start = time.perf_counter()
+        probs = model.predict_proba(test_texts)
+        elapsed = time.perf_counter() - start
+        report_accuracy('留出集', probs, np.array([labels[i] for i in test_idx]))
+        print(f"预测耗时: {elapsed * 1000:.1f} ms")
+
+    output = args.output or model_path(args.language)
+    model.save(output)
+    print(f"模型已保存: {output} ({os.path.getsize(output) / 1024:.1f} KB)")
+
+
+if __name__ == '__main__':
+    main()
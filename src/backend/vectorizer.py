@@ -0,0 +1,318 @@
+"""
+语料级TF-IDF向量化模块
+在整批评论(上传的语料)上建立词表和逆文档频率,输出SciPy CSR稀疏矩阵,
+可选哈希技巧将特征维数固定为 n_features,以限制大语料下的内存占用
+"""
+import zlib
+import numpy as np
+from scipy import sparse
+from typing import List, Dict, Any, Optional, Tuple, Callable, Sequence
+from analysis_context import AnalysisContext, tokenize
+
+ANALYZERS = ('word', 'char', 'both')
+
+# 语料级统计默认的哈希特征维数
+DEFAULT_HASH_FEATURES = 2 ** 18
+
+
+def _is_term_token(token: str) -> bool:
+    """过滤空白和纯标点的分词结果"""
+    return any(ch.isalnum() for ch in token)
+
+
+class TfidfVectorizer:
+    """词/字符n-gram的TF-IDF向量化器"""
+
+    def __init__(self, language: str = 'zh', analyzer: str = 'word',
+                 ngram_range: Tuple[int, int] = (1, 2), char_ngram_range: Tuple[int, int] = (2, 3),
+                 n_features: Optional[int] = None, sublinear_tf: bool = False):
+        """
+        Args:
+            language: 语言类型
+            analyzer: 特征类型 ('word' 词n-gram、'char' 字符n-gram 或 'both' 两者合并)
+            ngram_range: 词n-gram的长度范围
+            char_ngram_range: 字符n-gram的长度范围
+            n_features: 哈希特征维数,为None时建立显式词表
+            sublinear_tf: 是否使用 1 + log(tf) 代替原始词频
+        """
+        if analyzer not in ANALYZERS:
+            raise ValueError(f'不支持的特征类型: {analyzer}')
+        self.language = language
+        self.analyzer = analyzer
+        self.ngram_range = tuple(ngram_range)
+        self.char_ngram_range = tuple(char_ngram_range)
+        self.n_features = n_features
+        self.sublinear_tf = sublinear_tf
+
+        # 显式词表: term -> index;哈希模式下只记录每个桶第一次出现的词,用于展示
+        self.vocabulary = {} if n_features is None else None
+        self._terms = [] if n_features is None else {}
+        self.idf = None
+
+    @property
+    def fitted(self) -> bool:
+        """是否已在语料上拟合(拟合后词表和IDF固定)"""
+        return self.idf is not None
+
+    @property
+    def size(self) -> int:
+        """特征维数"""
+        return self.n_features if self.n_features is not None else len(self.vocabulary)
+
+    def analyze(self, text: str, tokens: Optional[List[str]] = None) -> List[str]:
+        """
+        将文本切分为特征项
+
+        Args:
+            text: 预处理后的文本
+            tokens: 已有的分词结果(如分析上下文中的tokens),为None时重新分词
+        """
+        terms = []
+        if self.analyzer in ('word', 'both'):
+            if tokens is None:
+                tokens = tokenize(text, self.language)
+            words = [token.strip() for token in tokens if _is_term_token(token)]
+            low, high = self.ngram_range
+            for n in range(low, high + 1):
+                terms.extend(' '.join(words[i:i+n]) for i in range(len(words) - n + 1))
+        if self.analyzer in ('char', 'both'):
+            chars = ''.join(text.split())
+            low, high = self.char_ngram_range
+            for n in range(low, high + 1):
+                terms.extend(chars[i:i+n] for i in range(len(chars) - n + 1))
+        return terms
+
+    def _index(self, term: str, grow: bool) -> Optional[int]:
+        """特征项的列号,词表模式下 grow 为False时未登录词返回None"""
+        if self.n_features is not None:
+            index = zlib.crc32(term.encode('utf-8')) % self.n_features
+            if grow and index not in self._terms:
+                self._terms[index] = term
+            return index
+        index = self.vocabulary.get(term)
+        if index is None and grow:
+            index = len(self.vocabulary)
+            self.vocabulary[term] = index
+            self._terms.append(term)
+        return index
+
+    def term_names(self, indices: Sequence[int]) -> List[Optional[str]]:
+        """列号对应的特征项(哈希模式下为落入该桶的第一个词)"""
+        if self.n_features is not None:
+            return [self._terms.get(int(i)) for i in indices]
+        return [self._terms[int(i)] for i in indices]
+
+    def count_matrix(self, docs: Sequence[List[str]], grow: bool = False) -> sparse.csr_matrix:
+        """
+        构建 文档 × 特征 的词频矩阵
+
+        Args:
+            docs: 每条文档的特征项列表(见 analyze)
+            grow: 是否把未登录的特征项加入词表
+        """
+        indptr = [0]
+        indices = []
+        for terms in docs:
+            for term in terms:
+                index = self._index(term, grow)
+                if index is not None:
+                    indices.append(index)
+            indptr.append(len(indices))
+        matrix = sparse.csr_matrix(
+            (np.ones(len(indices)), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(docs), self.size)
+        )
+        matrix.sum_duplicates()
+        return matrix
+
+    @staticmethod
+    def compute_idf(df: np.ndarray, n_docs: int) -> np.ndarray:
+        """平滑IDF: ln((1 + n) / (1 + df)) + 1"""
+        return np.log((1 + n_docs) / (1 + df)) + 1
+
+    def fit(self, texts: Sequence[str], tokens_list: Optional[Sequence[List[str]]] = None) -> 'TfidfVectorizer':
+        """
+        在语料上建立词表并计算IDF
+
+        Args:
+            texts: 预处理后的文本
+            tokens_list: 每条文本已有的分词结果
+        """
+        tokens_list = tokens_list if tokens_list is not None else [None] * len(texts)
+        counts = self.count_matrix(
+            [self.analyze(text, tokens) for text, tokens in zip(texts, tokens_list)], grow=True
+        )
+        df = np.bincount(counts.indices, minlength=self.size)
+        self.idf = self.compute_idf(df, counts.shape[0])
+        return self
+
+    def transform(self, texts: Sequence[str], tokens_list: Optional[Sequence[List[str]]] = None) -> sparse.csr_matrix:
+        """
+        将文本转换为按行L2归一化的TF-IDF稀疏矩阵,未登录的特征项被忽略
+
+        Args:
+            texts: 预处理后的文本
+            tokens_list: 每条文本已有的分词结果
+        """
+        if not self.fitted:
+            raise ValueError('向量化器尚未拟合')
+        tokens_list = tokens_list if tokens_list is not None else [None] * len(texts)
+        matrix = self.count_matrix([self.analyze(text, tokens) for text, tokens in zip(texts, tokens_list)])
+        if self.sublinear_tf:
+            matrix.data = 1 + np.log(matrix.data)
+        matrix = matrix @ sparse.diags(self.idf)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+    def fit_transform(self, texts: Sequence[str], tokens_list: Optional[Sequence[List[str]]] = None) -> sparse.csr_matrix:
+        """拟合并转换"""
+        return self.fit(texts, tokens_list).transform(texts, tokens_list)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """将已拟合的向量化器转换为可写入npz的数组"""
+        if not self.fitted:
+            raise ValueError('向量化器尚未拟合')
+        if self.n_features is not None:
+            buckets = np.array(sorted(self._terms), dtype=np.int64)
+            terms = [self._terms[int(i)] for i in buckets]
+        else:
+            buckets = np.arange(len(self._terms), dtype=np.int64)
+            terms = self._terms
+        return {
+            'language': np.array(self.language),
+            'analyzer': np.array(self.analyzer),
+            'ngram_range': np.array(self.ngram_range),
+            'char_ngram_range': np.array(self.char_ngram_range),
+            'n_features': np.array(-1 if self.n_features is None else self.n_features),
+            'sublinear_tf': np.array(self.sublinear_tf),
+            'idf': self.idf,
+            'buckets': buckets,
+            'terms': np.array(terms, dtype=str)
+        }
+
+    @classmethod
+    def from_arrays(cls, data) -> 'TfidfVectorizer':
+        """由 to_arrays 的结果(或加载的npz)重建向量化器"""
+        n_features = int(data['n_features'])
+        vectorizer = cls(
+            language=str(data['language']),
+            analyzer=str(data['analyzer']),
+            ngram_range=tuple(int(v) for v in data['ngram_range']),
+            char_ngram_range=tuple(int(v) for v in data['char_ngram_range']),
+            n_features=None if n_features < 0 else n_features,
+            sublinear_tf=bool(data['sublinear_tf'])
+        )
+        terms = data['terms'].tolist()
+        if vectorizer.n_features is not None:
+            vectorizer._terms = dict(zip(data['buckets'].tolist(), terms))
+        else:
+            vectorizer._terms = terms
+            vectorizer.vocabulary = {term: i for i, term in enumerate(terms)}
+        vectorizer.idf = np.asarray(data['idf'])
+        return vectorizer
+
+    def save(self, path: str) -> None:
+        """保存已拟合的向量化器(npz)"""
+        np.savez_compressed(path, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path: str) -> 'TfidfVectorizer':
+        """加载 save 保存的向量化器"""
+        with np.load(path, allow_pickle=False) as data:
+            return cls.from_arrays(data)
+
+
+class CorpusTermStats:
+    """
+    逐块累加语料的词频统计,得到各情感类别的代表性词语
+
+    每个类别的得分为该类评论的平均词频(按评论长度归一化)乘以语料IDF;
+    使用已拟合(持久化)的向量化器时沿用其词表和IDF
+    """
+
+    def __init__(self, vectorizer: TfidfVectorizer, preprocess: Callable[[str], str], top_n: int = 10):
+        """
+        Args:
+            vectorizer: 向量化器,未拟合时在本语料上逐块扩充词表
+            preprocess: 文本预处理函数(与情感分析一致)
+            top_n: 每个类别返回的词语数
+        """
+        self.vectorizer = vectorizer
+        self.preprocess = preprocess
+        self.top_n = top_n
+        self.n_docs = 0
+        self.df = np.zeros(vectorizer.size)
+        self.class_tf = {}
+        self.class_docs = {}
+
+    def _resize(self, size: int) -> None:
+        """词表扩充后同步扩展累加数组"""
+        if size > len(self.df):
+            self.df = np.pad(self.df, (0, size - len(self.df)))
+            for name, values in self.class_tf.items():
+                self.class_tf[name] = np.pad(values, (0, size - len(values)))
+
+    def update(self, texts: Sequence[str], labels: Sequence[str],
+               contexts: Optional[Dict[str, AnalysisContext]] = None) -> None:
+        """
+        累加一批评论
+
+        Args:
+            texts: 原始评论文本
+            labels: 每条评论的情感类别
+            contexts: 情感分析时已构建的 {预处理后文本: 分析上下文},其中的评论直接复用分词结果
+        """
+        # 相同评论只预处理和切分一次,再按行展开
+        positions = {}
+        inverse = np.array([positions.setdefault(text, len(positions)) for text in texts], dtype=np.int64)
+        clean_texts = [self.preprocess(text) for text in positions]
+        contexts = contexts or {}
+
+        vectorizer = self.vectorizer
+        docs = []
+        for text in clean_texts:
+            context = contexts.get(text)
+            docs.append(vectorizer.analyze(text, context.tokens if context is not None else None))
+        counts = vectorizer.count_matrix(docs, grow=not vectorizer.fitted)[inverse]
+        self._resize(counts.shape[1])
+
+        lengths = np.asarray(counts.sum(axis=1)).ravel()
+        nonempty = lengths > 0
+        tf = sparse.diags(1 / np.where(nonempty, lengths, 1)) @ counts
+
+        self.n_docs += int(nonempty.sum())
+        self.df += np.bincount(counts.indices, minlength=counts.shape[1])
+        labels = np.asarray(labels, dtype=object)
+        for name in np.unique(labels[nonempty]).tolist():
+            mask = nonempty & (labels == name)
+            class_tf = np.asarray(tf[mask].sum(axis=0)).ravel()
+            if name in self.class_tf:
+                self.class_tf[name] += class_tf
+            else:
+                self.class_tf[name] = np.pad(class_tf, (0, len(self.df) - len(class_tf)))
+            self.class_docs[name] = self.class_docs.get(name, 0) + int(mask.sum())
+
+    def result(self) -> Dict[str, Any]:
+        """各情感类别TF-IDF最高的词语"""
+        vectorizer = self.vectorizer
+        idf = vectorizer.idf if vectorizer.fitted else vectorizer.compute_idf(self.df, self.n_docs)
+        top_terms = {}
+        for name, class_tf in self.class_tf.items():
+            scores = class_tf * idf / self.class_docs[name]
+            k = min(self.top_n, int((scores > 0).sum()))
+            if k == 0:
+                top_terms[name] = []
+                continue
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.lexsort((top, -scores[top]))]
+            top_terms[name] = [
+                {'term': term, 'score': round(float(scores[i]), 4)}
+                for term, i in zip(vectorizer.term_names(top), top)
+            ]
+        return {
+            'documents': self.n_docs,
+            'vocab_size': int((self.df > 0).sum()),
+            'hashed': vectorizer.n_features is not None,
+            'top_terms': top_terms
+        }